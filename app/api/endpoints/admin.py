@@ -2,15 +2,26 @@
 """
 统一管理后台API端点 - 数据库管理 + API监控
 """
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-from app.db.database import get_db_connection, DB_PATH
-from app.services.metrics_service import MetricsService
-from datetime import datetime
+from app.db.database import get_db_connection, get_read_connection, utc_now, DB_PATH, pool as db_pool
+from app.services.metrics_service import MetricsService, MetricsWriter
+from app.services.retention_service import RetentionService
+from app.services.job_sweeper import JobSweeper
+from app.services.loop_monitor import LoopMonitor
+from app.services.profiler import Profiler, ProfilerBusy
+from crawlers.base_crawler import BaseCrawler
+from crawlers.utils.client_pool import ClientPool
+from crawlers.hybrid.hybrid_crawler import HybridCrawler
+from crawlers.utils.link_cache import link_cache
+from crawlers.douyin.web.signer import ABogusSigner
+from crawlers.utils.token_pool import TokenService
+from crawlers.utils.tracing import Tracer
 import json
 import os
+import threading
 
 router = APIRouter()
 
@@ -58,7 +69,7 @@ class LedgerInfo(BaseModel):
 @router.get("/users", response_model=List[UserInfo], summary="获取所有用户")
 async def get_all_users():
     """获取所有用户及其积分"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users ORDER BY updated_at DESC")
         rows = cursor.fetchall()
@@ -68,7 +79,7 @@ async def get_all_users():
 @router.get("/users/{lc_uid}", response_model=UserInfo, summary="获取单个用户")
 async def get_user(lc_uid: str):
     """获取单个用户信息"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE lc_uid = ?", (lc_uid,))
         row = cursor.fetchone()
@@ -77,8 +88,9 @@ async def get_user(lc_uid: str):
         return dict(row)
 
 
+# 使用写连接的接口定义为普通函数，由 FastAPI 在线程池中执行，不在事件循环上等待写锁
 @router.post("/users/update-credits", summary="修改用户积分")
-async def update_user_credits(request: UpdateCreditsRequest):
+def update_user_credits(request: UpdateCreditsRequest):
     """直接修改用户积分（管理员操作）"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -91,7 +103,7 @@ async def update_user_credits(request: UpdateCreditsRequest):
         
         old_balance = row["credits_balance"]
         delta = request.new_balance - old_balance
-        now = datetime.utcnow().isoformat()
+        now, now_ms = utc_now()
         
         # 更新余额
         cursor.execute("""
@@ -101,9 +113,9 @@ async def update_user_credits(request: UpdateCreditsRequest):
         
         # 记录流水
         cursor.execute("""
-            INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (request.lc_uid, delta, request.reason, None, now))
+            INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at, created_at_ms)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (request.lc_uid, delta, request.reason, None, now, now_ms))
         
         conn.commit()
         
@@ -117,7 +129,7 @@ async def update_user_credits(request: UpdateCreditsRequest):
 
 
 @router.delete("/users/{lc_uid}", summary="删除用户")
-async def delete_user(lc_uid: str):
+def delete_user(lc_uid: str):
     """删除用户及其相关数据"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -139,13 +151,13 @@ async def delete_user(lc_uid: str):
 @router.get("/downloads", response_model=List[Dict[str, Any]], summary="获取所有下载任务")
 async def get_all_downloads(limit: int = Query(default=100, le=500)):
     """获取所有下载任务"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT job_id, lc_uid, url, platform, cost_credits, status, 
                    error_message, created_at, updated_at 
             FROM download_jobs 
-            ORDER BY created_at DESC 
+            ORDER BY created_at_ms DESC 
             LIMIT ?
         """, (limit,))
         rows = cursor.fetchall()
@@ -155,7 +167,7 @@ async def get_all_downloads(limit: int = Query(default=100, le=500)):
 @router.get("/downloads/{job_id}", summary="获取下载任务详情")
 async def get_download_detail(job_id: str):
     """获取下载任务详情（含result_data）"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM download_jobs WHERE job_id = ?", (job_id,))
         row = cursor.fetchone()
@@ -172,7 +184,7 @@ async def get_download_detail(job_id: str):
 
 
 @router.delete("/downloads/{job_id}", summary="删除下载任务")
-async def delete_download(job_id: str):
+def delete_download(job_id: str):
     """删除下载任务"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -183,25 +195,32 @@ async def delete_download(job_id: str):
 
 # ==================== 积分流水 ====================
 
+@router.post("/downloads/sweep", summary="清理过期下载任务")
+async def sweep_download_jobs():
+    """立即清理超时未确认的下载任务并解冻积分"""
+    result = await JobSweeper.run_async()
+    return {"success": not result.get("skipped"), **result}
+
+
 @router.get("/ledger", response_model=List[LedgerInfo], summary="获取积分流水")
 async def get_ledger(
     lc_uid: Optional[str] = None,
     limit: int = Query(default=100, le=500)
 ):
     """获取积分流水记录"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         if lc_uid:
             cursor.execute("""
                 SELECT * FROM credit_ledger 
                 WHERE lc_uid = ?
-                ORDER BY created_at DESC 
+                ORDER BY created_at_ms DESC 
                 LIMIT ?
             """, (lc_uid, limit))
         else:
             cursor.execute("""
                 SELECT * FROM credit_ledger 
-                ORDER BY created_at DESC 
+                ORDER BY created_at_ms DESC 
                 LIMIT ?
             """, (limit,))
         rows = cursor.fetchall()
@@ -213,7 +232,7 @@ async def get_ledger(
 @router.get("/stats", summary="获取统计信息")
 async def get_stats():
     """获取数据库统计信息"""
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # 用户统计
@@ -239,7 +258,8 @@ async def get_stats():
                 "total_credits": user_stats["total_credits"] or 0
             },
             "downloads": download_stats,
-            "ledger_count": ledger_count
+            "ledger_count": ledger_count,
+            "connection_pool": db_pool.stats()
         }
 
 
@@ -299,11 +319,162 @@ async def get_metrics_hourly(hours: int = Query(default=24, le=168)):
     return MetricsService.get_hourly_stats(hours)
 
 
+@router.get("/metrics/writer", summary="获取监控数据批量写入状态")
+async def get_metrics_writer_stats():
+    """获取监控队列长度、丢弃数和写入计数"""
+    return MetricsWriter.stats()
+
+
+@router.get("/metrics/crawlers", summary="获取爬虫连接池、请求合并与缓存统计")
+async def get_crawler_stats():
+    """获取共享HTTP客户端池状态、请求合并计数和元数据缓存命中率"""
+    return {
+        "client_pool": ClientPool.stats(),
+        "single_flight": BaseCrawler.single_flight.stats(),
+        "metadata_cache": HybridCrawler.metadata_cache.stats(),
+        "link_cache": link_cache.stats(),
+        "abogus_signer": ABogusSigner.stats(),
+        "token_pool": TokenService.stats()
+    }
+
+
+@router.post("/metrics/crawlers/cache/clear", summary="清空元数据缓存")
+async def clear_metadata_cache():
+    """清空混合解析元数据缓存（内存和磁盘）"""
+    HybridCrawler.metadata_cache.clear()
+    return {"success": True}
+
+
 @router.post("/metrics/cleanup", summary="清理过期数据")
 async def cleanup_metrics():
-    """清理7天前的监控数据"""
-    deleted = MetricsService.cleanup_old_data()
-    return {"success": True, "deleted_count": deleted}
+    """分批清理过期的监控数据，已有清理在进行时直接返回"""
+    result = await RetentionService.run_async()
+    return {"success": not result.get("skipped"), "deleted_count": result["deleted"], **result}
+
+
+@router.get("/metrics/retention", summary="获取数据清理状态")
+async def get_retention_stats():
+    """获取保留策略和最近一次清理的吞吐量"""
+    return RetentionService.stats()
+
+
+@router.post("/db/enable-incremental-vacuum", summary="为已有数据库启用增量VACUUM")
+def enable_incremental_vacuum():
+    """修改 auto_vacuum 并执行一次完整的 VACUUM，期间持有写锁，请在低峰期执行"""
+    return RetentionService.enable_incremental_vacuum()
+
+
+@router.get("/metrics/sweeper", summary="获取过期下载任务清理状态")
+async def get_sweeper_stats():
+    """获取任务有效期、清理延迟和累计解冻的积分"""
+    return JobSweeper.stats()
+
+
+@router.get("/traces", summary="获取最近的慢请求追踪")
+async def list_traces(
+    min_ms: float = Query(default=0, ge=0, description="最小耗时(毫秒)"),
+    limit: int = Query(default=50, le=500)
+):
+    """按耗时从高到低列出环形缓冲区中保留的追踪（慢请求全部保留，其余抽样）"""
+    return {"tracer": Tracer.stats(), "traces": Tracer.recent(min_ms, limit)}
+
+
+@router.get("/traces/{trace_id}", summary="获取单个请求的瀑布图")
+async def get_trace(trace_id: str, format: str = Query(default="json", pattern="^(json|text)$")):
+    """获取追踪中各阶段的相对开始时间和耗时，format=text 时返回文本瀑布图"""
+    trace = Tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="追踪不存在或已被淘汰")
+    if format == "text":
+        return PlainTextResponse(trace.render())
+    return trace.waterfall()
+
+
+@router.get("/loop/blocking", summary="获取阻塞事件循环的调用位置")
+async def get_loop_blocking(limit: int = Query(default=50, le=500)):
+    """按累计阻塞时间列出阻塞事件循环的调用位置及最近一次的调用栈"""
+    return {"monitor": LoopMonitor.stats(), "sites": LoopMonitor.blocking_sites(limit)}
+
+
+@router.post("/loop/blocking/reset", summary="清空事件循环阻塞记录")
+async def reset_loop_blocking():
+    """清空汇总的阻塞记录和最大延迟"""
+    LoopMonitor.reset()
+    return {"success": True}
+
+
+# ==================== 性能分析 ====================
+
+def _require_profiler_token(x_admin_token: Optional[str] = Header(default=None)):
+    """分析接口会拖慢所有请求，只允许带有配置的管理令牌的调用"""
+    if not Profiler.check_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="需要有效的 X-Admin-Token")
+
+
+def _profile_response(profile, format: str, sort: str, limit: int, filename: str):
+    """按 format 返回 pstats 文本或 .prof 二进制数据"""
+    if format == "prof":
+        return Response(
+            Profiler.dump(profile), media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.prof"'}
+        )
+    return PlainTextResponse(Profiler.render(profile, sort, limit))
+
+
+@router.get("/profile", summary="获取性能分析状态", dependencies=[Depends(_require_profiler_token)])
+async def get_profiler_stats():
+    """性能分析配置和最近的单个请求分析结果"""
+    return {"profiler": Profiler.stats(), "requests": Profiler.recent_requests()}
+
+
+@router.post("/profile/sample", summary="采样调用栈", dependencies=[Depends(_require_profiler_token)])
+async def profile_sample(
+    seconds: float = Query(default=10, gt=0, description="采样时长(秒)，不超过配置的上限"),
+    interval_ms: float = Query(default=10, gt=0, description="采样间隔(毫秒)"),
+    threads: str = Query(default="loop", pattern="^(loop|all)$", description="loop 只采样事件循环线程")
+):
+    """
+    按固定间隔采样调用栈，返回折叠栈文本（每行"帧;帧;... 次数"），
+    可直接交给 flamegraph.pl 或 speedscope 生成火焰图
+    """
+    thread_id = threading.get_ident() if threads == "loop" else None
+    try:
+        result = await Profiler.sample(seconds, interval_ms, thread_id)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(result["collapsed"], headers={
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Profile-Seconds": str(result["seconds"]),
+    })
+
+
+@router.post("/profile/cprofile", summary="使用 cProfile 分析事件循环", dependencies=[Depends(_require_profiler_token)])
+async def profile_cprofile(
+    seconds: float = Query(default=10, gt=0, description="分析时长(秒)，不超过配置的上限"),
+    format: str = Query(default="text", pattern="^(text|prof)$", description="text 为 pstats 文本，prof 为二进制文件"),
+    sort: str = Query(default="cumulative", pattern="^(cumulative|tottime|ncalls)$"),
+    limit: int = Query(default=50, ge=1, le=1000)
+):
+    """在事件循环线程上开启 cProfile，期间所有请求都会被计入"""
+    try:
+        profile = await Profiler.run_cprofile(seconds)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _profile_response(profile, format, sort, limit, "cprofile")
+
+
+@router.get("/profile/requests/{profile_id}", summary="获取单个请求的分析结果", dependencies=[Depends(_require_profiler_token)])
+async def get_request_profile(
+    profile_id: str,
+    format: str = Query(default="text", pattern="^(text|prof)$"),
+    sort: str = Query(default="cumulative", pattern="^(cumulative|tottime|ncalls)$"),
+    limit: int = Query(default=50, ge=1, le=1000)
+):
+    """带 X-Profile 请求头的请求的分析结果，ID 见响应头 X-Profile-Id"""
+    profile = Profiler.get_request(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="分析结果不存在或已被淘汰")
+    return _profile_response(profile, format, sort, limit, profile_id)
 
 
 # ==================== 用户反馈管理 ====================
@@ -317,7 +488,7 @@ async def get_feedbacks(
 ):
     """获取用户反馈列表"""
     import json
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         query = "SELECT * FROM feedbacks WHERE 1=1"
@@ -359,7 +530,7 @@ async def get_feedbacks(
 async def get_feedback_detail(feedback_id: str):
     """获取反馈详情"""
     import json
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM feedbacks WHERE id = ?", (feedback_id,))
         row = cursor.fetchone()
@@ -376,7 +547,7 @@ async def get_feedback_detail(feedback_id: str):
 
 
 @router.post("/feedbacks/{feedback_id}/status", summary="更新反馈状态")
-async def update_feedback_status(
+def update_feedback_status(
     feedback_id: str,
     status: str = Query(..., description="新状态：pending | processed | archived")
 ):
@@ -396,7 +567,7 @@ async def update_feedback_status(
 
 
 @router.delete("/feedbacks/{feedback_id}", summary="删除反馈")
-async def delete_feedback(feedback_id: str):
+def delete_feedback(feedback_id: str):
     """删除反馈"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
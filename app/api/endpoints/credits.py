@@ -2,13 +2,12 @@
 """
 积分管理API端点
 """
-import time
+import asyncio
 from fastapi import APIRouter, HTTPException, Header as HeaderParam
 from pydantic import BaseModel
 from typing import Optional
 from app.services.credit_service import CreditService
 from app.services.auth_service import AuthService
-from app.services.metrics_service import MetricsService
 from app.db.database import get_or_create_user
 
 router = APIRouter()
@@ -64,19 +63,14 @@ async def get_balance(
     - **认证**: 通过Header的X-LC-UID和X-LC-Session验证用户身份
     - **新用户**: 首次查询会自动创建账户并赠送100积分
     """
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
-    
     try:
         # 验证身份
         valid, error = await AuthService.verify_session(x_lc_uid, x_lc_session)
         if not valid:
-            status_code = 401
-            error_msg = f"身份验证失败: {error}"
-            raise HTTPException(status_code=401, detail=error_msg)
+            raise HTTPException(status_code=401, detail=f"身份验证失败: {error}")
         
-        user = get_or_create_user(x_lc_uid)
+        # 写连接由线程锁串行化，在线程池中执行，不在事件循环上等待锁
+        user = await asyncio.to_thread(get_or_create_user, x_lc_uid)
         balance = user["credits_balance"]
         frozen = user.get("credits_frozen", 0) or 0
         available = balance - frozen
@@ -89,19 +83,7 @@ async def get_balance(
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=f"查询余额失败: {str(e)}")
-    finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/credits/balance",
-            method="GET",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            lc_uid=x_lc_uid,
-            error_message=error_msg
-        )
 
 
 @router.get("/ledger", response_model=LedgerResponse, summary="查询积分流水")
@@ -116,17 +98,11 @@ async def get_ledger(
     - **认证**: 通过Header的X-LC-UID和X-LC-Session验证用户身份
     - **limit**: 返回记录数，默认50条
     """
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
-    
     try:
         # 验证身份
         valid, error = await AuthService.verify_session(x_lc_uid, x_lc_session)
         if not valid:
-            status_code = 401
-            error_msg = f"身份验证失败: {error}"
-            raise HTTPException(status_code=401, detail=error_msg)
+            raise HTTPException(status_code=401, detail=f"身份验证失败: {error}")
         
         items = CreditService.get_ledger(x_lc_uid, limit)
         return LedgerResponse(
@@ -136,19 +112,7 @@ async def get_ledger(
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=f"查询流水失败: {str(e)}")
-    finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/credits/ledger",
-            method="GET",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            lc_uid=x_lc_uid,
-            error_message=error_msg
-        )
 
 
 @router.post("/add-iap", response_model=AddIAPResponse, summary="IAP充值积分")
@@ -166,23 +130,18 @@ async def add_iap_credits(
     - **transaction_id**: Apple IAP交易ID
     - **product_id**: 商品ID（如com.mygolfswingapp.credits.300）
     """
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
-    
     try:
         # 验证身份
         valid, error = await AuthService.verify_session(x_lc_uid, x_lc_session)
         if not valid:
-            status_code = 401
-            error_msg = f"身份验证失败: {error}"
-            raise HTTPException(status_code=401, detail=error_msg)
+            raise HTTPException(status_code=401, detail=f"身份验证失败: {error}")
         
         # 确保用户存在
-        get_or_create_user(x_lc_uid)
+        await asyncio.to_thread(get_or_create_user, x_lc_uid)
         
         # 执行充值
-        result = CreditService.add_credits_iap(
+        result = await asyncio.to_thread(
+            CreditService.add_credits_iap,
             lc_uid=x_lc_uid,
             amount=request.amount,
             transaction_id=request.transaction_id,
@@ -191,9 +150,7 @@ async def add_iap_credits(
         )
         
         if not result["success"]:
-            status_code = 400
-            error_msg = result["error"]
-            raise HTTPException(status_code=400, detail=error_msg)
+            raise HTTPException(status_code=400, detail=result["error"])
         
         return AddIAPResponse(
             lc_uid=x_lc_uid,
@@ -204,17 +161,5 @@ async def add_iap_credits(
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=f"充值失败: {str(e)}")
-    finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/credits/add-iap",
-            method="POST",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            lc_uid=x_lc_uid,
-            error_message=error_msg
-        )
 
@@ -4,6 +4,7 @@ import time
 import httpx
 from crawlers.douyin.web.web_crawler import DouyinWebCrawler as _DouyinWebCrawler
 from app.services.metrics_service import MetricsService
+from crawlers.utils.timing import stage
 
 
 router = APIRouter()
@@ -41,8 +42,9 @@ async def fetch_one_video(aweme_id: str = Query(..., description="抖音作品ID
     error_msg = None
 
     try:
-        async with httpx.AsyncClient(timeout=20) as cli:
-            resp = await cli.get(url, headers=headers, params=params)
+        with stage("upstream"):
+            async with httpx.AsyncClient(timeout=20) as cli:
+                resp = await cli.get(url, headers=headers, params=params)
         status_code = resp.status_code
     except httpx.RequestError as exc:
         status_code = 502
@@ -81,39 +83,20 @@ async def fetch_one_video(aweme_id: str = Query(..., description="抖音作品ID
 
 @router.get("/v3/fetch_one_video_by_url", summary="传入抖音链接，自动解析并代理TikHub")
 async def fetch_one_video_by_url(url: str = Query(..., description="抖音视频链接，如 https://www.douyin.com/video/XXXXXXXXXXXX")):
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
-    
     try:
         try:
             aweme_id = await _crawler.get_aweme_id(url)
         except Exception as exc:
-            status_code = 400
-            error_msg = f"Parse aweme_id failed: {exc}"
-            raise HTTPException(status_code=400, detail=error_msg)
+            raise HTTPException(status_code=400, detail=f"Parse aweme_id failed: {exc}")
 
         if not aweme_id:
-            status_code = 400
-            error_msg = "aweme_id not found from url"
-            raise HTTPException(status_code=400, detail=error_msg)
+            raise HTTPException(status_code=400, detail="aweme_id not found from url")
 
         # 复用上面的代理逻辑
         return await fetch_one_video(aweme_id=aweme_id)
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/douyin/app/v3/fetch_one_video_by_url",
-            method="GET",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            error_message=error_msg
-        )
 
 
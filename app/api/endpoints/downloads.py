@@ -2,15 +2,19 @@
 """
 下载管理API端点
 """
+import asyncio
 import httpx
 import time
-from fastapi import APIRouter, HTTPException, Header as HeaderParam
+from fastapi import APIRouter, HTTPException, Query, Header as HeaderParam
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from app.services.download_service import DownloadService
-from app.services.credit_service import CreditService
+from app.services.download_worker import DownloadWorker
+from app.services.job_events import JobEvents
+from app.services.credit_service import InsufficientCredits
 from app.services.auth_service import AuthService
 from app.services.metrics_service import MetricsService
+from crawlers.utils.timing import stage
 import os
 
 router = APIRouter()
@@ -19,6 +23,7 @@ router = APIRouter()
 class DownloadStartRequest(BaseModel):
     """下载请求"""
     url: str
+    async_mode: Optional[bool] = None  # True=排队后立即返回，通过status查询进度；未指定时使用配置的默认值
 
 
 class DownloadStartResponse(BaseModel):
@@ -42,6 +47,7 @@ class DownloadStatusResponse(BaseModel):
     confirmed: int = 0  # 0=未确认, 1=已确认, -1=已取消
     result_data: Optional[Dict[str, Any]] = None
     error_message: Optional[str] = None
+    queue_position: Optional[int] = None  # 排队中的任务在所属平台队列中的位置（从1开始）
     created_at: str
     updated_at: str
 
@@ -76,6 +82,9 @@ async def start_download(
     4. **同步调用第三方API获取视频信息**
     5. 返回视频元信息给App展示
     
+    **异步模式**（`async_mode: true`）：第3步后任务进入工作池排队，立即返回 `queued` 状态，
+    通过 `/api/downloads/status` 查询进度，解析完成后状态变为 `pending_confirm`
+    
     **后续操作**：
     - 用户确认 → 调用 `/api/downloads/confirm` → 积分扣除
     - 用户取消 → 调用 `/api/downloads/cancel` → 积分解冻
@@ -84,59 +93,68 @@ async def start_download(
     - 抖音: 10分
     - 其他平台: 20分
     """
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
-    
     try:
         # 验证身份
         valid, error = await AuthService.verify_session(x_lc_uid, x_lc_session)
         if not valid:
-            status_code = 401
-            error_msg = f"身份验证失败: {error}"
-            raise HTTPException(status_code=401, detail=error_msg)
+            raise HTTPException(status_code=401, detail=f"身份验证失败: {error}")
         
-        # 检查可用余额（总余额 - 已冻结）
-        available = CreditService.get_available_balance(x_lc_uid)
         platform = DownloadService.detect_platform(request.url)
         cost = DownloadService.get_cost_for_platform(platform)
         
-        if available < cost:
-            status_code = 402
-            error_msg = f"积分不足。可用余额: {available}, 需要: {cost}"
-            raise HTTPException(status_code=402, detail=error_msg)
-        
-        # 创建任务并预扣积分
-        job = DownloadService.create_download_job(x_lc_uid, request.url)
+        # 在一个事务中检查可用余额（总余额 - 已冻结）、冻结积分并创建任务
+        async_mode = DownloadWorker.default_async if request.async_mode is None else request.async_mode
+        async_mode = async_mode and DownloadWorker.is_running()
+        try:
+            # 写连接由线程锁串行化，写操作都在线程池中执行，不在事件循环上等待锁
+            job = await asyncio.to_thread(
+                DownloadService.create_download_job,
+                x_lc_uid, request.url, status="queued" if async_mode else "running"
+            )
+        except InsufficientCredits as e:
+            raise HTTPException(status_code=402, detail=f"积分不足。可用余额: {e.available}, 需要: {e.required}")
         
         if not job:
-            status_code = 500
-            error_msg = "创建下载任务失败"
-            raise HTTPException(status_code=500, detail=error_msg)
+            raise HTTPException(status_code=500, detail="创建下载任务失败")
+        
+        if async_mode:
+            if not DownloadWorker.submit(job["job_id"], request.url, platform):
+                # 队列已满，解冻积分
+                await asyncio.to_thread(
+                    DownloadService.update_job_status,
+                    job_id=job["job_id"],
+                    status="failed",
+                    error_message="解析队列已满"
+                )
+                raise HTTPException(status_code=503, detail="解析队列已满，请稍后重试")
+            return DownloadStartResponse(
+                job_id=job["job_id"],
+                platform=platform,
+                cost_credits=cost,
+                status="queued",
+                message="任务已排队，积分已冻结。请通过status接口查询进度，解析完成后展示视频信息供用户确认"
+            )
         
         # 同步调用第三方API获取视频信息（只调用1次）
         video_info = None
         try:
-            if platform == "douyin":
-                video_info = await call_douyin_api(request.url)
-                # 保存视频信息到任务
-                DownloadService.update_job_status(
-                    job_id=job["job_id"],
-                    status="pending_confirm",  # 等待用户确认
-                    result_data=video_info
-                )
-            else:
-                raise Exception(f"暂不支持平台: {platform}")
+            video_info = await parse_video(platform, request.url)
+            # 保存视频信息到任务
+            await asyncio.to_thread(
+                DownloadService.update_job_status,
+                job_id=job["job_id"],
+                status="pending_confirm",  # 等待用户确认
+                result_data=video_info
+            )
         except Exception as e:
             # 解析失败，解冻积分
-            DownloadService.update_job_status(
+            await asyncio.to_thread(
+                DownloadService.update_job_status,
                 job_id=job["job_id"],
                 status="failed",
                 error_message=str(e)
             )
-            status_code = 500
-            error_msg = f"视频解析失败: {str(e)}"
-            raise HTTPException(status_code=500, detail=error_msg)
+            raise HTTPException(status_code=500, detail=f"视频解析失败: {str(e)}")
         
         return DownloadStartResponse(
             job_id=job["job_id"],
@@ -149,24 +167,13 @@ async def start_download(
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/downloads/start",
-            method="POST",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            lc_uid=x_lc_uid,
-            error_message=error_msg
-        )
 
 
 @router.get("/status", response_model=DownloadStatusResponse, summary="查询下载状态")
 async def get_download_status(
     job_id: str,
+    wait: float = Query(default=0, ge=0, le=60, description="任务在排队或解析中时最多等待的秒数，状态变化后立即返回"),
     x_lc_uid: str = HeaderParam(alias="X-LC-UID"),
     x_lc_session: str = HeaderParam(alias="X-LC-Session", default="")
 ):
@@ -176,52 +183,55 @@ async def get_download_status(
     **认证**: 通过Header的X-LC-UID和X-LC-Session验证用户身份
     
     **状态说明**：
+    - `queued`: 排队中（异步模式，包含queue_position）
     - `running`: 下载中
+    - `pending_confirm`: 解析成功，等待确认（包含result_data）
     - `succeeded`: 下载成功（包含result_data）
     - `failed`: 下载失败（积分已返还，包含error_message）
-    """
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
+    - `expired`: 超时未确认（积分已返还）
     
+    **长轮询**: 带 `wait` 参数时，任务处于 `queued`/`running` 状态会挂起到解析结束（离开这两个状态）
+    或超时再返回，代替客户端循环轮询
+    """
+    waiter = None
     try:
         # 验证身份
         valid, error = await AuthService.verify_session(x_lc_uid, x_lc_session)
         if not valid:
-            status_code = 401
-            error_msg = f"身份验证失败: {error}"
-            raise HTTPException(status_code=401, detail=error_msg)
+            raise HTTPException(status_code=401, detail=f"身份验证失败: {error}")
         
-        job = DownloadService.get_job_status(job_id)
+        # 先订阅再读取，读取之后的状态变化不会错过
+        waiter = JobEvents.subscribe(job_id) if wait > 0 else None
+        job = await asyncio.to_thread(DownloadService.get_job_status, job_id)
         
         if not job:
-            status_code = 404
-            error_msg = "任务不存在"
-            raise HTTPException(status_code=404, detail=error_msg)
+            raise HTTPException(status_code=404, detail="任务不存在")
         
         # 验证任务所属用户
         if job["lc_uid"] != x_lc_uid:
-            status_code = 403
-            error_msg = "无权访问此任务"
-            raise HTTPException(status_code=403, detail=error_msg)
+            raise HTTPException(status_code=403, detail="无权访问此任务")
+        
+        # 排队转为解析中也会发布通知，重新订阅后再读取，直到任务离开 queued/running 或超时
+        deadline = time.monotonic() + min(wait, JobEvents.max_wait_seconds)
+        while waiter is not None and job["status"] in ("queued", "running"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await JobEvents.wait(waiter, remaining)
+            JobEvents.unsubscribe(job_id, waiter)
+            waiter = JobEvents.subscribe(job_id)
+            job = await asyncio.to_thread(DownloadService.get_job_status, job_id) or job
+        
+        if job["status"] == "queued":
+            job["queue_position"] = DownloadWorker.queue_position(job_id, job["platform"])
         
         return DownloadStatusResponse(**job)
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/downloads/status",
-            method="GET",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            lc_uid=x_lc_uid,
-            error_message=error_msg
-        )
+        JobEvents.unsubscribe(job_id, waiter)
 
 
 @router.post("/confirm", response_model=ConfirmResponse, summary="确认下载成功")
@@ -241,42 +251,22 @@ async def confirm_download(
     - 只有状态为 succeeded 的任务才能确认
     - 每个任务只能确认一次
     """
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
-    
     try:
         # 验证身份
         valid, error = await AuthService.verify_session(x_lc_uid, x_lc_session)
         if not valid:
-            status_code = 401
-            error_msg = f"身份验证失败: {error}"
-            raise HTTPException(status_code=401, detail=error_msg)
+            raise HTTPException(status_code=401, detail=f"身份验证失败: {error}")
         
-        result = DownloadService.confirm_download(request.job_id, x_lc_uid)
+        result = await asyncio.to_thread(DownloadService.confirm_download, request.job_id, x_lc_uid)
         
         if not result["success"]:
-            status_code = 400
-            error_msg = result["message"]
-            raise HTTPException(status_code=400, detail=error_msg)
+            raise HTTPException(status_code=400, detail=result["message"])
         
         return ConfirmResponse(**result)
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/downloads/confirm",
-            method="POST",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            lc_uid=x_lc_uid,
-            error_message=error_msg
-        )
 
 
 @router.post("/cancel", response_model=ConfirmResponse, summary="取消下载")
@@ -298,42 +288,41 @@ async def cancel_download(
     - 已确认的任务无法取消
     - 每个任务只能取消一次
     """
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
-    
     try:
         # 验证身份
         valid, error = await AuthService.verify_session(x_lc_uid, x_lc_session)
         if not valid:
-            status_code = 401
-            error_msg = f"身份验证失败: {error}"
-            raise HTTPException(status_code=401, detail=error_msg)
+            raise HTTPException(status_code=401, detail=f"身份验证失败: {error}")
         
-        result = DownloadService.cancel_download(request.job_id, x_lc_uid)
+        result = await asyncio.to_thread(DownloadService.cancel_download, request.job_id, x_lc_uid)
         
         if not result["success"]:
-            status_code = 400
-            error_msg = result["message"]
-            raise HTTPException(status_code=400, detail=error_msg)
+            raise HTTPException(status_code=400, detail=result["message"])
         
         return ConfirmResponse(**result)
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/downloads/cancel",
-            method="POST",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            lc_uid=x_lc_uid,
-            error_message=error_msg
-        )
+
+
+async def parse_video(platform: str, url: str) -> Dict[str, Any]:
+    """
+    按平台获取视频信息，同步模式和工作池共用
+    
+    Args:
+        platform: 平台名称
+        url: 视频链接
+        
+    Returns:
+        视频信息
+    """
+    if platform == "douyin":
+        return await call_douyin_api(url)
+    raise Exception(f"暂不支持平台: {platform}")
+
+
+DownloadWorker.set_handler(parse_video)
 
 
 async def call_douyin_api(url: str) -> Dict[str, Any]:
@@ -376,15 +365,14 @@ async def call_douyin_api(url: str) -> Dict[str, Any]:
     error_msg = None
     
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(api_url, headers=headers, params=params)
-            status_code = resp.status_code
+        with stage("upstream"):
+            async with httpx.AsyncClient(timeout=30) as client:
+                resp = await client.get(api_url, headers=headers, params=params)
+                status_code = resp.status_code
             
             if resp.status_code >= 400:
                 error_msg = f"TikHub API错误: {resp.status_code}, {resp.text}"
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         # 记录失败调用
         latency_ms = int((time.time() - start_time) * 1000)
         MetricsService.record_api_call(
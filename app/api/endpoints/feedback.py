@@ -2,14 +2,14 @@
 """
 用户反馈API端点
 """
-import time
+import asyncio
 import json
 from datetime import datetime
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 from app.db.database import get_db_connection
-from app.services.metrics_service import MetricsService
+from crawlers.utils.timing import annotate
 
 router = APIRouter()
 
@@ -38,6 +38,18 @@ class FeedbackResponse(BaseModel):
     feedback_id: Optional[str] = None
 
 
+def _insert_feedback(row: tuple) -> None:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO feedbacks (
+                id, type, content, contact, device_info, 
+                lc_uid, timestamp, received_at, status
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, row)
+        conn.commit()
+
+
 @router.post("/feedback", response_model=FeedbackResponse, summary="提交用户反馈")
 async def submit_feedback(request: FeedbackRequest):
     """
@@ -50,17 +62,14 @@ async def submit_feedback(request: FeedbackRequest):
     - **user_id**: 用户ID（选填）
     - **timestamp**: 时间戳（选填）
     """
-    start_time = time.time()
-    status_code = 200
-    error_msg = None
+    # 反馈中的用户ID在请求体里，不在请求头中
+    annotate(lc_uid=request.user_id)
     
     try:
         # 验证反馈类型
         valid_types = ["功能建议", "问题反馈", "其他"]
         if request.type not in valid_types:
-            status_code = 400
-            error_msg = f"反馈类型无效，必须是：{', '.join(valid_types)}"
-            raise HTTPException(status_code=400, detail=error_msg)
+            raise HTTPException(status_code=400, detail=f"反馈类型无效，必须是：{', '.join(valid_types)}")
         
         # 生成反馈ID
         feedback_id = f"fb_{datetime.now().strftime('%Y%m%d%H%M%S')}"
@@ -81,26 +90,18 @@ async def submit_feedback(request: FeedbackRequest):
         if request.device_info:
             device_info_str = json.dumps(request.device_info.dict(), ensure_ascii=False)
         
-        # 保存到数据库
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO feedbacks (
-                    id, type, content, contact, device_info, 
-                    lc_uid, timestamp, received_at, status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                feedback_id,
-                request.type,
-                request.content,
-                request.contact,
-                device_info_str,
-                request.user_id,
-                request.timestamp,
-                received_at,
-                'pending'  # pending: 待处理, processed: 已处理, archived: 已归档
-            ))
-            conn.commit()
+        # 保存到数据库，写连接由线程锁串行化，在线程池中执行
+        await asyncio.to_thread(_insert_feedback, (
+            feedback_id,
+            request.type,
+            request.content,
+            request.contact,
+            device_info_str,
+            request.user_id,
+            request.timestamp,
+            received_at,
+            'pending'  # pending: 待处理, processed: 已处理, archived: 已归档
+        ))
         
         return FeedbackResponse(
             success=True,
@@ -111,17 +112,5 @@ async def submit_feedback(request: FeedbackRequest):
     except HTTPException:
         raise
     except Exception as e:
-        status_code = 500
-        error_msg = str(e)
         raise HTTPException(status_code=500, detail=f"提交反馈失败: {str(e)}")
-    finally:
-        latency_ms = int((time.time() - start_time) * 1000)
-        MetricsService.record_api_call(
-            endpoint="/api/feedback",
-            method="POST",
-            status_code=status_code,
-            latency_ms=latency_ms,
-            lc_uid=request.user_id,
-            error_message=error_msg
-        )
 
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 指标接口 - 以文本格式输出进程内指标
+
+只读取内存中的计数器和各组件的 stats()，不访问 SQLite，可以高频抓取。
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.db.database import pool as db_pool
+from app.services.download_worker import DownloadWorker
+from app.services.job_events import JobEvents
+from app.services.idempotency import IdempotencyStore
+from app.services.loop_monitor import LoopMonitor
+from app.services.metrics_service import MetricsWriter
+from app.services.retention_service import RetentionService
+from crawlers.base_crawler import BaseCrawler
+from crawlers.douyin.web.signer import ABogusSigner
+from crawlers.hybrid.hybrid_crawler import HybridCrawler
+from crawlers.utils.client_pool import ClientPool
+from crawlers.utils.link_cache import link_cache
+from crawlers.utils.prometheus import REGISTRY
+from crawlers.utils.token_pool import TokenService
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def collect_components():
+    """抓取时读取各组件的状态"""
+    metadata = HybridCrawler.metadata_cache.stats()
+    links = link_cache.stats()
+    # (缓存, 层) -> 统计
+    tiers = {("metadata", "memory"): metadata["memory"], ("link", "memory"): links["memory"]}
+    if metadata["disk"] is not None:
+        tiers[("metadata", "disk")] = metadata["disk"]
+    for field in ("hits", "misses", "evictions"):
+        yield (f"app_cache_{field}", "counter", f"Cache {field} by cache and tier",
+               [({"cache": cache, "tier": tier}, s[field]) for (cache, tier), s in tiers.items()])
+    yield ("app_cache_entries", "gauge", "Entries held by an in-memory cache tier",
+           [({"cache": cache, "tier": tier}, s["entries"]) for (cache, tier), s in tiers.items() if "entries" in s])
+    yield ("app_link_cache_db_lookups", "counter", "Short link cache lookups in the disk tier",
+           [({"result": "hit"}, links["db_hits"]), ({"result": "miss"}, links["db_misses"])])
+
+    flights = BaseCrawler.single_flight.stats()
+    yield ("crawler_single_flight_in_flight", "gauge", "Upstream calls currently being coalesced",
+           [({}, flights["in_flight"])])
+    yield ("crawler_single_flight_calls", "counter", "Coalesced upstream calls by outcome",
+           [({"result": "executed"}, flights["executed"]), ({"result": "coalesced"}, flights["coalesced"]),
+            ({"result": "error"}, flights["errors"])])
+    yield ("crawler_client_pool_clients", "gauge", "Shared HTTP clients",
+           [({}, len(ClientPool.stats()["clients"]))])
+
+    signer = ABogusSigner.stats()
+    yield ("crawler_abogus_signatures", "counter", "a_bogus signatures by outcome",
+           [({"result": "signed"}, signer["signed"]), ({"result": "error"}, signer["errors"])])
+
+    pools = TokenService.stats()["pools"]
+    yield ("crawler_token_pool_available", "gauge", "Tokens available by pool",
+           [({"pool": name}, s["available"]) for name, s in pools.items()])
+    yield ("crawler_token_pool_generated", "counter", "Tokens generated by pool",
+           [({"pool": name}, s["generated"]) for name, s in pools.items()])
+    yield ("crawler_token_pool_failures", "counter", "Token generation failures by pool",
+           [({"pool": name}, s["failures"]) for name, s in pools.items()])
+    yield ("crawler_token_pool_hit_ratio", "gauge", "Share of token lookups served from the pool",
+           [({"pool": name}, s["hit_ratio"]) for name, s in pools.items()])
+
+    writer = MetricsWriter.stats()
+    yield ("app_metrics_writer_queued", "gauge", "API metric rows waiting to be written",
+           [({}, writer["queued"])])
+    yield ("app_metrics_writer_rows", "counter", "API metric rows by outcome",
+           [({"result": result}, writer[result]) for result in ("enqueued", "dropped", "written", "failed")])
+
+    retention = RetentionService.stats()
+    yield ("app_retention_deleted_rows", "counter", "Expired API metric rows deleted",
+           [({}, retention["total_deleted"])])
+
+    db = db_pool.stats()
+    yield ("app_db_pool_acquisitions", "counter", "SQLite connections handed out by mode",
+           [({"mode": "writer"}, db["writes"]), ({"mode": "reader"}, db["reads"])])
+    yield ("app_db_pool_idle_readers", "gauge", "Idle read-only SQLite connections",
+           [({}, db["idle_readers"])])
+
+    worker = DownloadWorker.stats()
+    yield ("app_download_worker_queued", "gauge", "Download jobs waiting in the worker queue by platform group",
+           [({"platform": group}, depth) for group, depth in worker["queued"].items()])
+    yield ("app_download_worker_in_progress", "gauge", "Download jobs being parsed by the worker pool",
+           [({}, worker["in_progress"])])
+    events = JobEvents.stats()
+    yield ("app_job_events_waiters", "gauge", "Status requests waiting for a job update", [({}, events["waiters"])])
+    yield ("app_job_events_wakeups", "counter", "Waiting status requests by how they returned",
+           [({"result": "notified"}, events["delivered"]), ({"result": "timeout"}, events["timeouts"])])
+
+    idempotency = IdempotencyStore.stats()
+    yield ("app_idempotency_requests", "counter", "Requests carrying an Idempotency-Key by outcome",
+           [({"result": result}, idempotency[result]) for result in ("executed", "replayed", "waited", "conflicts")])
+    yield ("app_idempotency_memory_entries", "gauge", "Responses held in the in-memory LRU",
+           [({}, idempotency["memory_entries"])])
+
+    loop = LoopMonitor.stats()
+    yield ("app_event_loop_lag_max_seconds", "gauge", "Largest event loop wake-up delay since start",
+           [({}, loop["max_lag_ms"] / 1000)])
+
+
+REGISTRY.register_collector(collect_components)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus 文本格式的进程内指标"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+请求计时中间件 - 统一记录每个接口的调用情况
+
+纯 ASGI 中间件，不包装请求和响应对象：在响应开始时取得状态码并附加 Server-Timing 头，
+在响应结束后按路由模板记录一次调用。各阶段耗时(auth/db/sign/upstream/serialize)
+由相应的辅助函数通过 crawlers.utils.timing 计入当前请求；同时为请求开始一次追踪，
+慢请求和抽样的追踪保存在 Tracer 的环形缓冲区中，响应头 X-Trace-Id 给出追踪ID。
+
+ProfileMiddleware 在请求头 X-Profile 与配置一致时用 cProfile 分析单个请求，响应头 X-Profile-Id 给出结果ID。
+
+IdempotencyMiddleware 对带 Idempotency-Key 请求头的 POST 请求只执行一次，重复的请求重放第一次的响应，
+重放的响应带有 Idempotent-Replayed: true 响应头。
+"""
+import hashlib
+import logging
+import os
+import time
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import JSONResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+from app.services.metrics_service import MetricsService
+from app.services.profiler import Profiler
+from app.services.idempotency import IdempotencyStore, IdempotencyConflict, IdempotencyBusy
+from crawlers.utils import timing
+from crawlers.utils.tracing import Tracer, current_trace
+
+logger = logging.getLogger(__name__)
+
+
+class TimingMiddleware:
+    """请求计时中间件"""
+
+    # 默认配置，可通过 configure() 覆盖
+    enable: bool = True
+    # 是否返回 Server-Timing 响应头
+    server_timing: bool = True
+    # 不记录的路径前缀(高频抓取和管理后台)
+    exclude_prefixes: Tuple[str, ...] = ("/metrics", "/api/admin", "/docs", "/redoc", "/openapi.json")
+
+    def __init__(self, app):
+        self.app = app
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or not hasattr(cls, attr) or callable(getattr(cls, attr)):
+                logger.warning(f"未知的请求计时配置项: {key}")
+                continue
+            setattr(cls, attr, tuple(value) if attr == "exclude_prefixes" else value)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enable or scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        token = timing.begin()
+        timer = timing.current()
+        trace_tokens = Tracer.begin(scope["path"], scope["method"])
+        trace = current_trace()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                if self.server_timing:
+                    headers.append((b"server-timing", timer.server_timing().encode("latin-1")))
+                if trace is not None:
+                    headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            status_code = 500
+            timer.error = timer.error or str(e)
+            raise
+        finally:
+            timing.end(token)
+            # 只记录匹配到接口的请求，路由模板避免路径参数造成过多的统计维度
+            route = scope.get("route")
+            Tracer.finish(trace_tokens, route.path if route is not None else None, status_code)
+            if route is not None:
+                MetricsService.record_api_call(
+                    endpoint=route.path,
+                    method=scope["method"],
+                    status_code=status_code,
+                    latency_ms=int(timer.elapsed() * 1000),
+                    lc_uid=timer.lc_uid or _header(scope, b"x-lc-uid"),
+                    error_message=timer.error
+                )
+
+
+class ProfileMiddleware:
+    """单个请求的性能分析中间件"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not Profiler.request_token:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profiler.begin_request(_header(scope, b"x-profile"))
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace = current_trace()
+        profile_id = trace.trace_id if trace is not None else os.urandom(8).hex()
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            Profiler.finish_request(profile, profile_id, scope["path"], scope["method"], status_code,
+                                    time.perf_counter() - started)
+
+
+class IdempotencyMiddleware:
+    """幂等键中间件"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not IdempotencyStore.handles(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        key = _header(scope, b"idempotency-key")
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > 255:
+            await JSONResponse({"detail": "Idempotency-Key 过长"}, status_code=400)(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        # 请求体和会话共同决定请求是否相同，不同会话不能重放他人的响应
+        digest = hashlib.sha256((_header(scope, b"x-lc-session") or "").encode("utf-8") + b"\n" + body)
+        request_hash = digest.hexdigest()
+        record = (_header(scope, b"x-lc-uid") or "", f"{scope['method']} {scope['path']}", key)
+
+        try:
+            stored = await IdempotencyStore.begin(record, request_hash)
+        except IdempotencyConflict as e:
+            await JSONResponse({"detail": str(e)}, status_code=422)(scope, receive, send)
+            return
+        except IdempotencyBusy as e:
+            await JSONResponse({"detail": str(e)}, status_code=409)(scope, receive, send)
+            return
+
+        if stored is not None:
+            await send({
+                "type": "http.response.start",
+                "status": stored.status_code,
+                "headers": stored.headers + [(b"idempotent-replayed", b"true")],
+            })
+            await send({"type": "http.response.body", "body": stored.body})
+            return
+
+        body_sent = False
+        status_code = None
+        headers = []
+        chunks = []
+        complete = False
+
+        async def receive_wrapper():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_wrapper(message):
+            nonlocal status_code, headers, complete
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            await IdempotencyStore.finish(
+                record, request_hash, status_code if complete else None, headers, b"".join(chunks) if complete else None
+            )
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def record_http_exception(request: Request, exc: StarletteHTTPException):
+    """把 HTTPException 的错误信息记入当前请求后交给默认处理"""
+    if exc.status_code >= 400:
+        timing.annotate(error=str(exc.detail))
+    return await http_exception_handler(request, exc)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSON 响应，序列化耗时计入当前请求的 serialize 阶段"""
+
+    def render(self, content) -> bytes:
+        with timing.stage("serialize"):
+            return super().render(content)
@@ -3,11 +3,22 @@
 数据库初始化和连接管理
 """
 import os
+import queue
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from urllib.parse import quote
 import logging
 
+import yaml
+
+from crawlers.utils.prometheus import REGISTRY, Histogram
+from crawlers.utils.timing import add_stage
+from crawlers.utils.tracing import record_span
+
 logger = logging.getLogger(__name__)
 
 # 数据库文件路径 - 挂载到宿主机
@@ -16,10 +27,177 @@ DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__)
 # 确保数据目录存在
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
+# 读取数据库配置
+_config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.yaml')
+with open(_config_path, 'r', encoding='utf-8') as _file:
+    DB_CONFIG = (yaml.safe_load(_file) or {}).get('Database', {})
+
+# 获取连接的等待时间，写连接由锁串行化，等待时间反映写入争用
+DB_WAIT = Histogram(
+    "app_db_pool_wait_seconds", "Time spent waiting for a SQLite connection",
+    ("mode",), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    registry=REGISTRY
+)
+
+
+class ConnectionPool:
+    """
+    SQLite连接池
+    
+    - 一个专用的写连接（WAL模式），由锁串行化，替代每次操作新建连接
+    - 多个只读连接，供管理后台和统计查询使用，WAL模式下读写互不阻塞
+    - 每个连接都有自己的预编译语句缓存
+    """
+    
+    def __init__(
+        self,
+        db_path: str,
+        busy_timeout_ms: int = 5000,
+        mmap_size: int = 67108864,
+        cached_statements: int = 256,
+        read_connections: int = 4
+    ):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.read_connections = read_connections
+        self._write_conn = None
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = queue.LifoQueue()
+        self.reads = 0
+        self.writes = 0
+    
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        if read_only:
+            conn = sqlite3.connect(
+                f"file:{quote(self.db_path)}?mode=ro", uri=True,
+                timeout=self.busy_timeout_ms / 1000,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout_ms / 1000,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+            # 新建的数据库启用增量VACUUM，必须在切换WAL和建表之前设置，对已有数据库无效
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.row_factory = sqlite3.Row  # 允许通过列名访问
+        return conn
+    
+    @contextmanager
+    def writer(self):
+        """
+        获取写连接，同一线程内可嵌套使用
+        
+        写锁是阻塞的线程锁，不能在事件循环上获取：异步代码通过 asyncio.to_thread 调用写操作，
+        或定义为普通函数的接口由 FastAPI 在线程池中执行。批量写入（回填、清理、汇总）每批单独提交，
+        持锁时间以一批为上限。
+        最外层退出时如果还有未提交的事务则回滚，与原来关闭连接时丢弃未提交修改的行为一致；
+        最外层从等待锁到释放的耗时计入当前请求的 db 阶段
+        """
+        started = time.perf_counter()
+        with self._write_lock:
+            DB_WAIT.labels("writer").observe(time.perf_counter() - started)
+            if self._write_conn is None:
+                self._write_conn = self._connect()
+            conn = self._write_conn
+            depth = getattr(self._local, "depth", 0)
+            self._local.depth = depth + 1
+            self.writes += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth = depth
+                if depth == 0:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    ended = time.perf_counter()
+                    add_stage("db", ended - started)
+                    record_span("db", started, ended, mode="writer")
+    
+    @contextmanager
+    def reader(self):
+        """获取只读连接，用完放回池中，使用时间计入当前请求的 db 阶段"""
+        started = time.perf_counter()
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect(read_only=True)
+        DB_WAIT.labels("reader").observe(time.perf_counter() - started)
+        self.reads += 1
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._readers.qsize() < self.read_connections:
+                self._readers.put(conn)
+            else:
+                conn.close()
+            ended = time.perf_counter()
+            add_stage("db", ended - started)
+            record_span("db", started, ended, mode="reader")
+    
+    def close_all(self):
+        """关闭所有连接"""
+        with self._write_lock:
+            if self._write_conn is not None:
+                self._write_conn.close()
+                self._write_conn = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+    
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "reads": self.reads,
+            "idle_readers": self._readers.qsize(),
+            "busy_timeout_ms": self.busy_timeout_ms,
+            "mmap_size": self.mmap_size,
+        }
+
+
+pool = ConnectionPool(
+    DB_PATH,
+    busy_timeout_ms=DB_CONFIG.get('Busy_Timeout_MS', 5000),
+    mmap_size=DB_CONFIG.get('Mmap_Size', 67108864),
+    cached_statements=DB_CONFIG.get('Cached_Statements', 256),
+    read_connections=DB_CONFIG.get('Read_Connections', 4)
+)
+
+
+def utc_now() -> Tuple[str, int]:
+    """
+    当前UTC时间
+    
+    Returns:
+        (ISO格式字符串, 毫秒时间戳)，两者来自同一时刻
+    """
+    now = datetime.now(timezone.utc)
+    return now.replace(tzinfo=None).isoformat(), int(now.timestamp() * 1000)
+
 
 def init_database():
-    """初始化数据库，创建所有必需的表"""
-    conn = sqlite3.connect(DB_PATH)
+    """初始化数据库，创建所有必需的表并执行结构迁移"""
+    with pool.writer() as conn:
+        _create_tables(conn)
+        run_migrations(conn)
+
+
+def _create_tables(conn):
     cursor = conn.cursor()
     
     try:
@@ -53,17 +231,6 @@ def init_database():
         )
         """)
         
-        # 为流水表创建索引
-        cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_credit_ledger_lc_uid 
-        ON credit_ledger(lc_uid)
-        """)
-        
-        cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_credit_ledger_created_at 
-        ON credit_ledger(created_at)
-        """)
-        
         # 3. IAP交易表
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS iap_transactions (
@@ -103,17 +270,6 @@ def init_database():
         except:
             pass  # 列已存在
         
-        # 为下载任务表创建索引
-        cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_download_jobs_lc_uid 
-        ON download_jobs(lc_uid)
-        """)
-        
-        cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_download_jobs_status 
-        ON download_jobs(status)
-        """)
-        
         # 5. API调用监控表
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS api_metrics (
@@ -130,21 +286,30 @@ def init_database():
         )
         """)
         
-        # 为API监控表创建索引
+        # 为API监控表创建索引（时间相关的索引由迁移创建）
         cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_api_metrics_endpoint 
         ON api_metrics(endpoint)
         """)
         
-        cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_api_metrics_created_at 
-        ON api_metrics(created_at)
-        """)
-        
-        cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_api_metrics_is_external 
-        ON api_metrics(is_external)
-        """)
+        # API监控汇总表：每分钟/每小时的调用数、成功数、错误数和延迟直方图，按 (端点, 方法, 外部API) 聚合
+        for table, ts_column in (("api_metrics_minute", "minute_ts"), ("api_metrics_hour", "hour_ts")):
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {ts_column} INTEGER NOT NULL,
+                endpoint TEXT NOT NULL,
+                method TEXT NOT NULL,
+                external_api TEXT NOT NULL DEFAULT '',
+                is_external INTEGER NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL,
+                success INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                total_latency_ms INTEGER NOT NULL,
+                max_latency_ms INTEGER NOT NULL,
+                buckets TEXT NOT NULL,
+                PRIMARY KEY ({ts_column}, endpoint, method, external_api, is_external)
+            ) WITHOUT ROWID
+            """)
         
         # 6. 用户反馈表
         cursor.execute("""
@@ -185,19 +350,227 @@ def init_database():
         conn.rollback()
         logger.error(f"数据库初始化失败: {e}")
         raise
-    finally:
-        conn.close()
+
+
+# ==================== 结构迁移 ====================
+
+# 回填时每批更新的行数，每批单独提交，避免长时间占用写锁
+MIGRATION_BATCH_SIZE = DB_CONFIG.get('Migration_Batch_Size', 20000)
+# 回填批次之间的间隔(毫秒)，让其它写操作获得写锁
+MIGRATION_PAUSE_MS = DB_CONFIG.get('Migration_Pause_MS', 20)
+
+# ISO格式文本时间转换为毫秒时间戳（精确到毫秒，没有小数部分时按0处理）
+_ISO_TO_MS = "CAST(strftime('%s', {0}) AS INTEGER) * 1000 + CAST(substr({0} || '000', 21, 3) AS INTEGER)"
+
+
+def _add_column(cursor, table: str, column: str, declaration: str) -> None:
+    """列不存在时添加，迁移中断后重新执行也不会出错"""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+def _backfill_epoch_ms(db: "ConnectionPool", table: str, text_column: str, ms_column: str,
+                       stop: Optional[threading.Event]) -> int:
+    """
+    按 rowid 分批把文本时间换算为毫秒时间戳
+    
+    每批单独获取写锁，与进度一起提交，批次之间休眠 MIGRATION_PAUSE_MS；中断后从保存的 rowid 继续
+    """
+    key = f"epoch_ms_backfill:{table}.{ms_column}"
+    with db.writer() as conn:
+        last_rowid = get_meta(conn, key)
+    if last_rowid == "done":
+        return 0
+    last_rowid = int(last_rowid or 0)
+    total = 0
+    expression = _ISO_TO_MS.format(text_column)
+    while stop is None or not stop.is_set():
+        with db.writer() as conn:
+            row = conn.execute(f"""
+                SELECT MAX(rowid) FROM (
+                    SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?
+                )
+            """, (last_rowid, MIGRATION_BATCH_SIZE)).fetchone()
+            if row[0] is None:
+                # 迁移之后写入的记录都带有毫秒时间，追上末尾即完成
+                set_meta(conn, key, "done")
+                conn.commit()
+                break
+            cursor = conn.execute(f"""
+                UPDATE {table} SET {ms_column} = {expression}
+                WHERE rowid > ? AND rowid <= ? AND {ms_column} IS NULL
+            """, (last_rowid, row[0]))
+            set_meta(conn, key, row[0])
+            conn.commit()
+        total += cursor.rowcount
+        last_rowid = row[0]
+        time.sleep(MIGRATION_PAUSE_MS / 1000)
+    if total:
+        logger.info(f"回填 {table}.{ms_column}: {total} 行")
+    return total
+
+
+# 需要回填的 (表, 文本时间列, 毫秒时间列)
+EPOCH_MS_COLUMNS = (
+    ("api_metrics", "created_at", "created_at_ms"),
+    ("credit_ledger", "created_at", "created_at_ms"),
+    ("download_jobs", "created_at", "created_at_ms"),
+    ("download_jobs", "updated_at", "updated_at_ms"),
+)
+
+
+def backfill_epoch_ms(stop: Optional[threading.Event] = None, db: Optional["ConnectionPool"] = None) -> int:
+    """
+    回填迁移1新增的毫秒时间列，由应用生命周期在后台线程中执行，不在导入或启动时阻塞
+    
+    Args:
+        stop: 设置后在当前批次结束时停止，下次启动继续
+        db: 连接池，默认使用全局连接池
+    
+    Returns:
+        本次回填的行数
+    """
+    db = db or pool
+    total = 0
+    for table, text_column, ms_column in EPOCH_MS_COLUMNS:
+        if stop is not None and stop.is_set():
+            break
+        total += _backfill_epoch_ms(db, table, text_column, ms_column, stop)
+    return total
+
+
+def _migration_1_epoch_ms(conn) -> None:
+    """整数毫秒时间列和覆盖索引"""
+    cursor = conn.cursor()
+    _add_column(cursor, "api_metrics_minute", "success", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(cursor, "api_metrics", "created_at_ms", "INTEGER")
+    _add_column(cursor, "credit_ledger", "created_at_ms", "INTEGER")
+    _add_column(cursor, "download_jobs", "created_at_ms", "INTEGER")
+    _add_column(cursor, "download_jobs", "updated_at_ms", "INTEGER")
+    conn.commit()
+    
+    # 已有记录的毫秒时间由 backfill_epoch_ms 在后台分批回填
+    # 复合索引覆盖按用户/类型过滤再按时间排序的查询，前缀相同的单列索引不再需要
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS idx_credit_ledger_uid_time ON credit_ledger(lc_uid, created_at_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_credit_ledger_time ON credit_ledger(created_at_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_api_metrics_external_time ON api_metrics(is_external, created_at_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_api_metrics_time ON api_metrics(created_at_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_download_jobs_uid_time ON download_jobs(lc_uid, created_at_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_download_jobs_time ON download_jobs(created_at_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_download_jobs_status_updated ON download_jobs(status, updated_at_ms)",
+        "DROP INDEX IF EXISTS idx_credit_ledger_lc_uid",
+        "DROP INDEX IF EXISTS idx_credit_ledger_created_at",
+        "DROP INDEX IF EXISTS idx_api_metrics_created_at",
+        "DROP INDEX IF EXISTS idx_api_metrics_is_external",
+        "DROP INDEX IF EXISTS idx_download_jobs_lc_uid",
+        "DROP INDEX IF EXISTS idx_download_jobs_status",
+    ):
+        cursor.execute(statement)
+    conn.commit()
+    cursor.execute("ANALYZE")
+
+
+def _migration_2_job_sweep_index(conn) -> None:
+    """过期任务清理按 (confirmed, status, updated_at_ms) 查找未确认的任务"""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_download_jobs_confirm_status_updated "
+        "ON download_jobs(confirmed, status, updated_at_ms)"
+    )
+    conn.commit()
+
+
+def _migration_3_idempotency_keys(conn) -> None:
+    """幂等键及其保存的响应，expires_at_ms 对执行中的键是锁的过期时间"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        lc_uid TEXT NOT NULL,
+        endpoint TEXT NOT NULL,
+        idem_key TEXT NOT NULL,
+        request_hash TEXT NOT NULL,
+        status_code INTEGER,
+        headers TEXT,
+        body BLOB,
+        created_at_ms INTEGER NOT NULL,
+        expires_at_ms INTEGER NOT NULL,
+        PRIMARY KEY (lc_uid, endpoint, idem_key)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at_ms)")
+    conn.commit()
+
+
+def _migration_4_app_meta(conn) -> None:
+    """键值表，保存后台任务的进度等需要跨重启保留的状态"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    ) WITHOUT ROWID
+    """)
+    conn.commit()
+
+
+# 按顺序排列的迁移，版本号记录在 PRAGMA user_version 中
+MIGRATIONS = [
+    (1, _migration_1_epoch_ms),
+    (2, _migration_2_job_sweep_index),
+    (3, _migration_3_idempotency_keys),
+    (4, _migration_4_app_meta),
+]
+
+
+def run_migrations(conn) -> int:
+    """
+    执行尚未执行的迁移
+    
+    每个迁移完成后才更新 user_version，中途失败时下次启动会重新执行该迁移，因此迁移必须可重复执行
+    
+    Returns:
+        当前结构版本
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        started = time.perf_counter()
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"数据库迁移 {target} 失败: {e}")
+            raise
+        version = target
+        logger.info(f"数据库迁移到版本 {target}，耗时 {time.perf_counter() - started:.2f} 秒")
+    return version
+
+
+def get_meta(conn, key: str) -> Optional[str]:
+    """读取 app_meta 中的值，不存在时返回 None"""
+    row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_meta(conn, key: str, value) -> None:
+    """写入 app_meta，由调用方提交，可以与其它修改放在同一个事务中"""
+    conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (key, str(value)))
 
 
 @contextmanager
 def get_db_connection():
-    """获取数据库连接的上下文管理器"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # 允许通过列名访问
-    try:
+    """获取数据库写连接的上下文管理器"""
+    with pool.writer() as conn:
+        yield conn
+
+
+@contextmanager
+def get_read_connection():
+    """获取数据库只读连接的上下文管理器（管理后台、统计查询）"""
+    with pool.reader() as conn:
         yield conn
-    finally:
-        conn.close()
 
 
 def get_or_create_user(lc_uid: str, initial_credits: int = 100) -> dict:
@@ -222,7 +595,7 @@ def get_or_create_user(lc_uid: str, initial_credits: int = 100) -> dict:
             return dict(user)
         
         # 创建新用户
-        now = datetime.utcnow().isoformat()
+        now, now_ms = utc_now()
         cursor.execute("""
         INSERT INTO users (lc_uid, credits_balance, created_at, updated_at)
         VALUES (?, ?, ?, ?)
@@ -230,9 +603,9 @@ def get_or_create_user(lc_uid: str, initial_credits: int = 100) -> dict:
         
         # 记录积分流水
         cursor.execute("""
-        INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at)
-        VALUES (?, ?, ?, ?, ?)
-        """, (lc_uid, initial_credits, "signup", None, now))
+        INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at, created_at_ms)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (lc_uid, initial_credits, "signup", None, now, now_ms))
         
         conn.commit()
         
@@ -248,4 +621,3 @@ def get_or_create_user(lc_uid: str, initial_credits: int = 100) -> dict:
 
 # 在模块加载时初始化数据库
 init_database()
-
@@ -36,6 +36,7 @@
 # FastAPI APP
 import uvicorn
 import asyncio
+import threading
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.router import router as api_router
@@ -50,8 +51,42 @@ import os
 # YAML
 import yaml
 
-# Metrics cleanup
-from app.services.metrics_service import MetricsService
+# Metrics write-behind recorder and retention
+from app.services.metrics_service import MetricsWriter
+from app.services.retention_service import RetentionService
+from app.services.job_sweeper import JobSweeper
+from app.services.download_worker import DownloadWorker
+from app.services.job_events import JobEvents
+
+# Event loop lag sampler
+from app.services.loop_monitor import LoopMonitor
+
+# Request timing middleware (metrics + Server-Timing)
+from app.api.middleware import (
+    TimingMiddleware, ProfileMiddleware, IdempotencyMiddleware, TimedJSONResponse, record_http_exception
+)
+from app.services.idempotency import IdempotencyStore
+from app.services.profiler import Profiler
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from crawlers.utils.tracing import Tracer
+
+# SQLite connection pool
+from app.db.database import pool as db_pool, backfill_epoch_ms
+
+# Shared HTTP client pool
+from crawlers.utils.client_pool import ClientPool
+
+# Hybrid metadata cache
+from crawlers.hybrid.hybrid_crawler import HybridCrawler
+
+# a_bogus signing service
+from crawlers.douyin.web.signer import ABogusSigner
+
+# Bilibili WBI mixin key
+from crawlers.bilibili.web.utils import WridManager
+
+# Token pools (importing the crawlers registers the Douyin/TikTok pools)
+from crawlers.utils.token_pool import TokenService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -59,40 +94,108 @@ logger = logging.getLogger(__name__)
 
 # 后台清理任务
 async def periodic_cleanup():
-    """每天清理一次过期的监控数据"""
+    """启动后在后台分批清理一次过期的监控数据和幂等键，之后按 Interval_Hours 定时清理"""
     while True:
         try:
-            await asyncio.sleep(86400)  # 24小时
-            deleted = MetricsService.cleanup_old_data()
-            logger.info(f"定时清理: 删除了 {deleted} 条过期监控记录")
+            result = await RetentionService.run_async()
+            logger.info(f"定时清理: 删除了 {result['deleted']} 条过期监控记录")
+            purged = await asyncio.to_thread(IdempotencyStore.purge)
+            if purged:
+                logger.info(f"定时清理: 删除了 {purged} 个过期幂等键")
+            await asyncio.sleep(RetentionService.interval_hours * 3600)
         except asyncio.CancelledError:
             break
         except Exception as e:
             logger.error(f"定时清理失败: {e}")
+            await asyncio.sleep(RetentionService.interval_hours * 3600)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时清理一次过期数据
-    try:
-        deleted = MetricsService.cleanup_old_data()
-        if deleted > 0:
-            logger.info(f"启动清理: 删除了 {deleted} 条过期监控记录")
-    except Exception as e:
-        logger.error(f"启动清理失败: {e}")
-    
-    # 启动后台清理任务
-    cleanup_task = asyncio.create_task(periodic_cleanup())
+    # 启动爬虫共享连接池
+    ClientPool.configure(**config.get('HTTP_Client', {}))
+    ClientPool.start()
+
+    # 配置混合解析元数据缓存
+    HybridCrawler.configure_cache(**{k.lower(): v for k, v in config.get('Metadata_Cache', {}).items()})
+
+    # 配置a_bogus签名服务
+    ABogusSigner.configure(**config.get('ABogus_Signer', {}))
+
+    # 在后台预取 Bilibili WBI mixin key，首个请求无需等待导航接口
+    WridManager.prefetch()
+
+    # 启动令牌池后台补充任务
+    TokenService.configure(**config.get('Token_Pool', {}))
+    TokenService.start()
+
+    # 在后台线程中分批回填迁移新增的毫秒时间列（不阻塞启动）
+    backfill_stop = threading.Event()
+    backfill_task = asyncio.create_task(asyncio.to_thread(backfill_epoch_ms, backfill_stop))
+
+    # 启动监控数据批量写入任务
+    MetricsWriter.configure(**config.get('Metrics_Writer', {}))
+    MetricsWriter.start()
+
+    # 启动后台清理任务（不阻塞启动）
+    RetentionService.configure(**config.get('Metrics_Retention', {}))
+    cleanup_task = asyncio.create_task(periodic_cleanup()) if RetentionService.enable else None
+
+    # 启动过期下载任务清理（解冻超时未确认的积分）
+    JobSweeper.configure(**config.get('Job_Sweeper', {}))
+    JobSweeper.start()
+
+    # 启动下载任务工作池（异步模式），状态变化通知长轮询的 /status 请求
+    JobEvents.configure(**config.get('Job_Events', {}))
+    DownloadWorker.configure(**config.get('Download_Worker', {}))
+    DownloadWorker.start()
+
+    # 启动事件循环延迟采样
+    LoopMonitor.configure(**config.get('Loop_Monitor', {}))
+    LoopMonitor.start()
     
     yield
     
     # 关闭时取消后台任务
-    cleanup_task.cancel()
+    if cleanup_task is not None:
+        cleanup_task.cancel()
+        try:
+            await cleanup_task
+        except asyncio.CancelledError:
+            pass
+
+    # 停止下载任务工作池，正在执行的任务改回排队
+    await DownloadWorker.stop()
+
+    # 停止过期下载任务清理
+    await JobSweeper.stop()
+
+    # 停止事件循环延迟采样
+    await LoopMonitor.stop()
+
+    # 停止令牌池补充任务
+    await TokenService.stop()
+
+    # 关闭爬虫共享连接池
+    await ClientPool.aclose_all()
+
+    # 关闭签名工作池
+    ABogusSigner.shutdown()
+    await WridManager.stop()
+
+    # 写入剩余的监控记录
+    await MetricsWriter.stop()
+
+    # 停止毫秒时间回填，下次启动从保存的进度继续
+    backfill_stop.set()
     try:
-        await cleanup_task
-    except asyncio.CancelledError:
-        pass
+        await backfill_task
+    except Exception as e:
+        logger.error(f"毫秒时间回填失败: {e}")
+
+    # 关闭数据库连接
+    db_pool.close_all()
 
 # Load Config
 
@@ -180,8 +283,20 @@ app = FastAPI(
     docs_url=docs_url,  # 文档路径
     redoc_url=redoc_url,  # redoc文档路径
     lifespan=lifespan,  # 生命周期管理
+    default_response_class=TimedJSONResponse,  # 记录序列化耗时
 )
 
+# 统一记录接口调用和分阶段耗时，并追踪每个请求
+TimingMiddleware.configure(**config.get('Request_Timing', {}))
+Tracer.configure(**config.get('Tracing', {}))
+Profiler.configure(**config.get('Profiler', {}))
+IdempotencyStore.configure(**config.get('Idempotency', {}))
+# 后添加的中间件在外层：性能分析在计时之内，结果ID与追踪ID相同；幂等键在最内层，重放的请求同样计入监控
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(ProfileMiddleware)
+app.add_middleware(TimingMiddleware)
+app.add_exception_handler(StarletteHTTPException, record_http_exception)
+
 # API router
 app.include_router(api_router, prefix="/api")
 
@@ -189,6 +304,10 @@ app.include_router(api_router, prefix="/api")
 from app.api.endpoints import home
 app.include_router(home.router)
 
+# Prometheus metrics (/metrics)
+from app.api.endpoints import prometheus
+app.include_router(prometheus.router)
+
 # PyWebIO APP
 if config['Web']['PyWebIO_Enable']:
     webapp = asgi_app(lambda: MainView().main_view())
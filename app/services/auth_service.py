@@ -10,6 +10,8 @@ import logging
 from typing import Optional, Tuple
 from functools import lru_cache
 
+from crawlers.utils.timing import stage
+
 logger = logging.getLogger(__name__)
 
 # 加载配置
@@ -43,7 +45,7 @@ class AuthService:
     @staticmethod
     async def verify_session(lc_uid: str, lc_session: str) -> Tuple[bool, Optional[str]]:
         """
-        验证LeanCloud Session Token
+        验证LeanCloud Session Token，耗时计入当前请求的 auth 阶段
         
         Args:
             lc_uid: LeanCloud用户objectId
@@ -52,6 +54,11 @@ class AuthService:
         Returns:
             (是否验证通过, 错误信息)
         """
+        with stage("auth"):
+            return await AuthService._verify_session(lc_uid, lc_session)
+    
+    @staticmethod
+    async def _verify_session(lc_uid: str, lc_session: str) -> Tuple[bool, Optional[str]]:
         # 检查是否启用验证
         if not AuthService.is_auth_enabled():
             logger.debug("身份验证已禁用，跳过验证")
@@ -5,11 +5,20 @@
 import logging
 from datetime import datetime
 from typing import Optional
-from app.db.database import get_db_connection, get_or_create_user
+from app.db.database import get_db_connection, get_or_create_user, utc_now
 
 logger = logging.getLogger(__name__)
 
 
+class InsufficientCredits(Exception):
+    """可用积分不足"""
+    
+    def __init__(self, available: int, required: int):
+        super().__init__(f"可用积分不足: 可用 {available}, 需要 {required}")
+        self.available = available
+        self.required = required
+
+
 class CreditService:
     """积分服务类"""
     
@@ -63,7 +72,7 @@ class CreditService:
                     return False
                 
                 # 扣除积分
-                now = datetime.utcnow().isoformat()
+                now, now_ms = utc_now()
                 new_balance = current_balance - amount
                 
                 cursor.execute("""
@@ -74,9 +83,9 @@ class CreditService:
                 
                 # 记录流水（负数）
                 cursor.execute("""
-                INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at)
-                VALUES (?, ?, ?, ?, ?)
-                """, (lc_uid, -amount, reason, ref_id, now))
+                INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at, created_at_ms)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, (lc_uid, -amount, reason, ref_id, now, now_ms))
                 
                 conn.commit()
                 
@@ -106,7 +115,7 @@ class CreditService:
             cursor = conn.cursor()
             
             try:
-                now = datetime.utcnow().isoformat()
+                now, now_ms = utc_now()
                 
                 # 增加积分
                 cursor.execute("""
@@ -117,9 +126,9 @@ class CreditService:
                 
                 # 记录流水（正数）
                 cursor.execute("""
-                INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at)
-                VALUES (?, ?, ?, ?, ?)
-                """, (lc_uid, amount, reason, ref_id, now))
+                INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at, created_at_ms)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, (lc_uid, amount, reason, ref_id, now, now_ms))
                 
                 conn.commit()
                 
@@ -149,13 +158,48 @@ class CreditService:
             cursor.execute("""
             SELECT * FROM credit_ledger
             WHERE lc_uid = ?
-            ORDER BY created_at DESC
+            ORDER BY created_at_ms DESC
             LIMIT ?
             """, (lc_uid, limit))
             
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
     
+    @staticmethod
+    def reserve_credits(cursor, lc_uid: str, amount: int, ref_id: Optional[str], now: str, now_ms: int) -> bool:
+        """
+        在调用方的事务中冻结积分并记录流水
+        
+        检查可用余额和增加冻结金额由一条条件UPDATE完成，不存在先读后写的竞争；
+        冻结不改变余额，流水的 delta 为0，ref_id 关联到任务。
+        调用方应先执行 BEGIN IMMEDIATE，并负责提交或回滚。
+        
+        Args:
+            cursor: 写连接的游标
+            lc_uid: LeanCloud用户ID
+            amount: 冻结金额（正数）
+            ref_id: 关联ID（如job_id）
+            now: 当前时间（ISO格式）
+            now_ms: 当前时间（毫秒时间戳）
+            
+        Returns:
+            是否成功（用户不存在或可用余额不足时为False）
+        """
+        cursor.execute("""
+        UPDATE users 
+        SET credits_frozen = credits_frozen + ?, updated_at = ?
+        WHERE lc_uid = ? AND credits_balance - credits_frozen >= ?
+        """, (amount, now, lc_uid, amount))
+        
+        if cursor.rowcount != 1:
+            return False
+        
+        cursor.execute("""
+        INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at, created_at_ms)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (lc_uid, 0, "download_freeze", ref_id, now, now_ms))
+        return True
+    
     @staticmethod
     def freeze_credits(lc_uid: str, amount: int, ref_id: Optional[str] = None) -> bool:
         """
@@ -173,38 +217,18 @@ class CreditService:
             cursor = conn.cursor()
             
             try:
-                # 检查可用余额（余额 - 已冻结）
-                cursor.execute(
-                    "SELECT credits_balance, credits_frozen FROM users WHERE lc_uid = ?",
-                    (lc_uid,)
-                )
-                row = cursor.fetchone()
-                
-                if not row:
-                    logger.error(f"用户不存在: {lc_uid}")
-                    return False
-                
-                current_balance = row["credits_balance"]
-                current_frozen = row["credits_frozen"] or 0
-                available = current_balance - current_frozen
+                now, now_ms = utc_now()
+                if not conn.in_transaction:
+                    cursor.execute("BEGIN IMMEDIATE")
                 
-                if available < amount:
-                    logger.warning(f"可用积分不足: {lc_uid}, 余额: {current_balance}, 已冻结: {current_frozen}, 可用: {available}, 需要: {amount}")
+                if not CreditService.reserve_credits(cursor, lc_uid, amount, ref_id, now, now_ms):
+                    conn.rollback()
+                    logger.warning(f"可用积分不足或用户不存在: {lc_uid}, 需要: {amount}")
                     return False
                 
-                # 增加冻结金额
-                now = datetime.utcnow().isoformat()
-                new_frozen = current_frozen + amount
-                
-                cursor.execute("""
-                UPDATE users 
-                SET credits_frozen = ?, updated_at = ?
-                WHERE lc_uid = ?
-                """, (new_frozen, now, lc_uid))
-                
                 conn.commit()
                 
-                logger.info(f"积分冻结成功: {lc_uid}, 金额: {amount}, ref_id: {ref_id}, 新冻结总额: {new_frozen}")
+                logger.info(f"积分冻结成功: {lc_uid}, 金额: {amount}, ref_id: {ref_id}")
                 return True
                 
             except Exception as e:
@@ -212,6 +236,46 @@ class CreditService:
                 logger.error(f"积分冻结失败: {lc_uid}, 错误: {e}")
                 return False
     
+    @staticmethod
+    def deduct_frozen(cursor, lc_uid: str, amount: int, reason: str, ref_id: Optional[str], now: str,
+                      now_ms: int) -> None:
+        """
+        在调用方的事务中把冻结的积分真正扣除并记录流水
+        
+        调用方负责 BEGIN IMMEDIATE、提交或回滚，并保证同一任务只扣除一次。
+        
+        Args:
+            cursor: 写连接的游标
+            lc_uid: LeanCloud用户ID
+            amount: 扣除金额（正数）
+            reason: 扣除原因
+            ref_id: 关联ID（如job_id）
+            now: 当前时间（ISO格式）
+            now_ms: 当前时间（毫秒时间戳）
+        """
+        cursor.execute("""
+        UPDATE users 
+        SET credits_balance = credits_balance - ?, 
+            credits_frozen = credits_frozen - ?,
+            updated_at = ?
+        WHERE lc_uid = ?
+        """, (amount, amount, now, lc_uid))
+        
+        cursor.execute("""
+        INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at, created_at_ms)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, (lc_uid, -amount, reason, ref_id, now, now_ms))
+    
+    @staticmethod
+    def release_frozen(cursor, lc_uid: str, amount: int, now: str) -> None:
+        """在调用方的事务中解冻积分，调用方负责提交或回滚"""
+        cursor.execute("""
+        UPDATE users 
+        SET credits_frozen = MAX(0, credits_frozen - ?),
+            updated_at = ?
+        WHERE lc_uid = ?
+        """, (amount, now, lc_uid))
+    
     @staticmethod
     def confirm_deduct(lc_uid: str, amount: int, reason: str, ref_id: Optional[str] = None) -> bool:
         """
@@ -230,22 +294,10 @@ class CreditService:
             cursor = conn.cursor()
             
             try:
-                now = datetime.utcnow().isoformat()
-                
-                # 减少余额和冻结金额
-                cursor.execute("""
-                UPDATE users 
-                SET credits_balance = credits_balance - ?, 
-                    credits_frozen = credits_frozen - ?,
-                    updated_at = ?
-                WHERE lc_uid = ?
-                """, (amount, amount, now, lc_uid))
+                now, now_ms = utc_now()
                 
-                # 记录流水（负数）
-                cursor.execute("""
-                INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at)
-                VALUES (?, ?, ?, ?, ?)
-                """, (lc_uid, -amount, reason, ref_id, now))
+                # 减少余额和冻结金额，记录流水（负数）
+                CreditService.deduct_frozen(cursor, lc_uid, amount, reason, ref_id, now, now_ms)
                 
                 conn.commit()
                 
@@ -277,12 +329,7 @@ class CreditService:
                 now = datetime.utcnow().isoformat()
                 
                 # 减少冻结金额
-                cursor.execute("""
-                UPDATE users 
-                SET credits_frozen = MAX(0, credits_frozen - ?),
-                    updated_at = ?
-                WHERE lc_uid = ?
-                """, (amount, now, lc_uid))
+                CreditService.release_frozen(cursor, lc_uid, amount, now)
                 
                 conn.commit()
                 
@@ -362,7 +409,7 @@ class CreditService:
                     logger.warning(f"IAP交易已存在，拒绝重复充值: {transaction_id}")
                     return {"success": False, "error": "交易已处理，请勿重复提交"}
                 
-                now = datetime.utcnow().isoformat()
+                now, now_ms = utc_now()
                 
                 # 记录IAP交易
                 cursor.execute("""
@@ -379,9 +426,9 @@ class CreditService:
                 
                 # 记录流水（正数）
                 cursor.execute("""
-                INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at)
-                VALUES (?, ?, ?, ?, ?)
-                """, (lc_uid, amount, reason, transaction_id, now))
+                INSERT INTO credit_ledger (lc_uid, delta, reason, ref_id, created_at, created_at_ms)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, (lc_uid, amount, reason, transaction_id, now, now_ms))
                 
                 # 获取新余额
                 cursor.execute(
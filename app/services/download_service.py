@@ -5,10 +5,10 @@
 import uuid
 import json
 import logging
-from datetime import datetime
 from typing import Optional, Dict, Any
-from app.db.database import get_db_connection
-from app.services.credit_service import CreditService
+from app.db.database import get_db_connection, get_or_create_user, utc_now
+from app.services.credit_service import CreditService, InsufficientCredits
+from app.services.job_events import JobEvents
 
 logger = logging.getLogger(__name__)
 
@@ -60,7 +60,61 @@ class DownloadService:
         return DownloadService.PLATFORM_COSTS.get(platform, 20)
     
     @staticmethod
-    def create_download_job(lc_uid: str, url: str) -> Optional[Dict[str, Any]]:
+    def reserve_job(conn, job_id: str, lc_uid: str, url: str, platform: str, cost: int,
+                    status: str = "running") -> Optional[Dict[str, Any]]:
+        """
+        在一个 BEGIN IMMEDIATE 事务中冻结积分、记录流水并创建任务
+        
+        BEGIN IMMEDIATE 在事务开始时就取得写锁，多个进程同时预占时不会读到过期的余额，
+        也不会在提交时因为升级锁失败而出错。
+        
+        Args:
+            conn: 写连接
+            job_id: 任务ID
+            lc_uid: LeanCloud用户ID
+            url: 视频链接
+            platform: 平台名称
+            cost: 冻结积分
+            status: 初始状态（异步模式为 queued）
+            
+        Returns:
+            任务信息；用户不存在或可用余额不足时回滚并返回None
+        """
+        cursor = conn.cursor()
+        now, now_ms = utc_now()
+        if not conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        
+        try:
+            if not CreditService.reserve_credits(cursor, lc_uid, cost, job_id, now, now_ms):
+                conn.rollback()
+                return None
+            
+            cursor.execute("""
+            INSERT INTO download_jobs 
+            (job_id, lc_uid, url, platform, cost_credits, status, confirmed,
+             created_at, updated_at, created_at_ms, updated_at_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (job_id, lc_uid, url, platform, cost, status, 0, now, now, now_ms, now_ms))
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        return {
+            "job_id": job_id,
+            "lc_uid": lc_uid,
+            "url": url,
+            "platform": platform,
+            "cost_credits": cost,
+            "status": status,
+            "confirmed": 0,
+            "created_at": now
+        }
+    
+    @staticmethod
+    def create_download_job(lc_uid: str, url: str, status: str = "running") -> Optional[Dict[str, Any]]:
         """
         创建下载任务并冻结积分（延迟扣分模式）
         
@@ -70,65 +124,48 @@ class DownloadService:
         3. 客户端确认下载成功：真正扣除积分
         4. 客户端取消或超时：解冻积分（返还）
         
+        余额检查、冻结、流水和任务记录在同一个事务中完成，见 reserve_job；
+        新用户先创建并赠送初始积分再重试一次。
+        
         Args:
             lc_uid: LeanCloud用户ID
             url: 视频链接
+            status: 初始状态，running 为同步解析，queued 为交给工作池解析
             
         Returns:
-            任务信息或None（余额不足）
+            任务信息，数据库错误时为None
+            
+        Raises:
+            InsufficientCredits: 可用积分不足
         """
         job_id = str(uuid.uuid4())
         platform = DownloadService.detect_platform(url)
         cost = DownloadService.get_cost_for_platform(platform)
         
-        # 冻结积分（预占，不真正扣除）
-        success = CreditService.freeze_credits(
-            lc_uid=lc_uid,
-            amount=cost,
-            ref_id=job_id
-        )
-        
-        if not success:
-            logger.warning(f"积分不足，无法创建下载任务: {lc_uid}, {url}")
-            return None
-        
-        # 创建任务记录
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            now = datetime.utcnow().isoformat()
+        for _ in range(2):
+            with get_db_connection() as conn:
+                try:
+                    job = DownloadService.reserve_job(conn, job_id, lc_uid, url, platform, cost, status)
+                except Exception as e:
+                    logger.error(f"下载任务创建失败: {e}")
+                    return None
+                
+                if job is not None:
+                    logger.info(f"下载任务创建成功: {job_id}, 用户: {lc_uid}, 平台: {platform}, 冻结积分: {cost}")
+                    return job
+                
+                # 预占失败时才查询余额，区分余额不足和新用户
+                row = conn.execute(
+                    "SELECT credits_balance - credits_frozen AS available FROM users WHERE lc_uid = ?",
+                    (lc_uid,)
+                ).fetchone()
             
-            try:
-                cursor.execute("""
-                INSERT INTO download_jobs 
-                (job_id, lc_uid, url, platform, cost_credits, status, confirmed, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (job_id, lc_uid, url, platform, cost, "running", 0, now, now))
-                
-                conn.commit()
-                
-                logger.info(f"下载任务创建成功: {job_id}, 用户: {lc_uid}, 平台: {platform}, 冻结积分: {cost}")
-                
-                return {
-                    "job_id": job_id,
-                    "lc_uid": lc_uid,
-                    "url": url,
-                    "platform": platform,
-                    "cost_credits": cost,
-                    "status": "running",
-                    "confirmed": 0,
-                    "created_at": now
-                }
-                
-            except Exception as e:
-                conn.rollback()
-                # 回滚积分冻结
-                CreditService.unfreeze_credits(
-                    lc_uid=lc_uid,
-                    amount=cost,
-                    ref_id=job_id
-                )
-                logger.error(f"下载任务创建失败: {e}")
-                return None
+            if row is not None:
+                logger.warning(f"积分不足，无法创建下载任务: {lc_uid}, {url}")
+                raise InsufficientCredits(row["available"], cost)
+            get_or_create_user(lc_uid)
+        
+        raise InsufficientCredits(0, cost)
     
     @staticmethod
     def update_job_status(job_id: str, status: str, result_data: Optional[Dict] = None, 
@@ -139,6 +176,7 @@ class DownloadService:
         注意：
         - 解析失败(failed)时：解冻积分（返还）
         - 解析成功(succeeded)时：不扣积分，等待客户端确认
+        - 只更新 queued/running 且未确认的任务，解析期间已被取消或过期的任务不会被覆盖
         
         Args:
             job_id: 任务ID
@@ -148,46 +186,36 @@ class DownloadService:
         """
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            now = datetime.utcnow().isoformat()
+            now, now_ms = utc_now()
+            result_json = json.dumps(result_data, ensure_ascii=False) if result_data else None
+            # 失败的任务积分已返还，与取消和过期一样标记为 -1，之后不能再确认或取消
+            confirmed = -1 if status == "failed" else 0
+            if not conn.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
             
             try:
-                # 获取任务信息
-                cursor.execute("""
-                SELECT lc_uid, cost_credits, status, confirmed FROM download_jobs 
-                WHERE job_id = ?
-                """, (job_id,))
-                
-                row = cursor.fetchone()
-                if not row:
-                    logger.error(f"任务不存在: {job_id}")
+                # 只更新仍在排队或解析中的任务；解析期间被取消或过期的任务保持原状态
+                row = cursor.execute("""
+                UPDATE download_jobs 
+                SET status = ?, confirmed = ?, result_data = ?, error_message = ?, updated_at = ?, updated_at_ms = ?
+                WHERE job_id = ? AND confirmed = 0 AND status IN ('queued', 'running')
+                RETURNING lc_uid, cost_credits
+                """, (status, confirmed, result_json, error_message, now, now_ms, job_id)).fetchone()
+                
+                if row is None:
+                    conn.rollback()
+                    logger.info(f"任务不存在或已结束，忽略状态更新: {job_id} -> {status}")
                     return
                 
-                lc_uid = row["lc_uid"]
-                cost_credits = row["cost_credits"]
-                old_status = row["status"]
-                confirmed = row["confirmed"]
-                
-                # 如果解析失败，解冻积分
-                if status == "failed" and old_status == "running" and confirmed == 0:
-                    CreditService.unfreeze_credits(
-                        lc_uid=lc_uid,
-                        amount=cost_credits,
-                        ref_id=job_id
-                    )
+                # 如果解析失败（或排队的任务无法执行），在同一个事务中解冻积分
+                if status == "failed":
+                    CreditService.release_frozen(cursor, row["lc_uid"], row["cost_credits"], now)
                     logger.info(f"解析失败，积分已解冻: {job_id}")
                 
-                # 更新任务状态
-                result_json = json.dumps(result_data, ensure_ascii=False) if result_data else None
-                
-                cursor.execute("""
-                UPDATE download_jobs 
-                SET status = ?, result_data = ?, error_message = ?, updated_at = ?
-                WHERE job_id = ?
-                """, (status, result_json, error_message, now, job_id))
-                
                 conn.commit()
+                JobEvents.publish(job_id, status)
                 
-                logger.info(f"任务状态更新: {job_id}, {old_status} -> {status}")
+                logger.info(f"任务状态更新: {job_id} -> {status}")
                 
             except Exception as e:
                 conn.rollback()
@@ -227,12 +255,28 @@ class DownloadService:
             
             return job
     
+    @staticmethod
+    def _settle_failure(cursor, job_id: str, lc_uid: str) -> Dict[str, Any]:
+        """确认或取消没有改动任务时，读取任务返回具体原因"""
+        row = cursor.execute(
+            "SELECT lc_uid, status, confirmed FROM download_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if not row:
+            return {"success": False, "message": "任务不存在"}
+        if row["lc_uid"] != lc_uid:
+            return {"success": False, "message": "无权操作此任务"}
+        if row["confirmed"] != 0:
+            return {"success": False, "message": "任务已确认或已取消"}
+        return {"success": False, "message": f"任务状态无效({row['status']})，无法确认"}
+    
     @staticmethod
     def confirm_download(job_id: str, lc_uid: str) -> Dict[str, Any]:
         """
         确认下载成功（客户端调用）
         
-        客户端在文件下载并保存成功后调用此方法，真正扣除积分
+        客户端在文件下载并保存成功后调用此方法，真正扣除积分。
+        在一个 BEGIN IMMEDIATE 事务中用条件UPDATE标记任务已确认，只有改动了任务的请求才扣除积分，
+        并发的确认、取消和过期清理中只有一个生效。
         
         Args:
             job_id: 任务ID
@@ -243,30 +287,32 @@ class DownloadService:
         """
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            now = datetime.utcnow().isoformat()
+            now, now_ms = utc_now()
+            if not conn.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
             
             try:
-                # 获取任务信息（包含result_data）
-                cursor.execute("""
-                SELECT lc_uid, cost_credits, status, confirmed, result_data FROM download_jobs 
-                WHERE job_id = ?
-                """, (job_id,))
-                
-                row = cursor.fetchone()
-                if not row:
-                    return {"success": False, "message": "任务不存在"}
+                # 支持 pending_confirm 和 succeeded 状态
+                row = cursor.execute("""
+                UPDATE download_jobs 
+                SET confirmed = 1, status = 'succeeded', updated_at = ?, updated_at_ms = ?
+                WHERE job_id = ? AND lc_uid = ? AND confirmed = 0 AND status IN ('pending_confirm', 'succeeded')
+                RETURNING cost_credits, result_data
+                """, (now, now_ms, job_id, lc_uid)).fetchone()
                 
-                if row["lc_uid"] != lc_uid:
-                    return {"success": False, "message": "无权操作此任务"}
+                if row is None:
+                    conn.rollback()
+                    return DownloadService._settle_failure(cursor, job_id, lc_uid)
                 
-                if row["confirmed"] != 0:
-                    return {"success": False, "message": "任务已确认或已取消"}
+                cost_credits = row["cost_credits"]
                 
-                # 支持 pending_confirm 和 succeeded 状态
-                if row["status"] not in ("pending_confirm", "succeeded"):
-                    return {"success": False, "message": f"任务状态无效({row['status']})，无法确认"}
+                # 真正扣除积分（从冻结转为扣除），与任务状态在同一个事务中提交
+                CreditService.deduct_frozen(
+                    cursor, lc_uid, cost_credits, "download_confirmed", job_id, now, now_ms
+                )
                 
-                cost_credits = row["cost_credits"]
+                conn.commit()
+                JobEvents.publish(job_id, "succeeded")
                 
                 # 解析视频信息
                 video_info = None
@@ -276,26 +322,6 @@ class DownloadService:
                     except:
                         pass
                 
-                # 真正扣除积分（从冻结转为扣除）
-                success = CreditService.confirm_deduct(
-                    lc_uid=lc_uid,
-                    amount=cost_credits,
-                    reason="download_confirmed",
-                    ref_id=job_id
-                )
-                
-                if not success:
-                    return {"success": False, "message": "积分扣除失败"}
-                
-                # 更新任务确认状态和状态为succeeded
-                cursor.execute("""
-                UPDATE download_jobs 
-                SET confirmed = 1, status = 'succeeded', updated_at = ?
-                WHERE job_id = ?
-                """, (now, job_id))
-                
-                conn.commit()
-                
                 logger.info(f"下载确认成功，积分已扣除: {job_id}, 用户: {lc_uid}, 积分: {cost_credits}")
                 
                 return {
@@ -315,7 +341,7 @@ class DownloadService:
         """
         取消下载（客户端调用）
         
-        客户端在下载失败或用户取消时调用，解冻积分
+        客户端在下载失败或用户取消时调用，解冻积分。与确认相同，由条件UPDATE保证只解冻一次。
         
         Args:
             job_id: 任务ID
@@ -326,42 +352,30 @@ class DownloadService:
         """
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            now = datetime.utcnow().isoformat()
+            now, now_ms = utc_now()
+            if not conn.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
             
             try:
-                # 获取任务信息
-                cursor.execute("""
-                SELECT lc_uid, cost_credits, status, confirmed FROM download_jobs 
-                WHERE job_id = ?
-                """, (job_id,))
-                
-                row = cursor.fetchone()
-                if not row:
-                    return {"success": False, "message": "任务不存在"}
-                
-                if row["lc_uid"] != lc_uid:
-                    return {"success": False, "message": "无权操作此任务"}
+                # 更新任务确认状态为取消
+                row = cursor.execute("""
+                UPDATE download_jobs 
+                SET confirmed = -1, updated_at = ?, updated_at_ms = ?
+                WHERE job_id = ? AND lc_uid = ? AND confirmed = 0
+                RETURNING cost_credits
+                """, (now, now_ms, job_id, lc_uid)).fetchone()
                 
-                if row["confirmed"] != 0:
-                    return {"success": False, "message": "任务已确认或已取消"}
+                if row is None:
+                    conn.rollback()
+                    return DownloadService._settle_failure(cursor, job_id, lc_uid)
                 
                 cost_credits = row["cost_credits"]
                 
                 # 解冻积分
-                CreditService.unfreeze_credits(
-                    lc_uid=lc_uid,
-                    amount=cost_credits,
-                    ref_id=job_id
-                )
-                
-                # 更新任务确认状态为取消
-                cursor.execute("""
-                UPDATE download_jobs 
-                SET confirmed = -1, updated_at = ?
-                WHERE job_id = ?
-                """, (now, job_id))
+                CreditService.release_frozen(cursor, lc_uid, cost_credits, now)
                 
                 conn.commit()
+                JobEvents.publish(job_id, "cancelled")
                 
                 logger.info(f"下载取消，积分已解冻: {job_id}, 用户: {lc_uid}, 积分: {cost_credits}")
                 
@@ -371,4 +385,3 @@ class DownloadService:
                 conn.rollback()
                 logger.error(f"下载取消失败: {job_id}, {e}")
                 return {"success": False, "message": f"取消失败: {str(e)}"}
-
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+下载任务异步执行 - 有界的 asyncio 工作池
+
+异步模式下 /api/downloads/start 只冻结积分并创建 queued 状态的任务，由这里的工作协程调用解析接口。
+每个平台有自己的队列和固定数量的工作协程，慢的平台不会占满其它平台的并发。
+队列以 download_jobs 中 queued 状态的任务为准：启动时重新载入，领取任务时用条件 UPDATE 把
+queued 改为 running，多个进程同时载入也只会执行一次；关闭时正在执行的任务改回 queued。
+状态变化沿用 DownloadService.update_job_status。
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Optional, Dict, Any, Callable, Awaitable, Deque
+
+from app.db.database import get_db_connection, get_read_connection, utc_now
+from app.services.download_service import DownloadService
+from app.services.job_events import JobEvents
+from crawlers.utils.prometheus import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+JOBS = Counter(
+    "app_download_worker_jobs", "Queued download jobs finished by platform and result",
+    ("platform", "result"), registry=REGISTRY
+)
+
+# 解析函数: (平台, 链接) -> 视频信息
+Handler = Callable[[str, str], Awaitable[Dict[str, Any]]]
+
+
+class DownloadWorker:
+    """下载任务工作池"""
+
+    # 默认配置，可通过 configure() 覆盖
+    enable: bool = True
+    # 未指定 async_mode 的请求是否使用异步模式
+    default_async: bool = False
+    # 每个平台的并发数，未列出的平台使用 other
+    concurrency: Dict[str, int] = {"douyin": 4, "tiktok": 2, "bilibili": 2, "other": 2}
+    # 每个平台队列的最大长度
+    max_queue: int = 1000
+
+    _handler: Optional[Handler] = None
+    _queues: Dict[str, asyncio.Queue] = {}
+    # 排队中的任务ID，用于计算排队位置
+    _waiting: Dict[str, Deque[str]] = {}
+    _tasks: list = []
+    _running: Dict[str, str] = {}
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr in ("completed", "failed", "rejected") \
+                    or not hasattr(cls, attr) or callable(getattr(cls, attr)):
+                logger.warning(f"未知的下载工作池配置项: {key}")
+                continue
+            if attr == "concurrency":
+                value = {str(k).lower(): int(v) for k, v in value.items()}
+                value.setdefault("other", 2)
+            setattr(cls, attr, value)
+
+    @classmethod
+    def set_handler(cls, handler: Handler) -> None:
+        """设置解析函数，由下载接口模块在导入时设置"""
+        cls._handler = handler
+
+    @classmethod
+    def is_running(cls) -> bool:
+        return any(not task.done() for task in cls._tasks)
+
+    @classmethod
+    def _group(cls, platform: str) -> str:
+        return platform if platform in cls.concurrency else "other"
+
+    @classmethod
+    def start(cls) -> None:
+        """在应用生命周期中启动工作协程并载入未完成的任务"""
+        if not cls.enable or cls.is_running():
+            return
+        cls._queues = {group: asyncio.Queue(maxsize=cls.max_queue) for group in cls.concurrency}
+        cls._waiting = {group: deque() for group in cls.concurrency}
+        cls._running = {}
+        cls._tasks = [
+            asyncio.create_task(cls._work(group))
+            for group, count in cls.concurrency.items() for _ in range(max(int(count), 0))
+        ]
+        cls._tasks.append(asyncio.create_task(cls._recover()))
+        logger.info(f"下载工作池已启动: {cls.concurrency}")
+
+    @classmethod
+    async def _recover(cls) -> None:
+        """重新载入数据库中排队的任务"""
+        def load():
+            with get_read_connection() as conn:
+                return [dict(row) for row in conn.execute(
+                    "SELECT job_id, url, platform FROM download_jobs WHERE confirmed = 0 AND status = 'queued' "
+                    "ORDER BY updated_at_ms"
+                ).fetchall()]
+        try:
+            jobs = await asyncio.to_thread(load)
+        except Exception as e:
+            logger.error(f"载入排队的下载任务失败: {e}")
+            return
+        loaded = sum(cls.submit(job["job_id"], job["url"], job["platform"]) for job in jobs)
+        if jobs:
+            logger.info(f"载入排队的下载任务 {loaded}/{len(jobs)} 个")
+
+    @classmethod
+    def submit(cls, job_id: str, url: str, platform: str) -> bool:
+        """
+        放入队列，工作池未启动或队列已满时返回False
+
+        Args:
+            job_id: 任务ID（状态为 queued）
+            url: 视频链接
+            platform: 平台名称
+        """
+        group = cls._group(platform)
+        queue = cls._queues.get(group)
+        if queue is None or not cls.is_running():
+            cls.rejected += 1
+            return False
+        try:
+            queue.put_nowait({"job_id": job_id, "url": url, "platform": platform})
+        except asyncio.QueueFull:
+            cls.rejected += 1
+            return False
+        cls._waiting[group].append(job_id)
+        return True
+
+    @classmethod
+    def queue_position(cls, job_id: str, platform: str) -> Optional[int]:
+        """排队位置(从1开始)，不在本进程的队列中时为None"""
+        try:
+            return cls._waiting.get(cls._group(platform), ()).index(job_id) + 1
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _claim(job_id: str) -> bool:
+        """把 queued 的任务改为 running，已被其它进程领取、取消或过期时返回False"""
+        with get_db_connection() as conn:
+            now, now_ms = utc_now()
+            cursor = conn.execute("""
+                UPDATE download_jobs SET status = 'running', updated_at = ?, updated_at_ms = ?
+                WHERE job_id = ? AND status = 'queued' AND confirmed = 0
+            """, (now, now_ms, job_id))
+            conn.commit()
+        if cursor.rowcount != 1:
+            return False
+        JobEvents.publish(job_id, "running")
+        return True
+
+    @staticmethod
+    def _requeue(job_id: str) -> None:
+        """关闭时把正在执行的任务改回 queued，下次启动重新执行"""
+        with get_db_connection() as conn:
+            now, now_ms = utc_now()
+            conn.execute("""
+                UPDATE download_jobs SET status = 'queued', updated_at = ?, updated_at_ms = ?
+                WHERE job_id = ? AND status = 'running'
+            """, (now, now_ms, job_id))
+            conn.commit()
+
+    @classmethod
+    async def _work(cls, group: str) -> None:
+        queue = cls._queues[group]
+        while True:
+            job = await queue.get()
+            job_id = job["job_id"]
+            try:
+                cls._waiting[group].remove(job_id)
+            except ValueError:
+                pass
+            # 领取在线程中进行，取消时线程仍可能提交 running，同样需要改回 queued
+            claim = asyncio.ensure_future(asyncio.to_thread(cls._claim, job_id))
+            try:
+                claimed = await asyncio.shield(claim)
+            except asyncio.CancelledError:
+                if await claim:
+                    await asyncio.shield(asyncio.to_thread(cls._requeue, job_id))
+                raise
+            if not claimed:
+                continue
+            cls._running[job_id] = job["platform"]
+            try:
+                await cls._execute(job)
+            except asyncio.CancelledError:
+                await asyncio.shield(asyncio.to_thread(cls._requeue, job_id))
+                raise
+            except Exception as e:
+                logger.error(f"下载任务执行失败: {job_id}, {e}")
+            finally:
+                cls._running.pop(job_id, None)
+
+    @classmethod
+    async def _execute(cls, job: Dict[str, Any]) -> None:
+        if cls._handler is None:
+            raise RuntimeError("未设置解析函数")
+        try:
+            video_info = await cls._handler(job["platform"], job["url"])
+        except Exception as e:
+            # 解析失败，解冻积分
+            await asyncio.to_thread(
+                DownloadService.update_job_status, job_id=job["job_id"], status="failed", error_message=str(e)
+            )
+            cls.failed += 1
+            JOBS.labels(job["platform"], "failed").inc()
+            return
+        await asyncio.to_thread(
+            DownloadService.update_job_status, job_id=job["job_id"], status="pending_confirm", result_data=video_info
+        )
+        cls.completed += 1
+        JOBS.labels(job["platform"], "succeeded").inc()
+
+    @classmethod
+    async def stop(cls) -> None:
+        """停止工作协程，正在执行的任务改回 queued"""
+        tasks, cls._tasks = cls._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "running": cls.is_running(),
+            "concurrency": cls.concurrency,
+            "queued": {group: queue.qsize() for group, queue in cls._queues.items()},
+            "in_progress": len(cls._running),
+            "completed": cls.completed,
+            "failed": cls.failed,
+            "rejected": cls.rejected,
+        }
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+幂等键存储 - 按 Idempotency-Key 请求头重放第一次请求的响应
+
+客户端在网络不稳定时会重试 /api/downloads/start 和 /api/credits/add-iap，每次重试都会新建任务、
+冻结积分并调用付费接口。带 Idempotency-Key 的请求按 (用户, 接口, 键) 只执行一次：
+- 已完成的键直接重放保存的状态码、响应头和响应体（逐字节相同）；
+- 同一进程内正在执行的键，重复请求等待原请求完成后重放；其它进程正在执行时轮询数据库等待；
+- 同一个键对应不同的请求体（或会话）时返回 422。
+
+完成的响应保存在 SQLite 的 idempotency_keys 表中（ttl_hours 后过期），最近使用的保存在内存 LRU 中。
+执行中的键也写入表中，expires_at_ms 为锁的过期时间，进程退出后由其它进程接管。
+5xx 等可以重试的响应不保存，释放键让客户端重试。
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+from app.db.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# (lc_uid, 接口, 幂等键)
+RecordKey = Tuple[str, str, str]
+
+
+class IdempotencyConflict(Exception):
+    """同一个幂等键对应了不同的请求"""
+
+
+class IdempotencyBusy(Exception):
+    """等待原请求完成超时"""
+
+
+class StoredResponse:
+    """保存的响应"""
+
+    __slots__ = ("request_hash", "status_code", "headers", "body", "expires_at_ms")
+
+    def __init__(self, request_hash: str, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes,
+                 expires_at_ms: int):
+        self.request_hash = request_hash
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.expires_at_ms = expires_at_ms
+
+    def encode_headers(self) -> str:
+        return json.dumps([[k.decode("latin-1"), v.decode("latin-1")] for k, v in self.headers])
+
+    @staticmethod
+    def decode_headers(text: str) -> List[Tuple[bytes, bytes]]:
+        return [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(text)]
+
+
+class IdempotencyStore:
+    """幂等键存储"""
+
+    # 默认配置，可通过 configure() 覆盖
+    enable: bool = True
+    # 支持幂等键的接口(POST)
+    paths: Tuple[str, ...] = ("/api/downloads/start", "/api/credits/add-iap")
+    # 完成的响应保存时间(小时)
+    ttl_hours: float = 24
+    # 执行中的键的锁定时间(秒)，超过后视为原请求已中断
+    lock_seconds: float = 120
+    # 重复请求等待原请求完成的最长时间(秒)
+    wait_seconds: float = 60
+    # 跨进程等待时查询数据库的间隔(毫秒)
+    poll_interval_ms: int = 200
+    # 内存中保存的响应数
+    memory_entries: int = 10000
+    # 超过该大小的响应不保存(字节)
+    max_body_bytes: int = 1048576
+    # 不保存的状态码：认证失败、冲突、限流等应当允许客户端用同一个键重试
+    retryable_status: Tuple[int, ...] = (401, 408, 409, 425, 429)
+
+    _memory: "OrderedDict[RecordKey, StoredResponse]" = OrderedDict()
+    _inflight: Dict[RecordKey, asyncio.Future] = {}
+    executed: int = 0
+    replayed: int = 0
+    waited: int = 0
+    conflicts: int = 0
+    memory_hits: int = 0
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr in ("executed", "replayed", "waited", "conflicts", "memory_hits") \
+                    or not hasattr(cls, attr) or callable(getattr(cls, attr)):
+                logger.warning(f"未知的幂等键配置项: {key}")
+                continue
+            setattr(cls, attr, tuple(value) if attr in ("paths", "retryable_status") else value)
+
+    @classmethod
+    def handles(cls, method: str, path: str) -> bool:
+        return cls.enable and method == "POST" and path in cls.paths
+
+    # ==================== 内存 LRU ====================
+
+    @classmethod
+    def _remember(cls, record: RecordKey, stored: StoredResponse) -> None:
+        cls._memory[record] = stored
+        cls._memory.move_to_end(record)
+        while len(cls._memory) > cls.memory_entries:
+            cls._memory.popitem(last=False)
+
+    @classmethod
+    def _recall(cls, record: RecordKey, now_ms: int) -> Optional[StoredResponse]:
+        stored = cls._memory.get(record)
+        if stored is None:
+            return None
+        if stored.expires_at_ms <= now_ms:
+            del cls._memory[record]
+            return None
+        cls._memory.move_to_end(record)
+        cls.memory_hits += 1
+        return stored
+
+    # ==================== 数据库 ====================
+
+    @classmethod
+    def _claim(cls, record: RecordKey, request_hash: str) -> Tuple[str, Optional[StoredResponse]]:
+        """
+        在一个事务中查找或锁定键
+
+        Returns:
+            ("done", 保存的响应) / ("busy", None) 其它请求正在执行 / ("claimed", None) 由本请求执行
+        """
+        now_ms = int(time.time() * 1000)
+        with get_db_connection() as conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("""
+                    SELECT request_hash, status_code, headers, body, expires_at_ms FROM idempotency_keys
+                    WHERE lc_uid = ? AND endpoint = ? AND idem_key = ?
+                """, record).fetchone()
+                if row is not None and row["expires_at_ms"] > now_ms:
+                    conn.rollback()
+                    if row["request_hash"] != request_hash:
+                        raise IdempotencyConflict("幂等键已用于不同的请求")
+                    if row["status_code"] is None:
+                        return "busy", None
+                    return "done", StoredResponse(
+                        row["request_hash"], row["status_code"], StoredResponse.decode_headers(row["headers"]),
+                        bytes(row["body"]), row["expires_at_ms"]
+                    )
+                # 不存在、已过期或原请求的锁已过期
+                conn.execute("""
+                    INSERT OR REPLACE INTO idempotency_keys
+                    (lc_uid, endpoint, idem_key, request_hash, status_code, headers, body, created_at_ms, expires_at_ms)
+                    VALUES (?, ?, ?, ?, NULL, NULL, NULL, ?, ?)
+                """, (*record, request_hash, now_ms, now_ms + int(cls.lock_seconds * 1000)))
+                conn.commit()
+                return "claimed", None
+            except IdempotencyConflict:
+                raise
+            except Exception:
+                conn.rollback()
+                raise
+
+    @staticmethod
+    def _save(record: RecordKey, stored: Optional[StoredResponse]) -> None:
+        """保存响应，响应为 None 时释放键"""
+        with get_db_connection() as conn:
+            if stored is None:
+                conn.execute(
+                    "DELETE FROM idempotency_keys WHERE lc_uid = ? AND endpoint = ? AND idem_key = ? "
+                    "AND status_code IS NULL",
+                    record
+                )
+            else:
+                conn.execute("""
+                    UPDATE idempotency_keys SET status_code = ?, headers = ?, body = ?, expires_at_ms = ?
+                    WHERE lc_uid = ? AND endpoint = ? AND idem_key = ? AND request_hash = ?
+                """, (stored.status_code, stored.encode_headers(), stored.body, stored.expires_at_ms,
+                      *record, stored.request_hash))
+            conn.commit()
+
+    @classmethod
+    def purge(cls, batch_size: int = 5000) -> int:
+        """分批删除过期的键，返回删除的行数"""
+        now_ms = int(time.time() * 1000)
+        deleted = 0
+        while True:
+            with get_db_connection() as conn:
+                cursor = conn.execute("""
+                    DELETE FROM idempotency_keys WHERE rowid IN (
+                        SELECT rowid FROM idempotency_keys WHERE expires_at_ms < ? LIMIT ?
+                    )
+                """, (now_ms, batch_size))
+                conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+
+    # ==================== 请求流程 ====================
+
+    @classmethod
+    async def begin(cls, record: RecordKey, request_hash: str) -> Optional[StoredResponse]:
+        """
+        请求开始时调用
+
+        Returns:
+            需要重放的响应；返回 None 时由本请求执行，完成后必须调用 finish()
+
+        Raises:
+            IdempotencyConflict: 键已用于不同的请求
+            IdempotencyBusy: 等待原请求完成超时
+        """
+        deadline = time.monotonic() + cls.wait_seconds
+        while True:
+            stored = cls._recall(record, int(time.time() * 1000))
+            if stored is not None:
+                return cls._replay(stored, request_hash)
+
+            inflight = cls._inflight.get(record)
+            if inflight is not None:
+                # 同一进程内的重复请求等待原请求完成
+                cls.waited += 1
+                try:
+                    await asyncio.wait_for(asyncio.shield(inflight), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    raise IdempotencyBusy("相同幂等键的请求仍在处理中")
+                continue
+
+            future = asyncio.get_running_loop().create_future()
+            cls._inflight[record] = future
+            try:
+                state, stored = await asyncio.to_thread(cls._claim, record, request_hash)
+            except IdempotencyConflict:
+                cls.conflicts += 1
+                cls._release(record, future)
+                raise
+            except BaseException:
+                cls._release(record, future)
+                raise
+            if state == "claimed":
+                cls.executed += 1
+                return None
+            cls._release(record, future)
+            if state == "done":
+                cls._remember(record, stored)
+                return cls._replay(stored, request_hash)
+
+            # 其它进程正在执行
+            cls.waited += 1
+            if time.monotonic() >= deadline:
+                raise IdempotencyBusy("相同幂等键的请求仍在处理中")
+            await asyncio.sleep(cls.poll_interval_ms / 1000)
+
+    @classmethod
+    def _replay(cls, stored: StoredResponse, request_hash: str) -> StoredResponse:
+        if stored.request_hash != request_hash:
+            cls.conflicts += 1
+            raise IdempotencyConflict("幂等键已用于不同的请求")
+        cls.replayed += 1
+        return stored
+
+    @classmethod
+    def _release(cls, record: RecordKey, future: asyncio.Future) -> None:
+        if cls._inflight.get(record) is future:
+            del cls._inflight[record]
+        if not future.done():
+            future.set_result(None)
+
+    @classmethod
+    async def finish(cls, record: RecordKey, request_hash: str, status_code: Optional[int],
+                     headers: List[Tuple[bytes, bytes]], body: Optional[bytes]) -> None:
+        """
+        请求结束时调用，保存可以重放的响应；status_code 或 body 为 None 表示请求没有正常完成
+        """
+        stored = None
+        if status_code is not None and body is not None and status_code < 500 \
+                and status_code not in cls.retryable_status and len(body) <= cls.max_body_bytes:
+            stored = StoredResponse(
+                request_hash, status_code, headers, body, int((time.time() + cls.ttl_hours * 3600) * 1000)
+            )
+        try:
+            await asyncio.shield(asyncio.to_thread(cls._save, record, stored))
+            if stored is not None:
+                cls._remember(record, stored)
+        except Exception as e:
+            logger.error(f"保存幂等响应失败: {record}, {e}")
+        finally:
+            future = cls._inflight.get(record)
+            if future is not None:
+                cls._release(record, future)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "enable": cls.enable,
+            "paths": list(cls.paths),
+            "memory_entries": len(cls._memory),
+            "inflight": len(cls._inflight),
+            "executed": cls.executed,
+            "replayed": cls.replayed,
+            "memory_hits": cls.memory_hits,
+            "waited": cls.waited,
+            "conflicts": cls.conflicts,
+        }
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+下载任务状态通知 - 进程内按 job_id 的发布/订阅
+
+/api/downloads/status?wait=N 先订阅再读取任务，任务仍在排队或解析中时挂起等待，
+DownloadService 在状态变化提交后发布通知，等待的请求立即重新读取并返回。
+发布可以来自任意线程（清理任务在后台线程中执行），通知总是在事件循环中完成。
+通知只在本进程内传递：任务在其它进程中更新时，等待到超时后重新读取同样能得到最新状态。
+"""
+import asyncio
+import logging
+from typing import Optional, Dict, Any, Set
+
+logger = logging.getLogger(__name__)
+
+
+class JobEvents:
+    """下载任务状态的发布/订阅"""
+
+    # 默认配置，可通过 configure() 覆盖
+    # 单次等待的最长时间(秒)
+    max_wait_seconds: float = 30
+    # 同时等待的请求数上限，超出后不再等待直接返回
+    max_waiters: int = 10000
+
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _waiters: Dict[str, Set[asyncio.Future]] = {}
+    _count: int = 0
+    published: int = 0
+    delivered: int = 0
+    timeouts: int = 0
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr in ("published", "delivered", "timeouts") \
+                    or not hasattr(cls, attr) or callable(getattr(cls, attr)):
+                logger.warning(f"未知的任务状态通知配置项: {key}")
+                continue
+            setattr(cls, attr, value)
+
+    @classmethod
+    def subscribe(cls, job_id: str) -> Optional[asyncio.Future]:
+        """
+        订阅任务的下一次状态变化，必须在事件循环中调用，并在读取任务状态之前调用以免错过通知
+
+        Returns:
+            等待用的 Future，等待数达到上限时为 None
+        """
+        if cls._count >= cls.max_waiters:
+            return None
+        cls._loop = asyncio.get_running_loop()
+        waiter = cls._loop.create_future()
+        cls._waiters.setdefault(job_id, set()).add(waiter)
+        cls._count += 1
+        return waiter
+
+    @classmethod
+    def unsubscribe(cls, job_id: str, waiter: Optional[asyncio.Future]) -> None:
+        if waiter is None:
+            return
+        waiters = cls._waiters.get(job_id)
+        if waiters is not None and waiter in waiters:
+            waiters.discard(waiter)
+            cls._count -= 1
+            if not waiters:
+                del cls._waiters[job_id]
+        if not waiter.done():
+            waiter.cancel()
+
+    @classmethod
+    async def wait(cls, waiter: asyncio.Future, timeout: float) -> Optional[str]:
+        """
+        等待通知
+
+        Returns:
+            新状态，超时时为 None
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter), min(timeout, cls.max_wait_seconds))
+        except asyncio.TimeoutError:
+            cls.timeouts += 1
+            return None
+
+    @classmethod
+    def publish(cls, job_id: str, status: str) -> None:
+        """发布任务的新状态，可在任意线程中调用"""
+        loop = cls._loop
+        if loop is None or job_id not in cls._waiters:
+            return
+        cls.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            cls._notify(job_id, status)
+            return
+        try:
+            loop.call_soon_threadsafe(cls._notify, job_id, status)
+        except RuntimeError:  # 事件循环已关闭
+            pass
+
+    @classmethod
+    def _notify(cls, job_id: str, status: str) -> None:
+        waiters = cls._waiters.pop(job_id, ())
+        cls._count -= len(waiters)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(status)
+                cls.delivered += 1
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "waiters": cls._count,
+            "jobs": len(cls._waiters),
+            "published": cls.published,
+            "delivered": cls.delivered,
+            "timeouts": cls.timeouts,
+        }
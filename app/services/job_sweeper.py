@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+过期下载任务清理 - 解冻客户端没有确认或取消的任务占用的积分
+
+任务在 pending_confirm/succeeded 状态等待客户端确认，客户端崩溃时积分会一直冻结；
+进程在解析过程中退出时任务会停在 running 状态，没有工作池执行时异步任务会停在 queued 状态。超过有效期的任务标记为 expired(confirmed = -1)，
+冻结的积分返还。每批在一个 BEGIN IMMEDIATE 事务中完成，按 (confirmed, status, updated_at_ms) 索引查找，
+不扫描全表；同一任务只会被确认、取消或清理其中之一。
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+from app.db.database import get_db_connection, get_read_connection, utc_now
+from app.services.job_events import JobEvents
+from crawlers.utils.prometheus import REGISTRY, Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+SWEPT_JOBS = Counter(
+    "app_job_sweeper_expired_jobs", "Download jobs expired by the sweeper", ("status",), registry=REGISTRY
+)
+RECLAIMED_CREDITS = Counter(
+    "app_job_sweeper_reclaimed_credits", "Frozen credits returned by the sweeper", registry=REGISTRY
+)
+SWEEP_LAG = Gauge(
+    "app_job_sweeper_lag_seconds", "How long the oldest unconfirmed job has been past its TTL", registry=REGISTRY
+)
+
+
+class JobSweeper:
+    """过期下载任务清理服务"""
+    
+    # 默认配置，可通过 configure() 覆盖
+    enable: bool = True
+    # 等待确认(pending_confirm/succeeded)的任务有效期(秒)
+    ttl_seconds: int = 1800
+    # 停在 queued/running 状态的任务有效期(秒)
+    running_ttl_seconds: int = 3600
+    # 每批处理的任务数
+    batch_size: int = 500
+    # 批次之间的间隔(毫秒)
+    pause_ms: int = 50
+    # 清理间隔(秒)
+    interval_seconds: float = 60
+    
+    _task: Optional[asyncio.Task] = None
+    _lock = threading.Lock()
+    last_run: Optional[Dict[str, Any]] = None
+    total_jobs: int = 0
+    total_credits: int = 0
+    lag_seconds: float = 0
+    
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr in ("last_run", "total_jobs", "total_credits", "lag_seconds") \
+                    or not hasattr(cls, attr) or callable(getattr(cls, attr)):
+                logger.warning(f"未知的任务清理配置项: {key}")
+                continue
+            setattr(cls, attr, value)
+    
+    @classmethod
+    def _groups(cls, now_ms: int) -> List[Tuple[Tuple[str, ...], int]]:
+        """[(状态, 截止毫秒时间)]"""
+        return [
+            (("pending_confirm", "succeeded"), now_ms - int(cls.ttl_seconds * 1000)),
+            (("queued", "running"), now_ms - int(cls.running_ttl_seconds * 1000)),
+        ]
+    
+    @classmethod
+    def _sweep_batch(cls, status: str, cutoff_ms: int) -> Tuple[int, int]:
+        """
+        在一个事务中把一批过期任务标记为 expired 并解冻积分
+        
+        Returns:
+            (任务数, 解冻积分)
+        """
+        with get_db_connection() as conn:
+            now, now_ms = utc_now()
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                # confirmed = 0 的条件保证与确认、取消互斥，RETURNING 只返回本批真正改动的任务
+                rows = conn.execute("""
+                    UPDATE download_jobs
+                    SET status = 'expired', confirmed = -1, error_message = ?, updated_at = ?, updated_at_ms = ?
+                    WHERE job_id IN (
+                        SELECT job_id FROM download_jobs
+                        WHERE confirmed = 0 AND status = ? AND updated_at_ms < ?
+                        LIMIT ?
+                    ) AND confirmed = 0
+                    RETURNING job_id, lc_uid, cost_credits
+                """, (f"超时未确认({status})", now, now_ms, status, cutoff_ms, cls.batch_size)).fetchall()
+                
+                credits: Dict[str, int] = defaultdict(int)
+                for row in rows:
+                    credits[row["lc_uid"]] += row["cost_credits"]
+                conn.executemany(
+                    "UPDATE users SET credits_frozen = MAX(0, credits_frozen - ?), updated_at = ? WHERE lc_uid = ?",
+                    [(amount, now, lc_uid) for lc_uid, amount in credits.items()]
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        for row in rows:
+            JobEvents.publish(row["job_id"], "expired")
+        return len(rows), sum(credits.values())
+    
+    @classmethod
+    def _lag(cls, now_ms: int) -> float:
+        """最早的未确认任务超过有效期的秒数"""
+        lag = 0.0
+        with get_read_connection() as conn:
+            for statuses, cutoff_ms in cls._groups(now_ms):
+                for status in statuses:
+                    oldest = conn.execute(
+                        "SELECT MIN(updated_at_ms) FROM download_jobs WHERE confirmed = 0 AND status = ?",
+                        (status,)
+                    ).fetchone()[0]
+                    if oldest is not None:
+                        lag = max(lag, (cutoff_ms - oldest) / 1000)
+        return lag
+    
+    @classmethod
+    async def run_async(cls) -> Dict[str, Any]:
+        """
+        清理一次，批次在后台线程中执行，批次之间让出事件循环和写锁
+        
+        Returns:
+            本次清理结果，已有清理在进行时返回 {"skipped": True}
+        """
+        if not cls._lock.acquire(blocking=False):
+            return {"skipped": True, "jobs": 0, "credits": 0}
+        try:
+            started = time.perf_counter()
+            result = {"jobs": 0, "credits": 0, "batches": 0, "by_status": {}}
+            for statuses, cutoff_ms in cls._groups(int(time.time() * 1000)):
+                for status in statuses:
+                    while True:
+                        jobs, credits = await asyncio.to_thread(cls._sweep_batch, status, cutoff_ms)
+                        if not jobs:
+                            break
+                        SWEPT_JOBS.labels(status).inc(jobs)
+                        RECLAIMED_CREDITS.inc(credits)
+                        result["jobs"] += jobs
+                        result["credits"] += credits
+                        result["batches"] += 1
+                        result["by_status"][status] = result["by_status"].get(status, 0) + jobs
+                        if jobs < cls.batch_size:
+                            break
+                        await asyncio.sleep(cls.pause_ms / 1000)
+            cls.lag_seconds = round(await asyncio.to_thread(cls._lag, int(time.time() * 1000)), 3)
+            SWEEP_LAG.set(cls.lag_seconds)
+            result["lag_seconds"] = cls.lag_seconds
+            result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+            result["finished_at"] = datetime.utcnow().isoformat()
+            cls.last_run = result
+            cls.total_jobs += result["jobs"]
+            cls.total_credits += result["credits"]
+            if result["jobs"]:
+                logger.info(f"清理了 {result['jobs']} 个过期下载任务, 解冻积分 {result['credits']}, {result['batches']} 批")
+            return result
+        finally:
+            cls._lock.release()
+    
+    @classmethod
+    def is_running(cls) -> bool:
+        return cls._task is not None and not cls._task.done()
+    
+    @classmethod
+    def start(cls) -> None:
+        """在应用生命周期中启动定时清理任务"""
+        if not cls.enable or cls.is_running():
+            return
+        cls._task = asyncio.create_task(cls._run())
+    
+    @classmethod
+    async def _run(cls) -> None:
+        while True:
+            try:
+                await cls.run_async()
+            except Exception as e:
+                logger.error(f"过期下载任务清理失败: {e}")
+            await asyncio.sleep(cls.interval_seconds)
+    
+    @classmethod
+    async def stop(cls) -> None:
+        """停止定时清理任务"""
+        task, cls._task = cls._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "running": cls.is_running(),
+            "sweeping": cls._lock.locked(),
+            "ttl_seconds": cls.ttl_seconds,
+            "running_ttl_seconds": cls.running_ttl_seconds,
+            "batch_size": cls.batch_size,
+            "lag_seconds": cls.lag_seconds,
+            "total_jobs": cls.total_jobs,
+            "total_credits": cls.total_credits,
+            "last_run": cls.last_run,
+        }
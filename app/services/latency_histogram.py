@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+延迟直方图 - 固定的对数线性分桶，用于计算 p50/p90/p95/p99
+
+每个 2 的幂区间再均分为 SUB_BUCKETS 个子桶，相对误差不超过 1/SUB_BUCKETS（约 6%）。
+桶的边界是固定的，任意两个直方图可以直接按桶相加合并，百分位计算只与桶数有关，与记录次数无关。
+"""
+import json
+from typing import Dict, Iterable, Optional
+
+# 每个 2 的幂区间的子桶数(必须是 2 的幂)
+SUB_BUCKETS = 16
+_SUB_BITS = SUB_BUCKETS.bit_length() - 1
+
+# 超过该值(毫秒)的延迟记入最后一个桶，约 4.6 小时
+MAX_TRACKABLE_MS = (1 << 24) - 1
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def bucket_index(value: int) -> int:
+    """延迟值对应的桶下标"""
+    if value < SUB_BUCKETS:
+        return max(value, 0)
+    value = min(value, MAX_TRACKABLE_MS)
+    shift = value.bit_length() - _SUB_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_upper_bound(index: int) -> int:
+    """桶内的最大延迟值"""
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """稀疏存储的延迟直方图"""
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, latency_ms: int) -> None:
+        """记录一次延迟"""
+        latency_ms = max(int(latency_ms), 0)
+        index = bucket_index(latency_ms)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += latency_ms
+        if latency_ms > self.max:
+            self.max = latency_ms
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """把另一个直方图合并进来"""
+        buckets = self.buckets
+        for index, count in other.buckets.items():
+            buckets[index] = buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+        return self
+
+    @classmethod
+    def merged(cls, histograms: Iterable["LatencyHistogram"]) -> "LatencyHistogram":
+        result = cls()
+        for histogram in histograms:
+            result.merge(histogram)
+        return result
+
+    def percentile(self, q: float) -> int:
+        """
+        第 q 百分位的延迟(毫秒)，返回所在桶的上界且不超过最大值
+
+        Args:
+            q: 0-100
+        """
+        if not self.count:
+            return 0
+        rank = max(1, int(self.count * q / 100 + 0.999999))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """平均值、p50/p90/p95/p99 和最大值，一次遍历桶完成"""
+        result = {"avg_latency_ms": round(self.total / self.count, 2) if self.count else 0}
+        ranks = [(q, max(1, int(self.count * q / 100 + 0.999999))) for q in PERCENTILES]
+        seen = 0
+        pending = iter(ranks) if self.count else iter(())
+        current = next(pending, None)
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            while current is not None and seen >= current[1]:
+                result[f"p{current[0]}_latency_ms"] = min(bucket_upper_bound(index), self.max)
+                current = next(pending, None)
+            if current is None:
+                break
+        for q in PERCENTILES:
+            result.setdefault(f"p{q}_latency_ms", 0)
+        result["max_latency_ms"] = self.max
+        return result
+
+    def dumps(self) -> str:
+        """序列化桶计数，用于持久化"""
+        return json.dumps(self.buckets, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, buckets: Optional[str], count: int = 0, total: int = 0,
+              max_ms: int = 0) -> "LatencyHistogram":
+        """从持久化的桶计数恢复"""
+        histogram = cls()
+        if buckets:
+            histogram.buckets = {int(k): v for k, v in json.loads(buckets).items()}
+        histogram.count = count or sum(histogram.buckets.values())
+        histogram.total = total or 0
+        histogram.max = max_ms or 0
+        return histogram
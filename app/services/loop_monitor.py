@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+事件循环延迟监控 - 定时休眠并测量实际被唤醒的延迟
+
+唤醒时间晚于预期的部分即为事件循环被同步代码阻塞的时间，结果写入进程内指标，供 /metrics 抓取。
+
+启用 watchdog 时另有一个守护线程定时向事件循环投递一个空回调：回调超过 block_threshold_ms 仍未执行，
+说明事件循环正在执行阻塞的回调，此时抓取事件循环线程的调用栈，按项目内最深的调用位置汇总，
+回调执行时测得的等待时间即为阻塞时长。空闲时每个检查周期只有一次投递和一次时间比较。
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+from crawlers.utils.prometheus import REGISTRY, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = Histogram(
+    "app_event_loop_lag_seconds", "Event loop wake-up delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0), registry=REGISTRY
+)
+LOOP_LAG_LAST = Gauge(
+    "app_event_loop_lag_last_seconds", "Most recent event loop wake-up delay", registry=REGISTRY
+)
+LOOP_BLOCKS = Counter(
+    "app_event_loop_blocking_calls", "Event loop stalls over the threshold by call site",
+    ("site",), registry=REGISTRY
+)
+
+# 项目根目录，用于识别项目内的调用位置
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class LoopMonitor:
+    """事件循环延迟采样任务和阻塞检测"""
+
+    # 默认配置，可通过 configure() 覆盖
+    enable: bool = True
+    # 采样间隔(毫秒)
+    interval_ms: int = 500
+    # 是否启用阻塞检测线程
+    watchdog: bool = True
+    # 超过该时长(毫秒)的阻塞会被记录调用栈
+    block_threshold_ms: int = 100
+    # 最多汇总的调用位置数
+    max_sites: int = 100
+    # 保存的调用栈帧数
+    stack_depth: int = 12
+    # 同一调用位置写日志的最短间隔(秒)
+    log_interval_s: float = 60
+
+    _task: Optional[asyncio.Task] = None
+    _thread: Optional[threading.Thread] = None
+    _stop: Optional[threading.Event] = None
+    _loop_thread_id: Optional[int] = None
+    # 尚未执行的探测回调的投递时间，0 表示没有
+    _ping_sent: float = 0
+    _pending: Optional[Tuple[str, str]] = None
+    _sites: Dict[str, Dict[str, Any]] = {}
+    _sites_lock = threading.Lock()
+    last_lag_ms: float = 0
+    max_lag_ms: float = 0
+    samples: int = 0
+    blocks: int = 0
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr in ("last_lag_ms", "max_lag_ms", "samples", "blocks") \
+                    or not hasattr(cls, attr) or callable(getattr(cls, attr)):
+                logger.warning(f"未知的事件循环监控配置项: {key}")
+                continue
+            setattr(cls, attr, value)
+
+    @classmethod
+    def is_running(cls) -> bool:
+        return cls._task is not None and not cls._task.done()
+
+    @classmethod
+    def start(cls) -> None:
+        """在应用生命周期中启动采样任务和阻塞检测线程"""
+        if not cls.enable or cls.is_running():
+            return
+        cls._loop_thread_id = threading.get_ident()
+        cls._task = asyncio.create_task(cls._run())
+        if cls.watchdog:
+            cls._ping_sent = 0
+            cls._stop = threading.Event()
+            cls._thread = threading.Thread(
+                target=cls._watch, args=(asyncio.get_running_loop(),), name="loop-watchdog", daemon=True
+            )
+            cls._thread.start()
+
+    @classmethod
+    async def _run(cls) -> None:
+        interval = cls.interval_ms / 1000
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            cls.record(max(time.perf_counter() - expected, 0))
+
+    @classmethod
+    def _watch(cls, loop: asyncio.AbstractEventLoop) -> None:
+        """守护线程：探测回调超时未执行时抓取一次事件循环线程的调用栈"""
+        threshold = cls.block_threshold_ms / 1000
+        check = max(threshold / 2, 0.01)
+        while not cls._stop.wait(check):
+            sent = cls._ping_sent
+            if not sent:
+                cls._pending = None
+                cls._ping_sent = time.perf_counter()
+                try:
+                    loop.call_soon_threadsafe(cls._pong)
+                except RuntimeError:  # 事件循环已关闭
+                    return
+                continue
+            if cls._pending is not None or time.perf_counter() - sent < threshold:
+                continue
+            frame = sys._current_frames().get(cls._loop_thread_id)
+            if frame is not None:
+                cls._pending = cls._call_site(frame)
+                del frame
+
+    @classmethod
+    def _pong(cls) -> None:
+        """探测回调，在事件循环中执行"""
+        delay = time.perf_counter() - cls._ping_sent
+        pending, cls._pending = cls._pending, None
+        cls._ping_sent = 0
+        if pending is not None:
+            cls._record_block(pending[0], pending[1], delay)
+
+    @classmethod
+    def _call_site(cls, frame) -> Tuple[str, str]:
+        """返回 (项目内最深的调用位置, 调用栈文本)"""
+        stack = traceback.extract_stack(frame)
+        site = stack[-1]
+        for entry in reversed(stack):
+            path = os.path.abspath(entry.filename)
+            if path.startswith(PROJECT_ROOT) and "site-packages" not in path and path != os.path.abspath(__file__):
+                site = entry
+                break
+        location = "{0}:{1} in {2}".format(os.path.relpath(site.filename, PROJECT_ROOT), site.lineno, site.name)
+        return location, "".join(traceback.format_list(stack[-cls.stack_depth:]))
+
+    @classmethod
+    def _record_block(cls, site: str, stack: str, lag: float) -> None:
+        lag_ms = round(lag * 1000, 2)
+        now = time.time()
+        with cls._sites_lock:
+            entry = cls._sites.get(site)
+            if entry is None:
+                if len(cls._sites) >= cls.max_sites:
+                    site = "other"
+                    entry = cls._sites.get(site)
+                if entry is None:
+                    entry = cls._sites[site] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "logged_at": 0.0}
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + lag_ms, 2)
+            entry["max_ms"] = max(entry["max_ms"], lag_ms)
+            entry["last_seen"] = datetime.utcnow().isoformat()
+            entry["stack"] = stack
+            should_log = now - entry["logged_at"] >= cls.log_interval_s
+            if should_log:
+                entry["logged_at"] = now
+        cls.blocks += 1
+        LOOP_BLOCKS.labels(site).inc()
+        if should_log:
+            logger.warning(f"事件循环被阻塞 {lag_ms}ms, 位置: {site}\n{stack}")
+
+    @classmethod
+    def record(cls, lag: float) -> None:
+        """记录一次唤醒延迟(秒)"""
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+        cls.samples += 1
+        cls.last_lag_ms = round(lag * 1000, 2)
+        cls.max_lag_ms = max(cls.max_lag_ms, cls.last_lag_ms)
+
+    @classmethod
+    async def stop(cls) -> None:
+        """停止采样任务和阻塞检测线程"""
+        task, cls._task = cls._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        thread, cls._thread = cls._thread, None
+        if thread is not None:
+            cls._stop.set()
+            thread.join(timeout=1)
+
+    @classmethod
+    def blocking_sites(cls, limit: int = 50) -> List[Dict[str, Any]]:
+        """按累计阻塞时间从高到低列出调用位置"""
+        with cls._sites_lock:
+            sites = [
+                {"site": site, **{k: v for k, v in entry.items() if k != "logged_at"}}
+                for site, entry in cls._sites.items()
+            ]
+        sites.sort(key=lambda item: item["total_ms"], reverse=True)
+        return sites[:limit]
+
+    @classmethod
+    def reset(cls) -> None:
+        """清空汇总的阻塞记录"""
+        with cls._sites_lock:
+            cls._sites = {}
+        cls.max_lag_ms = 0
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "running": cls.is_running(),
+            "watchdog": cls._thread is not None and cls._thread.is_alive(),
+            "interval_ms": cls.interval_ms,
+            "block_threshold_ms": cls.block_threshold_ms,
+            "samples": cls.samples,
+            "blocks": cls.blocks,
+            "last_lag_ms": cls.last_lag_ms,
+            "max_lag_ms": cls.max_lag_ms,
+        }
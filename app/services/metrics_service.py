@@ -1,22 +1,442 @@
 # -*- coding: utf-8 -*-
 """
 API调用监控服务 - 记录和统计API调用情况
+
+原始调用记录(api_metrics)只用于查看最近调用；统计和图表读取每分钟/每小时汇总表
+(api_metrics_minute / api_metrics_hour)，由批量写入器增量维护。
 """
+import asyncio
 import logging
+import threading
 import time
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
-from app.db.database import get_db_connection
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+from app.db.database import get_db_connection, get_read_connection, get_meta, set_meta, utc_now
+from app.services.latency_histogram import LatencyHistogram
+from app.services.retention_service import RetentionService
+from crawlers.utils.prometheus import REGISTRY, Counter, Histogram
 
 logger = logging.getLogger(__name__)
 
+# 进程内指标，供 /metrics 抓取，不经过数据库
+API_REQUESTS = Counter(
+    "app_api_requests", "API calls by endpoint, method, status and external API",
+    ("endpoint", "method", "status", "external_api"), registry=REGISTRY
+)
+API_LATENCY = Histogram(
+    "app_api_request_duration_seconds", "API call latency by endpoint, method and external API",
+    ("endpoint", "method", "external_api"), registry=REGISTRY
+)
+
+INSERT_METRIC_SQL = """
+    INSERT INTO api_metrics 
+    (endpoint, method, status_code, latency_ms, is_external, 
+     external_api, lc_uid, error_message, created_at, created_at_ms)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 汇总行的主键: (时间段起点毫秒, endpoint, method, external_api, is_external)
+RollupKey = Tuple[int, str, str, str, int]
+
+# 汇总粒度 -> (表名, 时间列)
+ROLLUP_TABLES = {
+    "minute": ("api_metrics_minute", "minute_ts"),
+    "hour": ("api_metrics_hour", "hour_ts"),
+}
+
+
+def minute_start_ms(timestamp: float) -> int:
+    """时间戳所在分钟的起始时间(毫秒)"""
+    return int(timestamp // 60) * 60000
+
+
+def hour_start_ms(timestamp: float) -> int:
+    """时间戳所在小时的起始时间(毫秒)"""
+    return int(timestamp // 3600) * 3600000
+
+
+class MetricsRollup:
+    """一个时间段内某个 (端点, 方法, 外部API) 的调用数、成功数、错误数和延迟直方图"""
+    
+    __slots__ = ("histogram", "success", "errors")
+    
+    def __init__(self, histogram: Optional[LatencyHistogram] = None, success: int = 0, errors: int = 0):
+        self.histogram = histogram if histogram is not None else LatencyHistogram()
+        self.success = success
+        self.errors = errors
+    
+    @property
+    def count(self) -> int:
+        return self.histogram.count
+    
+    def add(self, latency_ms: int, status_code: int) -> None:
+        self.histogram.record(latency_ms)
+        if 200 <= status_code < 300:
+            self.success += 1
+        elif status_code >= 400:
+            self.errors += 1
+    
+    def merge(self, other: "MetricsRollup") -> "MetricsRollup":
+        self.histogram.merge(other.histogram)
+        self.success += other.success
+        self.errors += other.errors
+        return self
+    
+    def copy(self) -> "MetricsRollup":
+        return MetricsRollup().merge(self)
+    
+    @classmethod
+    def from_row(cls, row) -> "MetricsRollup":
+        histogram = LatencyHistogram.loads(
+            row["buckets"], row["count"], row["total_latency_ms"], row["max_latency_ms"]
+        )
+        return cls(histogram, row["success"], row["errors"])
+    
+    def summary(self) -> Dict[str, Any]:
+        """调用数、成功数、错误数、平均延迟和百分位"""
+        return {
+            "total": self.count,
+            "success": self.success,
+            "errors": self.errors,
+            **self.histogram.summary()
+        }
+
+
+class MetricsWriter:
+    """
+    监控数据异步批量写入器
+    
+    record_api_call 只把记录放入有界内存队列，后台任务每 flush_interval_ms 毫秒或积累 batch_size 条后
+    用 executemany 在一个事务中写入。队列满时丢弃新记录并计数，关闭时执行最后一次写入。
+    每分钟的汇总在内存中累加，分钟结束后合并写入分钟和小时汇总表。
+    """
+    
+    # 默认配置，可通过 configure() 覆盖
+    enable: bool = True
+    max_queue: int = 10000
+    batch_size: int = 500
+    flush_interval_ms: int = 200
+    
+    _queue: deque = deque()
+    # 未落库的每分钟汇总
+    _minutes: Dict[RollupKey, MetricsRollup] = {}
+    _lock = threading.Lock()
+    _task: Optional[asyncio.Task] = None
+    _backfill_task: Optional[asyncio.Task] = None
+    _wakeup: Optional[asyncio.Event] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _stopping: bool = False
+    
+    enqueued: int = 0
+    dropped: int = 0
+    written: int = 0
+    failed: int = 0
+    flushes: int = 0
+    backfilled: int = 0
+    
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or not hasattr(cls, attr):
+                logger.warning(f"未知的监控写入配置项: {key}")
+                continue
+            setattr(cls, attr, value)
+    
+    @classmethod
+    def is_running(cls) -> bool:
+        return cls._task is not None and not cls._task.done()
+    
+    @classmethod
+    def enqueue(cls, row: Tuple) -> bool:
+        """
+        放入一条记录，队列满时丢弃并返回False
+        
+        Args:
+            row: 与 INSERT_METRIC_SQL 参数顺序一致的元组
+        """
+        with cls._lock:
+            if len(cls._queue) >= cls.max_queue:
+                cls.dropped += 1
+                return False
+            cls._queue.append(row)
+            cls.enqueued += 1
+            full = len(cls._queue) >= cls.batch_size
+        if full:
+            cls._wake()
+        return True
+    
+    @classmethod
+    def observe(cls, key: RollupKey, latency_ms: int, status_code: int) -> None:
+        """把一次调用记入内存中的分钟汇总"""
+        with cls._lock:
+            rollup = cls._minutes.get(key)
+            if rollup is None:
+                rollup = cls._minutes[key] = MetricsRollup()
+            rollup.add(latency_ms, status_code)
+    
+    @classmethod
+    def pending_minutes(cls, since_ms: int) -> List[Tuple[RollupKey, MetricsRollup]]:
+        """尚未写入数据库的分钟汇总副本"""
+        with cls._lock:
+            return [(key, rollup.copy()) for key, rollup in cls._minutes.items() if key[0] >= since_ms]
+    
+    @classmethod
+    def _take_minutes(cls, everything: bool) -> List[Tuple[RollupKey, MetricsRollup]]:
+        current = minute_start_ms(time.time())
+        with cls._lock:
+            keys = [key for key in cls._minutes if everything or key[0] < current]
+            return [(key, cls._minutes.pop(key)) for key in keys]
+    
+    @classmethod
+    def _restore_minutes(cls, items: List[Tuple[RollupKey, MetricsRollup]]) -> None:
+        with cls._lock:
+            for key, rollup in items:
+                existing = cls._minutes.get(key)
+                if existing is None:
+                    cls._minutes[key] = rollup
+                else:
+                    existing.merge(rollup)
+    
+    @staticmethod
+    def _merge_rows(conn, granularity: str, items: Dict[RollupKey, MetricsRollup]) -> None:
+        """把汇总与表中已有的同一行合并后写入"""
+        table, ts_column = ROLLUP_TABLES[granularity]
+        for key, rollup in items.items():
+            row = conn.execute(f"""
+                SELECT count, success, errors, total_latency_ms, max_latency_ms, buckets
+                FROM {table}
+                WHERE {ts_column} = ? AND endpoint = ? AND method = ? AND external_api = ? AND is_external = ?
+            """, key).fetchone()
+            if row is not None:
+                rollup = MetricsRollup.from_row(row).merge(rollup)
+            histogram = rollup.histogram
+            conn.execute(f"""
+                INSERT OR REPLACE INTO {table}
+                ({ts_column}, endpoint, method, external_api, is_external,
+                 count, success, errors, total_latency_ms, max_latency_ms, buckets)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (*key, histogram.count, rollup.success, rollup.errors,
+                  histogram.total, histogram.max, histogram.dumps()))
+    
+    @classmethod
+    def _persist_minutes(cls, conn, items: List[Tuple[RollupKey, MetricsRollup]]) -> None:
+        """写入分钟汇总，并增量更新所属小时的汇总"""
+        minutes: Dict[RollupKey, MetricsRollup] = {}
+        hours: Dict[RollupKey, MetricsRollup] = {}
+        for key, rollup in items:
+            minutes.setdefault(key, MetricsRollup()).merge(rollup)
+            hour_key = (hour_start_ms(key[0] / 1000),) + key[1:]
+            hours.setdefault(hour_key, MetricsRollup()).merge(rollup)
+        cls._merge_rows(conn, "minute", minutes)
+        cls._merge_rows(conn, "hour", hours)
+    
+    @classmethod
+    def flush_minutes(cls, everything: bool = False) -> int:
+        """
+        写入已结束的分钟汇总
+        
+        Args:
+            everything: 是否同时写入当前分钟(关闭时使用)
+        
+        Returns:
+            写入的分钟汇总行数
+        """
+        items = cls._take_minutes(everything)
+        if not items:
+            return 0
+        try:
+            with get_db_connection() as conn:
+                cls._persist_minutes(conn, items)
+                conn.commit()
+        except Exception as e:
+            # 写入失败时放回内存，下次再试
+            cls._restore_minutes(items)
+            logger.error(f"写入监控汇总失败: {e}")
+            return 0
+        return len(items)
+    
+    @classmethod
+    def _backfill_cursor(cls) -> Tuple[int, int]:
+        """
+        读取重建进度 (last_id, max_id)，第一次执行时记录当前最大 id
+        
+        之后写入的记录已经由内存汇总统计，只处理 max_id 之前的记录；
+        没有进度但汇总表已有数据时(旧版本已重建过)视为已完成
+        """
+        with get_db_connection() as conn:
+            last_id = get_meta(conn, "rollup_backfill_last_id")
+            max_id = get_meta(conn, "rollup_backfill_max_id")
+            if last_id is not None and max_id is not None:
+                return int(last_id), int(max_id)
+            max_id = conn.execute("SELECT MAX(id) FROM api_metrics").fetchone()[0] or 0
+            rebuilt = conn.execute("SELECT 1 FROM api_metrics_minute LIMIT 1").fetchone() is not None
+            last_id = max_id if rebuilt else 0
+            set_meta(conn, "rollup_backfill_last_id", last_id)
+            set_meta(conn, "rollup_backfill_max_id", max_id)
+            conn.commit()
+            return last_id, max_id
+    
+    @classmethod
+    def backfill(cls, batch_size: int = 5000) -> int:
+        """
+        按 id 分批从原始记录重建汇总(升级前已有的数据)，停止时中断
+        
+        每批的汇总和进度在同一个事务中提交，重启后从保存的 last_id 继续，不会重复统计
+        
+        Returns:
+            处理的原始记录数
+        """
+        last_id, max_id = cls._backfill_cursor()
+        while not cls._stopping and last_id < max_id:
+            with get_read_connection() as conn:
+                rows = conn.execute("""
+                    SELECT id, endpoint, method, status_code, latency_ms, is_external, external_api, created_at_ms
+                    FROM api_metrics
+                    WHERE id > ? AND id <= ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (last_id, max_id, batch_size)).fetchall()
+            if not rows:
+                # 剩余的记录已被清理
+                last_id = max_id
+                with get_db_connection() as conn:
+                    set_meta(conn, "rollup_backfill_last_id", last_id)
+                    conn.commit()
+                break
+            minutes: Dict[RollupKey, MetricsRollup] = {}
+            for row in rows:
+                key = (row["created_at_ms"] // 60000 * 60000, row["endpoint"], row["method"],
+                       row["external_api"] or "", row["is_external"])
+                minutes.setdefault(key, MetricsRollup()).add(row["latency_ms"], row["status_code"])
+            last_id = rows[-1]["id"]
+            with get_db_connection() as conn:
+                cls._persist_minutes(conn, list(minutes.items()))
+                set_meta(conn, "rollup_backfill_last_id", last_id)
+                conn.commit()
+            cls.backfilled += len(rows)
+        
+        if cls.backfilled:
+            logger.info(f"从原始记录重建监控汇总: {cls.backfilled} 条")
+        return cls.backfilled
+    
+    @classmethod
+    def _wake(cls) -> None:
+        loop, wakeup = cls._loop, cls._wakeup
+        if loop is None or wakeup is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            wakeup.set()
+        else:
+            loop.call_soon_threadsafe(wakeup.set)
+    
+    @classmethod
+    def flush(cls) -> int:
+        """
+        把队列中的记录写入数据库（同步执行）
+        
+        Returns:
+            写入的记录数
+        """
+        total = 0
+        while True:
+            with cls._lock:
+                count = min(len(cls._queue), cls.batch_size)
+                rows = [cls._queue.popleft() for _ in range(count)]
+            if not rows:
+                return total
+            try:
+                with get_db_connection() as conn:
+                    conn.executemany(INSERT_METRIC_SQL, rows)
+                    conn.commit()
+                cls.written += len(rows)
+                total += len(rows)
+            except Exception as e:
+                cls.failed += len(rows)
+                logger.error(f"批量写入API监控记录失败: {e}")
+                return total
+            finally:
+                cls.flushes += 1
+    
+    @classmethod
+    def start(cls) -> None:
+        """在应用生命周期中启动后台写入任务"""
+        if not cls.enable or cls.is_running():
+            return
+        cls._loop = asyncio.get_running_loop()
+        cls._wakeup = asyncio.Event()
+        cls._stopping = False
+        cls._task = asyncio.create_task(cls._run())
+        cls._backfill_task = asyncio.create_task(asyncio.to_thread(cls.backfill))
+        logger.info(f"监控数据批量写入已启动: 批量 {cls.batch_size} 条, 间隔 {cls.flush_interval_ms} 毫秒")
+    
+    @classmethod
+    async def _run(cls) -> None:
+        wakeup = cls._wakeup
+        while not cls._stopping:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=cls.flush_interval_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            if cls._queue or cls._minutes:
+                # 在线程中写入，避免阻塞事件循环
+                await asyncio.to_thread(cls._flush_all)
+    
+    @classmethod
+    def _flush_all(cls) -> None:
+        cls.flush()
+        cls.flush_minutes()
+    
+    @classmethod
+    async def stop(cls) -> None:
+        """停止后台任务并写入剩余记录"""
+        task, cls._task = cls._task, None
+        backfill_task, cls._backfill_task = cls._backfill_task, None
+        if task is not None:
+            cls._stopping = True
+            cls._wakeup.set()
+            for pending in (task, backfill_task):
+                if pending is None:
+                    continue
+                try:
+                    await pending
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.error(f"监控后台任务异常退出: {e}")
+        cls._loop = None
+        cls._wakeup = None
+        written = cls.flush()
+        cls.flush_minutes(everything=True)
+        if written:
+            logger.info(f"关闭前写入了 {written} 条API监控记录")
+    
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "running": cls.is_running(),
+            "queued": len(cls._queue),
+            "pending_minutes": len(cls._minutes),
+            "max_queue": cls.max_queue,
+            "enqueued": cls.enqueued,
+            "dropped": cls.dropped,
+            "written": cls.written,
+            "failed": cls.failed,
+            "flushes": cls.flushes,
+            "backfilled": cls.backfilled,
+        }
+
 
 class MetricsService:
     """API调用监控服务"""
     
-    # 数据保留天数
-    RETENTION_DAYS = 7
-    
     @staticmethod
     def record_api_call(
         endpoint: str,
@@ -41,25 +461,78 @@ class MetricsService:
             lc_uid: 调用者用户ID
             error_message: 错误信息(如有)
         """
+        API_REQUESTS.labels(endpoint, method, status_code, external_api or "").inc()
+        API_LATENCY.labels(endpoint, method, external_api or "").observe(latency_ms / 1000)
+        
+        now, now_ms = utc_now()
+        row = (
+            endpoint, method, status_code, latency_ms,
+            1 if is_external else 0, external_api, lc_uid,
+            error_message, now, now_ms
+        )
+        MetricsWriter.observe(
+            (now_ms // 60000 * 60000, endpoint, method, external_api or "", 1 if is_external else 0),
+            latency_ms, status_code
+        )
+        
+        # 后台写入任务运行时只入队，由后台批量写入
+        if MetricsWriter.is_running():
+            MetricsWriter.enqueue(row)
+            return
+        
         try:
             with get_db_connection() as conn:
-                cursor = conn.cursor()
-                now = datetime.utcnow().isoformat()
-                
-                cursor.execute("""
-                    INSERT INTO api_metrics 
-                    (endpoint, method, status_code, latency_ms, is_external, 
-                     external_api, lc_uid, error_message, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    endpoint, method, status_code, latency_ms, 
-                    1 if is_external else 0, external_api, lc_uid, 
-                    error_message, now
-                ))
+                conn.execute(INSERT_METRIC_SQL, row)
+                MetricsWriter._persist_minutes(conn, MetricsWriter._take_minutes(everything=True))
                 conn.commit()
         except Exception as e:
             logger.error(f"记录API调用失败: {e}")
     
+    @staticmethod
+    def load_rollups(conn, since_ms: int) -> List[Tuple[RollupKey, MetricsRollup]]:
+        """
+        读取时间范围内的汇总(含内存中尚未写入的部分)
+        
+        完整的小时读取小时汇总，首尾不完整的小时读取分钟汇总，行数与调用次数无关。
+        
+        Args:
+            conn: 数据库连接
+            since_ms: 起始时间(毫秒)
+        
+        Returns:
+            (汇总主键, 汇总) 列表，主键中的时间为所在时间段的起点
+        """
+        first_hour = -(-since_ms // 3600000) * 3600000
+        current_hour = hour_start_ms(time.time())
+        
+        ranges = []
+        if first_hour < current_hour:
+            ranges.append(("minute", since_ms, first_hour))
+            ranges.append(("hour", first_hour, current_hour))
+            ranges.append(("minute", current_hour, None))
+        else:
+            ranges.append(("minute", since_ms, None))
+        
+        result = []
+        for granularity, start, end in ranges:
+            table, ts_column = ROLLUP_TABLES[granularity]
+            query = f"""
+                SELECT {ts_column} AS ts, endpoint, method, external_api, is_external,
+                       count, success, errors, total_latency_ms, max_latency_ms, buckets
+                FROM {table}
+                WHERE {ts_column} >= ?
+            """
+            params = [start]
+            if end is not None:
+                query += f" AND {ts_column} < ?"
+                params.append(end)
+            for row in conn.execute(query, params):
+                key = (row["ts"], row["endpoint"], row["method"], row["external_api"], row["is_external"])
+                result.append((key, MetricsRollup.from_row(row)))
+        
+        result.extend(MetricsWriter.pending_minutes(since_ms))
+        return result
+    
     @staticmethod
     def get_stats(hours: int = 24) -> Dict[str, Any]:
         """
@@ -67,84 +540,56 @@ class MetricsService:
         
         Args:
             hours: 统计最近多少小时的数据
-            
+        
         Returns:
             统计数据字典
         """
-        cutoff = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        since_ms = minute_start_ms(time.time() - hours * 3600)
+        with get_read_connection() as conn:
+            rollups = MetricsService.load_rollups(conn, since_ms)
         
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # 总调用次数
-            cursor.execute("""
-                SELECT COUNT(*) as total,
-                       SUM(CASE WHEN status_code >= 200 AND status_code < 300 THEN 1 ELSE 0 END) as success,
-                       SUM(CASE WHEN status_code >= 400 THEN 1 ELSE 0 END) as errors,
-                       AVG(latency_ms) as avg_latency
-                FROM api_metrics 
-                WHERE created_at > ?
-            """, (cutoff,))
-            row = cursor.fetchone()
-            overall = {
-                "total": row["total"] or 0,
-                "success": row["success"] or 0,
-                "errors": row["errors"] or 0,
-                "avg_latency_ms": round(row["avg_latency"] or 0, 2)
-            }
-            
-            # 外部API调用统计
-            cursor.execute("""
-                SELECT COUNT(*) as total,
-                       SUM(CASE WHEN status_code >= 200 AND status_code < 300 THEN 1 ELSE 0 END) as success,
-                       SUM(CASE WHEN status_code >= 400 THEN 1 ELSE 0 END) as errors,
-                       AVG(latency_ms) as avg_latency
-                FROM api_metrics 
-                WHERE is_external = 1 AND created_at > ?
-            """, (cutoff,))
-            row = cursor.fetchone()
-            external = {
-                "total": row["total"] or 0,
-                "success": row["success"] or 0,
-                "errors": row["errors"] or 0,
-                "avg_latency_ms": round(row["avg_latency"] or 0, 2)
-            }
-            
-            # 按端点分组统计
-            cursor.execute("""
-                SELECT endpoint, method, 
-                       COUNT(*) as count,
-                       SUM(CASE WHEN status_code >= 400 THEN 1 ELSE 0 END) as errors,
-                       AVG(latency_ms) as avg_latency
-                FROM api_metrics 
-                WHERE created_at > ?
-                GROUP BY endpoint, method
-                ORDER BY count DESC
-                LIMIT 20
-            """, (cutoff,))
-            by_endpoint = [dict(row) for row in cursor.fetchall()]
-            
-            # 按外部API分组
-            cursor.execute("""
-                SELECT external_api, 
-                       COUNT(*) as count,
-                       SUM(CASE WHEN status_code >= 400 THEN 1 ELSE 0 END) as errors,
-                       AVG(latency_ms) as avg_latency
-                FROM api_metrics 
-                WHERE is_external = 1 AND created_at > ?
-                GROUP BY external_api
-                ORDER BY count DESC
-            """, (cutoff,))
-            by_external = [dict(row) for row in cursor.fetchall()]
-            
+        overall = MetricsRollup()
+        external = MetricsRollup()
+        endpoints: Dict[Tuple[str, str], MetricsRollup] = {}
+        external_apis: Dict[Optional[str], MetricsRollup] = {}
+        for (_, endpoint, method, external_api, is_external), rollup in rollups:
+            overall.merge(rollup)
+            endpoints.setdefault((endpoint, method), MetricsRollup()).merge(rollup)
+            if is_external:
+                external.merge(rollup)
+                external_apis.setdefault(external_api or None, MetricsRollup()).merge(rollup)
+        
+        def grouped(fields: Dict[str, Any], rollup: MetricsRollup) -> Dict[str, Any]:
+            summary = rollup.histogram.summary()
             return {
-                "hours": hours,
-                "overall": overall,
-                "external": external,
-                "by_endpoint": by_endpoint,
-                "by_external_api": by_external
+                **fields,
+                "count": rollup.count,
+                "errors": rollup.errors,
+                "avg_latency": summary.pop("avg_latency_ms"),
+                **summary
             }
-    
+        
+        # 按端点分组，取调用最多的20个
+        top_endpoints = sorted(endpoints.items(), key=lambda item: item[1].count, reverse=True)[:20]
+        by_endpoint = [
+            grouped({"endpoint": endpoint, "method": method}, rollup)
+            for (endpoint, method), rollup in top_endpoints
+        ]
+        
+        # 按外部API分组
+        by_external = [
+            grouped({"external_api": external_api}, rollup)
+            for external_api, rollup in sorted(external_apis.items(), key=lambda item: item[1].count, reverse=True)
+        ]
+        
+        return {
+            "hours": hours,
+            "overall": overall.summary(),
+            "external": external.summary(),
+            "by_endpoint": by_endpoint,
+            "by_external_api": by_external
+        }
+
     @staticmethod
     def get_recent_calls(
         limit: int = 100,
@@ -164,7 +609,7 @@ class MetricsService:
         Returns:
             调用记录列表
         """
-        with get_db_connection() as conn:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             
             query = "SELECT * FROM api_metrics WHERE 1=1"
@@ -181,7 +626,7 @@ class MetricsService:
             if errors_only:
                 query += " AND status_code >= 400"
             
-            query += " ORDER BY created_at DESC LIMIT ?"
+            query += " ORDER BY created_at_ms DESC LIMIT ?"
             params.append(limit)
             
             cursor.execute(query, params)
@@ -198,47 +643,41 @@ class MetricsService:
         Returns:
             每小时统计列表
         """
-        cutoff = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        since_ms = minute_start_ms(time.time() - hours * 3600)
+        with get_read_connection() as conn:
+            rollups = MetricsService.load_rollups(conn, since_ms)
         
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # SQLite中按小时分组
-            cursor.execute("""
-                SELECT 
-                    strftime('%Y-%m-%d %H:00', created_at) as hour,
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_external = 1 THEN 1 ELSE 0 END) as external,
-                    SUM(CASE WHEN status_code >= 400 THEN 1 ELSE 0 END) as errors,
-                    AVG(latency_ms) as avg_latency
-                FROM api_metrics 
-                WHERE created_at > ?
-                GROUP BY strftime('%Y-%m-%d %H', created_at)
-                ORDER BY hour ASC
-            """, (cutoff,))
-            
-            return [dict(row) for row in cursor.fetchall()]
+        by_hour: Dict[int, List[Any]] = {}
+        for key, rollup in rollups:
+            hour = by_hour.setdefault(hour_start_ms(key[0] / 1000), [MetricsRollup(), 0])
+            hour[0].merge(rollup)
+            if key[4]:
+                hour[1] += rollup.count
+        
+        result = []
+        for hour_ts in sorted(by_hour):
+            rollup, external = by_hour[hour_ts]
+            summary = rollup.histogram.summary()
+            result.append({
+                "hour": datetime.fromtimestamp(hour_ts / 1000, timezone.utc).strftime("%Y-%m-%d %H:00"),
+                "total": rollup.count,
+                "external": external,
+                "errors": rollup.errors,
+                "avg_latency": summary["avg_latency_ms"],
+                "p95_latency_ms": summary["p95_latency_ms"],
+                "p99_latency_ms": summary["p99_latency_ms"]
+            })
+        return result
     
     @staticmethod
     def cleanup_old_data() -> int:
         """
-        清理过期数据(保留RETENTION_DAYS天)
+        同步清理过期数据，由 RetentionService 分批删除
         
         Returns:
-            删除的记录数
+            删除的原始记录数
         """
-        cutoff = (datetime.utcnow() - timedelta(days=MetricsService.RETENTION_DAYS)).isoformat()
-        
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM api_metrics WHERE created_at < ?", (cutoff,))
-            deleted = cursor.rowcount
-            conn.commit()
-            
-            if deleted > 0:
-                logger.info(f"清理了 {deleted} 条过期的API监控记录")
-            
-            return deleted
+        return RetentionService.run()["deleted"]
 
 
 class MetricsTimer:
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+运行中进程的按需性能分析
+
+提供三种方式，同一时间只允许一个分析在进行，避免叠加开销：
+- 采样：守护线程按固定间隔读取 sys._current_frames()，输出 flamegraph.pl / speedscope 可读的折叠栈；
+- cProfile：在事件循环线程上开启 cProfile 若干秒，输出 pstats 文本或可被 snakeviz 打开的二进制数据；
+- 单个请求：带有与配置一致的 X-Profile 请求头时，用 cProfile 分析该请求，结果按 X-Profile-Id 查询。
+
+cProfile 作用于整个事件循环线程，分析期间并发执行的其它请求也会被计入。
+默认不启用；启用后管理接口还需要带有与配置一致的 X-Admin-Token 请求头。
+"""
+import asyncio
+import cProfile
+import hmac
+import io
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 项目根目录，项目内的文件显示相对路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerBusy(Exception):
+    """已有分析正在进行"""
+
+
+class Profiler:
+    """按需性能分析"""
+
+    # 默认配置，可通过 configure() 覆盖
+    enable: bool = False
+    # 单次分析的最长时间(秒)
+    max_seconds: int = 60
+    # 采样的最短间隔(毫秒)
+    min_interval_ms: int = 1
+    # 每个调用栈最多保留的帧数
+    max_stack_depth: int = 64
+    # 触发单个请求分析的请求头取值，为空时不允许通过请求头触发
+    request_token: str = ""
+    # 保留的单个请求分析结果数
+    max_request_profiles: int = 20
+    # 调用分析接口需要的 X-Admin-Token 请求头取值，为空时拒绝所有调用
+    admin_token: str = ""
+
+    _lock = threading.Lock()
+    _labels: Dict[Any, str] = {}
+    _requests: Deque[Dict[str, Any]] = deque(maxlen=20)
+    runs: int = 0
+    rejected: int = 0
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr in ("runs", "rejected") \
+                    or not hasattr(cls, attr) or callable(getattr(cls, attr)):
+                logger.warning(f"未知的性能分析配置项: {key}")
+                continue
+            setattr(cls, attr, value)
+        cls._requests = deque(cls._requests, maxlen=cls.max_request_profiles)
+
+    @staticmethod
+    def _token_matches(token: Optional[str], expected: str) -> bool:
+        return bool(expected) and token is not None and hmac.compare_digest(token, expected)
+
+    @classmethod
+    def check_admin_token(cls, token: Optional[str]) -> bool:
+        """分析接口的请求头是否与配置的管理令牌一致，未配置令牌时始终为 False"""
+        return cls._token_matches(token, cls.admin_token)
+
+    @classmethod
+    def _acquire(cls) -> None:
+        if not cls.enable:
+            raise ProfilerBusy("性能分析未启用")
+        if not cls._lock.acquire(blocking=False):
+            cls.rejected += 1
+            raise ProfilerBusy("已有性能分析正在进行")
+        cls.runs += 1
+
+    @classmethod
+    def _clamp(cls, seconds: float) -> float:
+        return min(max(seconds, 0.1), cls.max_seconds)
+
+    # ==================== 采样 ====================
+
+    @classmethod
+    def _label(cls, code) -> str:
+        """帧的显示名称，按代码对象缓存"""
+        label = cls._labels.get(code)
+        if label is None:
+            path = os.path.abspath(code.co_filename)
+            if path.startswith(PROJECT_ROOT) and "site-packages" not in path:
+                path = os.path.relpath(path, PROJECT_ROOT)
+            else:
+                path = os.path.basename(path)
+            if len(cls._labels) >= 10000:
+                cls._labels.clear()
+            label = cls._labels[code] = f"{path}:{code.co_qualname}".replace(";", ":").replace(" ", "_")
+        return label
+
+    @classmethod
+    def _collapse(cls, frame) -> str:
+        names = []
+        while frame is not None and len(names) < cls.max_stack_depth:
+            names.append(cls._label(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        return ";".join(names)
+
+    @classmethod
+    def _sample(cls, seconds: float, interval: float, thread_id: Optional[int]) -> Tuple[Counter, int]:
+        """在当前线程中采样，返回 (折叠栈计数, 采样次数)"""
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        samples = 0
+        frame = None
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (thread_id is not None and ident != thread_id):
+                    continue
+                stack = cls._collapse(frame)
+                if thread_id is None:
+                    stack = f"{names.get(ident, ident)};{stack}"
+                stacks[stack] += 1
+            del frame
+            samples += 1
+            time.sleep(interval)
+        return stacks, samples
+
+    @classmethod
+    async def sample(cls, seconds: float, interval_ms: float = 10, thread_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        采样若干秒，thread_id 为空时采样所有线程(栈的第一帧为线程名)
+
+        Returns:
+            {"collapsed": 折叠栈文本, "samples": 采样次数, ...}
+        """
+        cls._acquire()
+        try:
+            seconds = cls._clamp(seconds)
+            interval = max(interval_ms, cls.min_interval_ms) / 1000
+            started = time.perf_counter()
+            stacks, samples = await asyncio.to_thread(cls._sample, seconds, interval, thread_id)
+        finally:
+            cls._lock.release()
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        return {
+            "seconds": round(time.perf_counter() - started, 3),
+            "interval_ms": interval * 1000,
+            "samples": samples,
+            "collapsed": "\n".join(lines) + "\n" if lines else "",
+        }
+
+    # ==================== cProfile ====================
+
+    @classmethod
+    async def run_cprofile(cls, seconds: float) -> cProfile.Profile:
+        """在事件循环线程上开启 cProfile 若干秒"""
+        cls._acquire()
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(cls._clamp(seconds))
+            finally:
+                profile.disable()
+        finally:
+            cls._lock.release()
+        return profile
+
+    @staticmethod
+    def render(profile: cProfile.Profile, sort: str = "cumulative", limit: int = 50) -> str:
+        """pstats 文本"""
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    @staticmethod
+    def dump(profile: cProfile.Profile) -> bytes:
+        """与 cProfile 的 .prof 文件相同格式的二进制数据"""
+        profile.create_stats()
+        return marshal.dumps(profile.stats)
+
+    # ==================== 单个请求 ====================
+
+    @classmethod
+    def begin_request(cls, token: Optional[str]) -> Optional[cProfile.Profile]:
+        """请求头与配置一致且没有其它分析时开始分析当前请求，否则返回 None"""
+        if not cls.enable or not cls._token_matches(token, cls.request_token):
+            return None
+        if not cls._lock.acquire(blocking=False):
+            cls.rejected += 1
+            return None
+        cls.runs += 1
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    @classmethod
+    def finish_request(cls, profile: cProfile.Profile, profile_id: str, path: str, method: str,
+                       status_code: int, seconds: float) -> None:
+        profile.disable()
+        cls._lock.release()
+        cls._requests.append({
+            "profile_id": profile_id,
+            "path": path,
+            "method": method,
+            "status_code": status_code,
+            "duration_ms": round(seconds * 1000, 2),
+            "created_at": datetime.utcnow().isoformat(),
+            "profile": profile,
+        })
+
+    @classmethod
+    def recent_requests(cls) -> List[Dict[str, Any]]:
+        return [{k: v for k, v in item.items() if k != "profile"} for item in reversed(cls._requests)]
+
+    @classmethod
+    def get_request(cls, profile_id: str) -> Optional[cProfile.Profile]:
+        for item in cls._requests:
+            if item["profile_id"] == profile_id:
+                return item["profile"]
+        return None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "enable": cls.enable,
+            "busy": cls._lock.locked(),
+            "max_seconds": cls.max_seconds,
+            "request_trigger": bool(cls.request_token),
+            "admin_token": bool(cls.admin_token),
+            "request_profiles": len(cls._requests),
+            "runs": cls.runs,
+            "rejected": cls.rejected,
+        }
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+监控数据保留服务 - 分批清理过期的API调用记录
+
+原始记录和分钟/小时汇总都按主键分批删除，每批单独提交，批次之间休眠 pause_ms 让出写锁，
+积分等写操作最多等待一批的时间。
+可选在删除前把记录归档为 lz4 压缩的 JSONL 文件，清理后执行增量 VACUUM 和 WAL checkpoint。
+增量 VACUUM 只对以 auto_vacuum=INCREMENTAL 创建的数据库有效，已有数据库需要通过
+enable_incremental_vacuum() (管理后台) 执行一次完整的 VACUUM 才能启用。
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
+
+from app.db.database import get_db_connection, DB_PATH
+
+try:
+    import lz4.frame
+except ImportError:  # 未安装时不能归档
+    lz4 = None
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionService:
+    """监控数据保留服务"""
+    
+    # 默认配置，可通过 configure() 覆盖
+    enable: bool = True
+    # 原始记录和分钟汇总保留天数
+    days: int = 7
+    # 小时汇总保留天数
+    hourly_days: int = 90
+    # 每批删除的行数
+    batch_size: int = 5000
+    # 批次之间的间隔(毫秒)
+    pause_ms: int = 50
+    # 删除前是否归档
+    archive: bool = False
+    archive_dir: str = os.path.join(os.path.dirname(DB_PATH), "archive")
+    # 每次清理后增量回收的最大页数(0表示不回收)
+    vacuum_pages: int = 2000
+    # 定时清理间隔(小时)
+    interval_hours: float = 24
+    
+    _lock = threading.Lock()
+    last_run: Optional[Dict[str, Any]] = None
+    total_deleted: int = 0
+    # 数据库是否支持增量VACUUM，第一次回收时检查
+    incremental_vacuum: Optional[bool] = None
+    
+    @classmethod
+    def configure(cls, **options) -> None:
+        """从配置文件更新参数，配置项名称与类属性相同（不区分大小写）"""
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr in ("last_run", "total_deleted", "incremental_vacuum") \
+                    or not hasattr(cls, attr):
+                logger.warning(f"未知的数据保留配置项: {key}")
+                continue
+            setattr(cls, attr, value)
+        if not os.path.isabs(cls.archive_dir):
+            # 相对路径相对于项目根目录
+            cls.archive_dir = os.path.join(os.path.dirname(os.path.dirname(DB_PATH)), cls.archive_dir)
+        if cls.archive and lz4 is None:
+            logger.warning("未安装 lz4，已关闭监控数据归档")
+            cls.archive = False
+    
+    @classmethod
+    def _prepare(cls, now: float) -> Tuple[int, int]:
+        """返回 (截止毫秒时间, 需要检查的最大 id)"""
+        cutoff_ms = int((now - cls.days * 86400) * 1000)
+        with get_db_connection() as conn:
+            max_id = conn.execute(
+                "SELECT MAX(id) FROM api_metrics WHERE created_at_ms < ?", (cutoff_ms,)
+            ).fetchone()[0]
+        return cutoff_ms, max_id or 0
+    
+    @classmethod
+    def _rollup_cutoffs(cls, now: float) -> Tuple[Tuple[str, str, int], ...]:
+        """各汇总表的 (表名, 时间列, 截止时间)"""
+        return (
+            ("api_metrics_minute", "minute_ts", int((now - cls.days * 86400) // 60) * 60000),
+            ("api_metrics_hour", "hour_ts", int((now - cls.hourly_days * 86400) // 3600) * 3600000),
+        )
+    
+    @classmethod
+    def _delete_rollup_batch(cls, table: str, ts_column: str, cutoff: int) -> int:
+        """删除一批过期汇总，返回删除行数"""
+        with get_db_connection() as conn:
+            cursor = conn.execute(f"""
+                DELETE FROM {table}
+                WHERE ({ts_column}, endpoint, method, external_api, is_external) IN (
+                    SELECT {ts_column}, endpoint, method, external_api, is_external FROM {table}
+                    WHERE {ts_column} < ? LIMIT ?
+                )
+            """, (cutoff, cls.batch_size))
+            conn.commit()
+            return cursor.rowcount
+    
+    @classmethod
+    def _delete_batch(cls, cutoff_ms: int, last_id: int, max_id: int, archive_file=None) -> Tuple[int, int]:
+        """
+        删除一批过期记录
+        
+        Returns:
+            (删除行数, 本批最后一个 id)，没有可删除的记录时删除行数为0
+        """
+        with get_db_connection() as conn:
+            if archive_file is not None:
+                rows = conn.execute("""
+                    SELECT * FROM api_metrics
+                    WHERE id > ? AND id <= ? AND created_at_ms < ?
+                    ORDER BY id LIMIT ?
+                """, (last_id, max_id, cutoff_ms, cls.batch_size)).fetchall()
+                if not rows:
+                    return 0, last_id
+                upper = rows[-1]["id"]
+                # 先写归档再删除，归档失败时不删除
+                archive_file.write("".join(
+                    json.dumps(dict(row), ensure_ascii=False) + "\n" for row in rows
+                ).encode("utf-8"))
+                archive_file.flush()
+            else:
+                upper = conn.execute("""
+                    SELECT MAX(id) FROM (
+                        SELECT id FROM api_metrics
+                        WHERE id > ? AND id <= ? AND created_at_ms < ?
+                        ORDER BY id LIMIT ?
+                    )
+                """, (last_id, max_id, cutoff_ms, cls.batch_size)).fetchone()[0]
+                if upper is None:
+                    return 0, last_id
+            
+            cursor = conn.execute(
+                "DELETE FROM api_metrics WHERE id > ? AND id <= ? AND created_at_ms < ?",
+                (last_id, upper, cutoff_ms)
+            )
+            conn.commit()
+            return cursor.rowcount, upper
+    
+    @classmethod
+    def _vacuum(cls, pages: int) -> Optional[int]:
+        """
+        增量回收空闲页并截断WAL
+        
+        Returns:
+            回收的页数，数据库不支持增量VACUUM时为 None
+        """
+        with get_db_connection() as conn:
+            reclaimed = 0
+            if pages > 0:
+                available = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+                if not available and cls.incremental_vacuum is not False:
+                    logger.warning("数据库未启用增量VACUUM，删除的记录不会归还磁盘空间，"
+                                   "请在管理后台执行 /api/admin/db/enable-incremental-vacuum")
+                cls.incremental_vacuum = available
+                if available:
+                    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                    # executescript 会执行到完成，execute 每次只回收一页
+                    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+                    reclaimed = before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+                else:
+                    reclaimed = None
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            return reclaimed
+    
+    @classmethod
+    def enable_incremental_vacuum(cls) -> Dict[str, Any]:
+        """
+        为已有数据库启用增量VACUUM
+        
+        修改 auto_vacuum 后必须执行一次完整的 VACUUM 重写整个数据库，期间持有写锁，
+        耗时与数据库大小成正比，只应在低峰期由管理员执行一次
+        
+        Returns:
+            执行结果，已启用时 already_enabled 为 True
+        """
+        with get_db_connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                cls.incremental_vacuum = True
+                return {"already_enabled": True, "elapsed_seconds": 0}
+            started = time.perf_counter()
+            pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            enabled = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+        cls.incremental_vacuum = enabled
+        elapsed = round(time.perf_counter() - started, 3)
+        logger.info(f"已为数据库启用增量VACUUM，耗时 {elapsed} 秒")
+        return {
+            "already_enabled": False,
+            "enabled": enabled,
+            "elapsed_seconds": elapsed,
+            "pages_before": pages_before,
+            "pages_after": pages_after,
+        }
+    
+    @classmethod
+    def _open_archive(cls):
+        os.makedirs(cls.archive_dir, exist_ok=True)
+        path = os.path.join(cls.archive_dir, f"api_metrics-{datetime.utcnow():%Y%m%d-%H%M%S}.jsonl.lz4")
+        return path, lz4.frame.open(path, "wb")
+    
+    @classmethod
+    def _finish(cls, result: Dict[str, Any], started: float, archive) -> Dict[str, Any]:
+        path, archive_file = archive
+        if archive_file is not None:
+            archive_file.close()
+            if result["deleted"]:
+                result["archive_path"] = path
+            else:
+                os.remove(path)
+        elapsed = time.perf_counter() - started
+        result["elapsed_seconds"] = round(elapsed, 3)
+        result["rows_per_second"] = round(result["deleted"] / elapsed, 1) if elapsed > 0 else 0
+        result["finished_at"] = datetime.utcnow().isoformat()
+        cls.last_run = result
+        cls.total_deleted += result["deleted"]
+        if result["deleted"]:
+            logger.info(
+                f"清理了 {result['deleted']} 条过期的API监控记录, {result['batches']} 批, "
+                f"{result['elapsed_seconds']} 秒, {result['rows_per_second']} 行/秒"
+            )
+        return result
+    
+    @classmethod
+    def run(cls) -> Dict[str, Any]:
+        """
+        同步执行一次清理(批次之间休眠 pause_ms 毫秒)
+        
+        Returns:
+            本次清理结果，已有清理在进行时返回 {"skipped": True}
+        """
+        if not cls._lock.acquire(blocking=False):
+            return {"skipped": True, "deleted": 0}
+        try:
+            started = time.perf_counter()
+            result = {"deleted": 0, "batches": 0, "archive_path": None, "vacuumed_pages": 0}
+            now = time.time()
+            for table, ts_column, cutoff in cls._rollup_cutoffs(now):
+                while cls._delete_rollup_batch(table, ts_column, cutoff) >= cls.batch_size:
+                    time.sleep(cls.pause_ms / 1000)
+            cutoff_ms, max_id = cls._prepare(now)
+            archive = cls._open_archive() if cls.archive and max_id else (None, None)
+            try:
+                last_id = 0
+                while True:
+                    deleted, last_id = cls._delete_batch(cutoff_ms, last_id, max_id, archive[1])
+                    if not deleted:
+                        break
+                    result["deleted"] += deleted
+                    result["batches"] += 1
+                    time.sleep(cls.pause_ms / 1000)
+                result["vacuumed_pages"] = cls._vacuum(cls.vacuum_pages)
+            finally:
+                cls._finish(result, started, archive)
+            return result
+        finally:
+            cls._lock.release()
+    
+    @classmethod
+    async def run_async(cls) -> Dict[str, Any]:
+        """
+        在后台线程中逐批清理，批次之间让出事件循环和写锁
+        
+        Returns:
+            本次清理结果，已有清理在进行时返回 {"skipped": True}
+        """
+        if not cls._lock.acquire(blocking=False):
+            return {"skipped": True, "deleted": 0}
+        try:
+            started = time.perf_counter()
+            result = {"deleted": 0, "batches": 0, "archive_path": None, "vacuumed_pages": 0}
+            now = time.time()
+            for table, ts_column, cutoff in cls._rollup_cutoffs(now):
+                while await asyncio.to_thread(cls._delete_rollup_batch, table, ts_column, cutoff) >= cls.batch_size:
+                    await asyncio.sleep(cls.pause_ms / 1000)
+            cutoff_ms, max_id = await asyncio.to_thread(cls._prepare, now)
+            archive = cls._open_archive() if cls.archive and max_id else (None, None)
+            try:
+                last_id = 0
+                while True:
+                    deleted, last_id = await asyncio.to_thread(
+                        cls._delete_batch, cutoff_ms, last_id, max_id, archive[1]
+                    )
+                    if not deleted:
+                        break
+                    result["deleted"] += deleted
+                    result["batches"] += 1
+                    await asyncio.sleep(cls.pause_ms / 1000)
+                result["vacuumed_pages"] = await asyncio.to_thread(cls._vacuum, cls.vacuum_pages)
+            finally:
+                cls._finish(result, started, archive)
+            return result
+        finally:
+            cls._lock.release()
+    
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "running": cls._lock.locked(),
+            "days": cls.days,
+            "hourly_days": cls.hourly_days,
+            "batch_size": cls.batch_size,
+            "archive": cls.archive,
+            "incremental_vacuum": cls.incremental_vacuum,
+            "total_deleted": cls.total_deleted,
+            "last_run": cls.last_run,
+        }
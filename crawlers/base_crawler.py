@@ -36,10 +36,18 @@ import httpx
 import json
 import asyncio
 import re
+import time
+from urllib.parse import urlsplit
 
 from httpx import Response
 
 from crawlers.utils.logger import logger
+from crawlers.utils.client_pool import ClientPool
+from crawlers.utils.single_flight import SingleFlight, flight_key
+from crawlers.utils.token_pool import TokenService
+from crawlers.utils.prometheus import UPSTREAM_REQUESTS, UPSTREAM_LATENCY
+from crawlers.utils.timing import add_stage
+from crawlers.utils.tracing import span, record_span
 from crawlers.utils.api_exceptions import (
     APIError,
     APIConnectionError,
@@ -58,6 +66,9 @@ class BaseCrawler:
     基础爬虫客户端 (Base crawler client)
     """
 
+    # 进程内共享的请求合并器 / Process-wide request coalescer
+    single_flight = SingleFlight()
+
     def __init__(
             self,
             proxies: dict = None,
@@ -66,6 +77,9 @@ class BaseCrawler:
             timeout: int = 10,
             max_tasks: int = 50,
             crawler_headers: dict = {},
+            platform: str = None,
+            profile: str = "default",
+            coalesce: bool = True,
     ):
         if isinstance(proxies, dict):
             self.proxies = proxies
@@ -76,6 +90,26 @@ class BaseCrawler:
         # 爬虫请求头 / Crawler request header
         self.crawler_headers = crawler_headers or {}
 
+        # 业务逻辑重试次数 / Business logic retry count
+        self._max_retries = max_retries
+
+        # 是否合并相同的并发请求 / Whether identical concurrent requests are coalesced
+        self._coalesce = coalesce
+
+        # 超时等待时间 / Timeout waiting time
+        self._timeout = timeout
+        self.timeout = httpx.Timeout(timeout)
+
+        # 指标中的平台标签 / Platform label used by the metrics
+        self._platform = platform or "other"
+
+        # 优先从进程级连接池借用客户端 / Prefer borrowing a client from the process-wide pool
+        self._pooled = ClientPool.acquire(platform, self.proxies, profile) if platform else None
+        if self._pooled is not None:
+            self.aclient = self._pooled.client
+            self.semaphore = self._pooled.semaphore
+            return
+
         # 异步的任务数 / Number of asynchronous tasks
         self._max_tasks = max_tasks
         self.semaphore = asyncio.Semaphore(max_tasks)
@@ -84,14 +118,9 @@ class BaseCrawler:
         self._max_connections = max_connections
         self.limits = httpx.Limits(max_connections=max_connections)
 
-        # 业务逻辑重试次数 / Business logic retry count
-        self._max_retries = max_retries
         # 底层连接重试次数 / Underlying connection retry count
         self.atransport = httpx.AsyncHTTPTransport(retries=max_retries)
 
-        # 超时等待时间 / Timeout waiting time
-        self._timeout = timeout
-        self.timeout = httpx.Timeout(timeout)
         # 异步客户端 / Asynchronous client
         self.aclient = httpx.AsyncClient(
             headers=self.crawler_headers,
@@ -101,6 +130,44 @@ class BaseCrawler:
             transport=self.atransport,
         )
 
+    async def _send(self, method: str, url: str, **kwargs) -> Response:
+        """
+        发送请求并记录上游请求数和耗时，耗时同时计入当前请求的 upstream 阶段
+        (Send a request and record the upstream request count and latency; the latency also goes to
+        the upstream stage of the current request)
+        """
+        started = time.perf_counter()
+        status = "cancelled"
+        try:
+            response = await self._request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            ended = time.perf_counter()
+            UPSTREAM_REQUESTS.labels(self._platform, status).inc()
+            UPSTREAM_LATENCY.labels(self._platform).observe(ended - started)
+            add_stage("upstream", ended - started)
+            record_span("upstream", started, ended, method=method, host=urlsplit(url).hostname, status=status)
+
+    async def _request(self, method: str, url: str, **kwargs) -> Response:
+        """
+        共享客户端时按请求附带请求头并限制单主机并发
+        (With a shared client the headers are sent per request and per-host concurrency is capped)
+        """
+        if self._pooled is None:
+            async with self.semaphore:
+                return await self.aclient.request(method, url, **kwargs)
+
+        host_semaphore = self._pooled.host_semaphore(url)
+        async with self.semaphore:
+            if host_semaphore is None:
+                return await self.aclient.request(method, url, headers=self.crawler_headers, **kwargs)
+            async with host_semaphore:
+                return await self.aclient.request(method, url, headers=self.crawler_headers, **kwargs)
+
     async def fetch_response(self, endpoint: str) -> Response:
         """获取数据 (Get data)
 
@@ -121,8 +188,16 @@ class BaseCrawler:
         Returns:
             dict: 解析后的JSON数据 (Parsed JSON data)
         """
+        if not self._coalesce:
+            return await self._fetch_get_json(endpoint)
+
+        key = flight_key("GET", endpoint, self.crawler_headers)
+        return await self.single_flight.do(key, lambda: self._fetch_get_json(endpoint))
+
+    async def _fetch_get_json(self, endpoint: str) -> dict:
         response = await self.get_fetch_data(endpoint)
-        return self.parse_json(response)
+        with span("json.decode", bytes=len(response.content)):
+            return self.parse_json(response)
 
     async def fetch_post_json(self, endpoint: str, params: dict = {}, data=None) -> dict:
         """获取 JSON 数据 (Post JSON data)
@@ -133,8 +208,16 @@ class BaseCrawler:
         Returns:
             dict: 解析后的JSON数据 (Parsed JSON data)
         """
+        if not self._coalesce:
+            return await self._fetch_post_json(endpoint, params, data)
+
+        key = flight_key("POST", endpoint, self.crawler_headers, [params, data])
+        return await self.single_flight.do(key, lambda: self._fetch_post_json(endpoint, params, data))
+
+    async def _fetch_post_json(self, endpoint: str, params: dict = {}, data=None) -> dict:
         response = await self.post_fetch_data(endpoint, params, data)
-        return self.parse_json(response)
+        with span("json.decode", bytes=len(response.content)):
+            return self.parse_json(response)
 
     def parse_json(self, response: Response) -> dict:
         """解析JSON响应对象 (Parse JSON response object)
@@ -183,7 +266,7 @@ class BaseCrawler:
         """
         for attempt in range(self._max_retries):
             try:
-                response = await self.aclient.get(url, follow_redirects=True)
+                response = await self._send("GET", url, follow_redirects=True)
                 if not response.text.strip() or not response.content:
                     error_message = "第 {0} 次响应内容为空, 状态码: {1}, URL:{2}".format(attempt + 1,
                                                                                          response.status_code,
@@ -192,6 +275,8 @@ class BaseCrawler:
                     logger.warning(error_message)
 
                     if attempt == self._max_retries - 1:
+                        # 持续返回空内容通常表示令牌被拒绝 / Persistently empty bodies usually mean the token was rejected
+                        TokenService.retire_rejected(url)
                         raise APIRetryExhaustedError(
                             "获取端点数据失败, 次数达到上限"
                         )
@@ -227,7 +312,8 @@ class BaseCrawler:
         """
         for attempt in range(self._max_retries):
             try:
-                response = await self.aclient.post(
+                response = await self._send(
+                    "POST",
                     url,
                     json=None if not params else dict(params),
                     data=None if not data else data,
@@ -241,6 +327,8 @@ class BaseCrawler:
                     logger.warning(error_message)
 
                     if attempt == self._max_retries - 1:
+                        # 持续返回空内容通常表示令牌被拒绝 / Persistently empty bodies usually mean the token was rejected
+                        TokenService.retire_rejected(url)
                         raise APIRetryExhaustedError(
                             "获取端点数据失败, 次数达到上限"
                         )
@@ -275,7 +363,7 @@ class BaseCrawler:
             response: 响应内容 (Response content)
         """
         try:
-            response = await self.aclient.head(url)
+            response = await self._send("HEAD", url)
             # logger.info("响应状态码: {0}".format(response.status_code))
             response.raise_for_status()
             return response
@@ -320,6 +408,10 @@ class BaseCrawler:
             )
             raise APIResponseError(f"处理HTTP错误时遇到意外情况: {http_error}")
 
+        if status_code in (401, 403):
+            # 上游拒绝请求，淘汰链接中携带的令牌 / Upstream rejected the request, retire the tokens carried in the URL
+            TokenService.retire_rejected(url)
+
         if status_code == 302:
             pass
         elif status_code == 404:
@@ -340,10 +432,12 @@ class BaseCrawler:
             raise APIResponseError(f"HTTP状态错误: {status_code}")
 
     async def close(self):
-        await self.aclient.aclose()
+        # 共享客户端由连接池统一关闭 / Shared clients are closed by the pool
+        if self._pooled is None:
+            await self.aclient.aclose()
 
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.aclient.aclose()
+        await self.close()
@@ -8,6 +8,9 @@ class BilibiliAPIEndpoints:
     LIVE_DOMAIN = "https://api.live.bilibili.com"
 
     "-------------------------------------------------------接口-api-------------------------------------------------------"
+    # 导航信息，用于获取 WBI 签名密钥 (Nav info, provides the WBI signing keys)
+    NAV = f"{BILIAPI_DOMAIN}/x/web-interface/nav"
+
     # 作品信息 (Post Detail)
     POST_DETAIL = f"{BILIAPI_DOMAIN}/x/web-interface/view"
 
@@ -1,8 +1,34 @@
+import os
+import time
+import asyncio
+import hashlib
+from functools import lru_cache
 from urllib.parse import urlencode
-from crawlers.bilibili.web import wrid
+
+import httpx
+import yaml
+
 from crawlers.utils.logger import logger
 from crawlers.bilibili.web.endpoints import BilibiliAPIEndpoints
 
+# 配置文件路径
+path = os.path.abspath(os.path.dirname(__file__))
+
+# 读取配置文件
+with open(f"{path}/config.yaml", "r", encoding="utf-8") as f:
+    config = yaml.safe_load(f)
+
+# WBI 签名 mixin key 的字符重排表
+MIXIN_KEY_ENC_TAB = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52
+]
+
+# 过滤 value 中的 "!'()*" 字符
+_WBI_FILTER = str.maketrans("", "", "!'()*")
+
 
 class EndpointGenerator:
     def __init__(self, params: dict):
@@ -49,28 +75,136 @@ class EndpointGenerator:
         return final_endpoint
 
 
+def wbi_md5(query: str) -> str:
+    """
+    计算 w_rid，结果与 wrid.get_wrid 一致（非 ASCII 字符同样只取低 8 位）
+    Compute w_rid, identical to wrid.get_wrid (non-ASCII characters also keep only their low 8 bits)
+    """
+    try:
+        data = query.encode("ascii")
+    except UnicodeEncodeError:
+        data = bytes(ord(char) & 255 for char in query)
+    return hashlib.md5(data).hexdigest()
+
+
+@lru_cache(maxsize=256)
+def _sorted_keys(keys: tuple) -> tuple:
+    # 同一接口的参数名固定，缓存排序结果
+    return tuple(sorted(keys))
+
+
+@lru_cache(maxsize=4096)
+def _encode_pair(key: str, value: str) -> str:
+    # 静态参数（如 dm_img_inter、ps）的过滤和编码结果可以复用
+    return urlencode({key: value.translate(_WBI_FILTER)})
+
+
 class WridManager:
+    # mixin key，启动时和过期后在后台从导航接口刷新，签名不等待刷新，刷新失败时继续使用当前值
+    wbi_config = config.get("WBI", {})
+    mixin_key: str = wbi_config.get("mixin_key", "ea1db124af3c7062474693fa704f4ff8")
+    refresh_enable: bool = wbi_config.get("refresh_enable", True)
+    refresh_interval: int = wbi_config.get("refresh_interval", 43200)
+    retry_interval: int = wbi_config.get("retry_interval", 300)
+    _mixin_key_expires_at: float = 0.0
+    _refresh_task = None
+
+    @staticmethod
+    def get_mixin_key_from(img_key: str, sub_key: str) -> str:
+        """根据 img_key 和 sub_key 生成 mixin key"""
+        orig = img_key + sub_key
+        return "".join(orig[i] for i in MIXIN_KEY_ENC_TAB)[:32]
+
     @classmethod
-    async def get_encode_query(cls, params: dict) -> str:
-        params['wts'] = params['wts'] + "ea1db124af3c7062474693fa704f4ff8"
-        params = dict(sorted(params.items()))  # 按照 key 重排参数
-        # 过滤 value 中的 "!'()*" 字符
-        params = {
-            k: ''.join(filter(lambda chr: chr not in "!'()*", str(v)))
-            for k, v
-            in params.items()
+    async def fetch_mixin_key(cls) -> str:
+        """从导航接口获取最新的 mixin key"""
+        bili_config = config["TokenManager"]["bilibili"]
+        headers = {
+            "user-agent": bili_config["headers"]["user-agent"],
+            "referer": bili_config["headers"]["referer"],
+            "cookie": bili_config["headers"]["cookie"],
         }
-        query = urlencode(params)  # 序列化参数
-        return query
+        proxies = {"http://": bili_config["proxies"]["http"], "https://": bili_config["proxies"]["https"]}
+        async with httpx.AsyncClient(proxies=proxies, timeout=5) as client:
+            response = await client.get(BilibiliAPIEndpoints.NAV, headers=headers)
+            response.raise_for_status()
+            wbi_img = response.json()["data"]["wbi_img"]
+        img_key = wbi_img["img_url"].rsplit("/", 1)[-1].split(".")[0]
+        sub_key = wbi_img["sub_url"].rsplit("/", 1)[-1].split(".")[0]
+        return cls.get_mixin_key_from(img_key, sub_key)
+
+    @classmethod
+    def set_mixin_key(cls, mixin_key: str, ttl: int = None) -> None:
+        """手动设置 mixin key"""
+        cls.mixin_key = mixin_key
+        cls._mixin_key_expires_at = time.time() + (cls.refresh_interval if ttl is None else ttl)
+
+    @classmethod
+    def invalidate_mixin_key(cls) -> None:
+        """使当前 mixin key 过期，下次签名时刷新"""
+        cls._mixin_key_expires_at = 0.0
+
+    @classmethod
+    async def refresh_mixin_key(cls) -> str:
+        """从导航接口刷新 mixin key，失败时保留当前值并在 retry_interval 后重试"""
+        # 先推迟下次刷新时间，避免重复刷新
+        cls._mixin_key_expires_at = time.time() + cls.retry_interval
+        try:
+            mixin_key = await cls.fetch_mixin_key()
+            if mixin_key != cls.mixin_key:
+                logger.info("WBI mixin key 已更新: {0}".format(mixin_key))
+            cls.set_mixin_key(mixin_key)
+        except Exception as e:
+            logger.warning("刷新 WBI mixin key 失败，继续使用当前值: {0}".format(e))
+        return cls.mixin_key
+
+    @classmethod
+    def prefetch(cls) -> None:
+        """在后台刷新 mixin key，由应用生命周期在启动时调用，mixin key 过期时由签名触发"""
+        if not cls.refresh_enable or (cls._refresh_task is not None and not cls._refresh_task.done()):
+            return
+        cls._mixin_key_expires_at = time.time() + cls.retry_interval
+        cls._refresh_task = asyncio.create_task(cls.refresh_mixin_key())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """取消进行中的刷新"""
+        task, cls._refresh_task = cls._refresh_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    @classmethod
+    async def get_mixin_key(cls) -> str:
+        if cls.refresh_enable and time.time() >= cls._mixin_key_expires_at:
+            # 过期时在后台刷新，本次签名使用当前值，不等待导航接口
+            cls.prefetch()
+        return cls.mixin_key
+
+    @classmethod
+    def encode_query(cls, params: dict, mixin_key: str) -> str:
+        """按 key 排序、过滤并序列化参数，mixin key 拼接在 wts 之后"""
+        parts = []
+        for key in _sorted_keys(tuple(params)):
+            value = str(params[key])
+            if key == "wts":
+                parts.append(urlencode({key: (value + mixin_key).translate(_WBI_FILTER)}))
+            else:
+                parts.append(_encode_pair(key, value))
+        return "&".join(parts)
+
+    @classmethod
+    async def get_encode_query(cls, params: dict) -> str:
+        return cls.encode_query(params, await cls.get_mixin_key())
 
     @classmethod
     async def wrid_model_endpoint(cls, params: dict) -> str:
-        wts = params["wts"]
         encode_query = await cls.get_encode_query(params)
         # 获取w_rid参数
-        w_rid = wrid.get_wrid(e=encode_query)
-        params["wts"] = wts
-        params["w_rid"] = w_rid
+        params["w_rid"] = wbi_md5(encode_query)
         return "&".join(f"{k}={v}" for k, v in params.items())
 
 # BV号转为对应av号
@@ -77,7 +77,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"{BilibiliAPIEndpoints.POST_DETAIL}?bvid={bv_id}"
@@ -90,7 +90,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 通过模型生成基本请求参数
             params = PlayUrl(bvid=bv_id, cid=cid, qn=qn)
@@ -111,7 +111,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 通过模型生成基本请求参数
             params = UserPostVideos(mid=uid, pn=pn)
@@ -127,7 +127,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"{BilibiliAPIEndpoints.COLLECT_FOLDERS}?up_mid={uid}"
@@ -147,7 +147,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         # 发送请求，获取请求响应结果
         async with base_crawler as crawler:
             endpoint = f"{BilibiliAPIEndpoints.COLLECT_VIDEOS}?media_id={folder_id}&pn={pn}&ps=20&keyword=&order=mtime&type=0&tid=0&platform=web"
@@ -159,7 +159,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 通过模型生成基本请求参数
             params = UserProfile(mid=uid)
@@ -175,7 +175,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 通过模型生成基本请求参数
             params = ComPopular(pn=pn)
@@ -193,7 +193,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"{BilibiliAPIEndpoints.VIDEO_COMMENTS}?type=1&oid={bv_id}&sort={sort}&nohot=0&ps=20&pn={pn}"
@@ -212,7 +212,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"{BilibiliAPIEndpoints.COMMENT_REPLY}?type=1&oid={bv_id}&root={rpid}&&ps=20&pn={pn}"
@@ -225,7 +225,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 通过模型生成基本请求参数
             params = UserDynamic(host_mid=uid, offset=offset)
@@ -242,7 +242,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"https://comment.bilibili.com/{cid}.xml"
@@ -255,7 +255,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"{BilibiliAPIEndpoints.LIVEROOM_DETAIL}?room_id={room_id}"
@@ -268,7 +268,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"{BilibiliAPIEndpoints.LIVE_VIDEOS}?cid={room_id}&quality=4"
@@ -281,7 +281,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"{BilibiliAPIEndpoints.LIVE_STREAMER}?platform=web&parent_area_id={area_id}&page={pn}"
@@ -301,7 +301,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = f"{BilibiliAPIEndpoints.VIDEO_PARTS}?bvid={bv_id}"
@@ -314,7 +314,7 @@ class BilibiliWebCrawler:
         # 获取请求头信息
         kwargs = await self.get_bilibili_headers()
         # 创建基础爬虫对象
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="bilibili_web")
         async with base_crawler as crawler:
             # 创建请求endpoint
             endpoint = BilibiliAPIEndpoints.LIVE_AREAS
@@ -15,16 +15,99 @@ Changes Made:
 1. Changed the ua_code to compatible with the current config file User-Agent string in https://github.com/Evil0ctal/Douyin_TikTok_Download_API/blob/main/crawlers/douyin/web/config.yaml
 """
 
+import hashlib
+from functools import lru_cache
 from random import choice
 from random import randint
 from random import random
 from re import compile
+from struct import pack, unpack
 from time import time
 from urllib.parse import urlencode
 from urllib.parse import quote
-from gmssl import sm3, func
 
-__all__ = ["ABogus", ]
+__all__ = ["ABogus", "sm3_digest", ]
+
+_SM3_IV = (
+    0x7380166F, 0x4914B2B9, 0x172442D7, 0xDA8A0600,
+    0xA96F30BC, 0x163138AA, 0xE38DEE4D, 0xB0FB0E4E,
+)
+# 预先循环左移的轮常量 T_j <<< j (Round constants pre-rotated by j)
+_SM3_T = tuple(
+    ((t << (j % 32)) | (t >> (32 - j % 32))) & 0xFFFFFFFF
+    for j, t in ((j, 0x79CC4519 if j < 16 else 0x7A879D8A) for j in range(64))
+)
+
+
+def _sm3_compress(v: tuple, block: bytes) -> tuple:
+    """SM3 压缩函数，使用局部变量和内联循环移位 (SM3 compression with locals and inlined rotations)"""
+    w = list(unpack(">16I", block))
+    for j in range(16, 68):
+        x = w[j - 16] ^ w[j - 9]
+        r = w[j - 3]
+        x ^= ((r << 15) | (r >> 17)) & 0xFFFFFFFF
+        r = w[j - 13]
+        w.append(
+            x ^ (((x << 15) | (x >> 17)) & 0xFFFFFFFF) ^ (((x << 23) | (x >> 9)) & 0xFFFFFFFF)
+            ^ (((r << 7) | (r >> 25)) & 0xFFFFFFFF) ^ w[j - 6]
+        )
+
+    a, b, c, d, e, f, g, h = v
+    for j in range(64):
+        a12 = ((a << 12) | (a >> 20)) & 0xFFFFFFFF
+        ss1 = (a12 + e + _SM3_T[j]) & 0xFFFFFFFF
+        ss1 = ((ss1 << 7) | (ss1 >> 25)) & 0xFFFFFFFF
+        if j < 16:
+            ff = a ^ b ^ c
+            gg = e ^ f ^ g
+        else:
+            ff = (a & b) | (a & c) | (b & c)
+            gg = (e & f) | (~e & g)
+        wj = w[j]
+        tt1 = (ff + d + (ss1 ^ a12) + (wj ^ w[j + 4])) & 0xFFFFFFFF
+        tt2 = (gg + h + ss1 + wj) & 0xFFFFFFFF
+        d = c
+        c = ((b << 9) | (b >> 23)) & 0xFFFFFFFF
+        b = a
+        a = tt1
+        h = g
+        g = ((f << 19) | (f >> 13)) & 0xFFFFFFFF
+        f = e
+        e = tt2 ^ (((tt2 << 9) | (tt2 >> 23)) & 0xFFFFFFFF) ^ (((tt2 << 17) | (tt2 >> 15)) & 0xFFFFFFFF)
+
+    return (
+        v[0] ^ a, v[1] ^ b, v[2] ^ c, v[3] ^ d,
+        v[4] ^ e, v[5] ^ f, v[6] ^ g, v[7] ^ h,
+    )
+
+
+def _sm3_digest_pure(data: bytes) -> bytes:
+    """纯 Python SM3 实现 (Pure-Python SM3)"""
+    length = len(data)
+    data = data + b"\x80" + b"\x00" * ((55 - length) % 64) + pack(">Q", length * 8)
+    v = _SM3_IV
+    for i in range(0, len(data), 64):
+        v = _sm3_compress(v, data[i:i + 64])
+    return pack(">8I", *v)
+
+
+def _sm3_digest_openssl(data: bytes) -> bytes:
+    return hashlib.new("sm3", data).digest()
+
+
+# OpenSSL 提供 SM3 时使用 hashlib，否则回退到纯 Python 实现
+# Use hashlib when OpenSSL provides SM3, otherwise fall back to the pure-Python implementation
+try:
+    hashlib.new("sm3")
+    sm3_digest = _sm3_digest_openssl
+except ValueError:
+    sm3_digest = _sm3_digest_pure
+
+
+@lru_cache(maxsize=16)
+def _method_code(method: str, end_string: str) -> bytes:
+    # 请求方法只有少数几种，缓存其双重哈希 (Only a handful of methods exist, cache their double hash)
+    return sm3_digest(sm3_digest((method + end_string).encode("utf-8")))
 
 
 class ABogus:
@@ -514,11 +597,11 @@ class ABogus:
         return [int(i) & 255 for i in a]
 
     def generate_method_code(self, method: str = "GET") -> list[int]:
-        return self.sm3_to_array(self.sm3_to_array(method + self.__end_string))
+        return list(_method_code(method, self.__end_string))
         # return self.sum(self.sum(method + self.__end_string))
 
     def generate_params_code(self, params: str) -> list[int]:
-        return self.sm3_to_array(self.sm3_to_array(params + self.__end_string))
+        return list(sm3_digest(sm3_digest((params + self.__end_string).encode("utf-8"))))
         # return self.sum(self.sum(params + self.__end_string))
 
     @classmethod
@@ -541,11 +624,8 @@ class ABogus:
         else:
             b = bytes(data)  # 将 List[int] 转换为字节数组
 
-        # 将字节数组转换为适合 sm3.sm3_hash 函数处理的列表格式
-        h = sm3.sm3_hash(func.bytes_to_list(b))
-
-        # 将十六进制字符串结果转换为十进制整数列表
-        return [int(h[i: i + 2], 16) for i in range(0, len(h), 2)]
+        # 直接对字节计算摘要，无需经过十六进制字符串转换
+        return list(sm3_digest(b))
 
     @classmethod
     def generate_browser_info(cls, platform: str = "Win32") -> str:
@@ -39,7 +39,7 @@ class BaseRequestModel(BaseModel):
     time_list_query: str = "0"
     whale_cut_token: str = ""
     update_version_code: str = "170400"
-    msToken: str = TokenManager.gen_real_msToken()
+    msToken: str = Field(default_factory=TokenManager.get_msToken)
 
 
 class BaseLiveModel(BaseModel):
@@ -68,7 +68,7 @@ class BaseLiveModel2(BaseModel):
     sec_user_id: str = ""
     version_code: str = "99.99.99"
     app_id: str = "1128"
-    msToken: str = TokenManager.gen_real_msToken()
+    msToken: str = Field(default_factory=TokenManager.get_msToken)
 
 
 class BaseLoginModel(BaseModel):
@@ -49,6 +49,7 @@ import yaml
 
 from crawlers.douyin.web.xbogus import XBogus as XB
 from crawlers.douyin.web.abogus import ABogus as AB
+from crawlers.douyin.web.signer import ABogusSigner, sign as ab_sign
 
 from crawlers.utils.api_exceptions import (
     APIError,
@@ -59,6 +60,9 @@ from crawlers.utils.api_exceptions import (
     APINotFoundError,
 )
 from crawlers.utils.logger import logger
+from crawlers.utils.link_cache import link_cache
+from crawlers.utils.tracing import span
+from crawlers.utils.token_pool import TokenService
 from crawlers.utils.utils import (
     gen_random_str,
     get_timestamp,
@@ -84,14 +88,12 @@ class TokenManager:
         "http://": proxies_conf.get("http", None),
         "https://": proxies_conf.get("https", None),
     }
+    # 令牌池未运行时（如脚本调用）缓存的msToken及其过期时间 (msToken cached with its expiry when the token pool is not running, e.g. scripts)
+    _fallback_msToken = None
+    _fallback_expires_at = 0.0
 
     @classmethod
-    def gen_real_msToken(cls) -> str:
-        """
-        生成真实的msToken,当出现错误时返回虚假的值
-        (Generate a real msToken and return a false value when an error occurs)
-        """
-
+    def _msToken_request(cls) -> tuple:
         payload = json.dumps(
             {
                 "magic": cls.token_conf["magic"],
@@ -105,6 +107,16 @@ class TokenManager:
             "User-Agent": cls.token_conf["User-Agent"],
             "Content-Type": "application/json",
         }
+        return payload, headers
+
+    @classmethod
+    def gen_real_msToken(cls) -> str:
+        """
+        生成真实的msToken,当出现错误时返回虚假的值
+        (Generate a real msToken and return a false value when an error occurs)
+        """
+
+        payload, headers = cls._msToken_request()
 
         transport = httpx.HTTPTransport(retries=5)
         with httpx.Client(transport=transport, proxies=cls.proxies) as client:
@@ -150,6 +162,61 @@ class TokenManager:
                 logger.info("将使用本地生成的虚假msToken参数，以继续请求。")
                 return cls.gen_false_msToken()
 
+    @classmethod
+    async def gen_real_msToken_async(cls) -> str:
+        """
+        异步生成真实的msToken，失败时抛出异常，供令牌池使用
+        (Generate a real msToken asynchronously, raising on failure; used by the token pool)
+        """
+        payload, headers = cls._msToken_request()
+
+        transport = httpx.AsyncHTTPTransport(retries=5)
+        async with httpx.AsyncClient(transport=transport, proxies=cls.proxies, timeout=10) as client:
+            response = await client.post(cls.token_conf["url"], content=payload, headers=headers)
+            response.raise_for_status()
+
+        msToken = str(httpx.Cookies(response.cookies).get("msToken"))
+        if len(msToken) not in [120, 128]:
+            raise APIResponseError("响应内容：{0}， Douyin msToken API 的响应内容不符合要求。".format(msToken))
+        return msToken
+
+    @classmethod
+    def get_msToken(cls) -> str:
+        """
+        从令牌池取msToken，不在请求路径上生成
+        (Take a msToken from the token pool without generating one on the request path)
+        """
+        msToken = TokenService.get("douyin_msToken")
+        if msToken is not None:
+            return msToken
+        # 令牌池正在补充，先使用虚假的msToken (The pool is refilling, use a fake msToken meanwhile)
+        if TokenService.is_running():
+            return cls.gen_false_msToken()
+        # 脚本调用时同步生成，与令牌池相同的最长使用时间后重新生成
+        # (Scripts generate synchronously and regenerate after the same max age as the pool)
+        if cls._fallback_msToken is None or time.time() >= cls._fallback_expires_at:
+            cls._fallback_msToken = cls.gen_real_msToken()
+            cls._fallback_expires_at = time.time() + TokenService.max_age
+        return cls._fallback_msToken
+
+    @classmethod
+    async def fetch_msToken(cls) -> str:
+        """
+        从令牌池轮转取msToken，池正在补充时返回虚假的值，仅在令牌池未运行时异步生成
+        (Take a pooled msToken round-robin; while the pool refills return a fake value, and only
+        generate asynchronously when the pool is not running)
+        """
+        msToken = TokenService.get("douyin_msToken")
+        if msToken is not None:
+            return msToken
+        if TokenService.is_running():
+            return cls.gen_false_msToken()
+        try:
+            return await cls.gen_real_msToken_async()
+        except Exception as e:
+            logger.error("请求Douyin msToken API时发生错误：{0}".format(e))
+            return cls.gen_false_msToken()
+
     @classmethod
     def gen_false_msToken(cls) -> str:
         """生成随机msToken (Generate random msToken)"""
@@ -196,6 +263,42 @@ class TokenManager:
                     )
                     )
 
+    @classmethod
+    async def gen_ttwid_async(cls) -> str:
+        """
+        异步生成ttwid，失败时抛出异常，供令牌池使用
+        (Generate a ttwid asynchronously, raising on failure; used by the token pool)
+        """
+        transport = httpx.AsyncHTTPTransport(retries=5)
+        async with httpx.AsyncClient(transport=transport, timeout=10) as client:
+            response = await client.post(cls.ttwid_conf["url"], content=cls.ttwid_conf["data"])
+            response.raise_for_status()
+
+        ttwid = httpx.Cookies(response.cookies).get("ttwid")
+        if ttwid is None:
+            raise APIResponseError("{0} 内容不符合要求".format("ttwid"))
+        return ttwid
+
+    @classmethod
+    async def fetch_ttwid(cls) -> str:
+        """
+        从令牌池轮转取ttwid，池为空时等待后台补充，仅在令牌池未运行时异步生成
+        (Take a pooled ttwid round-robin; wait for the background refill when the pool is empty, and only
+        generate asynchronously when the pool is not running)
+        """
+        ttwid = await TokenService.wait("douyin_ttwid")
+        if ttwid is not None:
+            return ttwid
+        if TokenService.is_running():
+            raise APIResponseError("ttwid 令牌池为空，请稍后重试 (The ttwid pool is empty, retry later)")
+        return await cls.gen_ttwid_async()
+
+
+# 注册令牌池，由应用生命周期中的后台任务补充；上游拒绝带有 msToken 的请求时淘汰该令牌
+# (Register token pools, refilled by the lifespan background task; a msToken is retired when upstream rejects a request carrying it)
+TokenService.register("douyin_msToken", TokenManager.gen_real_msToken_async, param="msToken", host="douyin.com")
+TokenService.register("douyin_ttwid", TokenManager.gen_ttwid_async)
+
 
 class VerifyFpManager:
     @classmethod
@@ -239,7 +342,7 @@ class BogusManager:
     @classmethod
     def xb_str_2_endpoint(cls, endpoint: str, user_agent: str) -> str:
         try:
-            final_endpoint = XB(user_agent).getXBogus(endpoint)
+            final_endpoint = XB.for_user_agent(user_agent).getXBogus(endpoint)
         except Exception as e:
             raise RuntimeError("生成X-Bogus失败: {0})".format(e))
 
@@ -254,7 +357,7 @@ class BogusManager:
         param_str = "&".join([f"{k}={v}" for k, v in params.items()])
 
         try:
-            xb_value = XB(user_agent).getXBogus(param_str)
+            xb_value = XB.for_user_agent(user_agent).getXBogus(param_str)
         except Exception as e:
             raise RuntimeError("生成X-Bogus失败: {0})".format(e))
 
@@ -297,11 +400,24 @@ class BogusManager:
             raise TypeError("参数必须是字典类型")
 
         try:
-            ab_value = AB().get_value(params, )
+            ab_value = ab_sign(params, user_agent)
+        except Exception as e:
+            raise RuntimeError("生成A-Bogus失败: {0})".format(e))
+
+        return ab_value
+
+    # 字典方法异步生成A-Bogus参数，签名在工作池中执行，不阻塞事件循环
+    @classmethod
+    async def ab_model_2_endpoint_async(cls, params: dict, user_agent: str) -> str:
+        if not isinstance(params, dict):
+            raise TypeError("参数必须是字典类型")
+
+        try:
+            ab_value = await ABogusSigner.sign(params, user_agent)
         except Exception as e:
             raise RuntimeError("生成A-Bogus失败: {0})".format(e))
 
-        return quote(ab_value, safe='')
+        return ab_value
 
 
 class SecUserIdFetcher:
@@ -338,6 +454,17 @@ class SecUserIdFetcher:
             else cls._DOUYIN_URL_PATTERN
         )
 
+        # 完整的用户主页链接无需请求 (Full profile URLs need no request)
+        if "v.douyin.com" not in url:
+            match = cls._DOUYIN_URL_PATTERN.search(url)
+            if match and match.group(1):
+                return match.group(1)
+
+        # 查询短链接缓存 (Check the short link cache)
+        sec_user_id = await link_cache.get("douyin_sec_user_id", url)
+        if sec_user_id:
+            return sec_user_id
+
         try:
             transport = httpx.AsyncHTTPTransport(retries=5)
             async with httpx.AsyncClient(
@@ -348,6 +475,7 @@ class SecUserIdFetcher:
                 if response.status_code in {200, 444}:
                     match = pattern.search(str(response.url))
                     if match:
+                        await link_cache.set("douyin_sec_user_id", url, match.group(1), str(response.url))
                         return match.group(1)
                     else:
                         raise APIResponseError(
@@ -409,6 +537,12 @@ class AwemeIdFetcher:
     _DOUYIN_VIDEO_URL_PATTERN_NEW = re.compile(r"[?&]vid=(\d+)")
     _DOUYIN_NOTE_URL_PATTERN = re.compile(r"note/([^/?]*)")
     _DOUYIN_DISCOVER_URL_PATTERN = re.compile(r"modal_id=([0-9]+)")
+    # 无需重定向即可匹配的完整链接 (Full URLs matched without any redirect)
+    _DOUYIN_FULL_URL_PATTERNS = [
+        re.compile(r"douyin\.com/(?:share/)?(?:video|note)/(\d+)"),
+        re.compile(r"[?&]modal_id=(\d+)"),
+        re.compile(r"[?&]vid=(\d+)"),
+    ]
 
     @classmethod
     async def get_aweme_id(cls, url: str) -> str:
@@ -425,13 +559,26 @@ class AwemeIdFetcher:
         if not isinstance(url, str):
             raise TypeError("参数必须是字符串类型")
 
+        # 完整链接直接匹配，无需网络请求 (Full URLs are matched directly without network I/O)
+        if "v.douyin.com" not in url:
+            for pattern in cls._DOUYIN_FULL_URL_PATTERNS:
+                match = pattern.search(url)
+                if match:
+                    return match.group(1)
+
+        # 查询短链接缓存 (Check the short link cache)
+        aweme_id = await link_cache.get("douyin_aweme_id", url)
+        if aweme_id:
+            return aweme_id
+
         # 重定向到完整链接
         transport = httpx.AsyncHTTPTransport(retries=5)
         async with httpx.AsyncClient(
                 transport=transport, proxy=None, timeout=10
         ) as client:
             try:
-                response = await client.get(url, follow_redirects=True)
+                with span("short_link.redirect", platform="douyin"):
+                    response = await client.get(url, follow_redirects=True)
                 response.raise_for_status()
 
                 response_url = str(response.url)
@@ -445,6 +592,7 @@ class AwemeIdFetcher:
                 ]:
                     match = pattern.search(response_url)
                     if match:
+                        await link_cache.set("douyin_aweme_id", url, match.group(1), response_url)
                         return match.group(1)
 
                 raise APIResponseError("未在响应的地址中找到 aweme_id，检查链接是否为作品页")
@@ -525,6 +673,18 @@ class WebCastIdFetcher:
             raise (
                 APINotFoundError("输入的URL不合法。类名：{0}".format(cls.__name__))
             )
+
+        # 完整的直播间链接无需请求 (Full live room URLs need no request)
+        match = cls._DOUYIN_LIVE_URL_PATTERN2.search(url)
+        if match:
+            return match.group(1)
+
+        # 查询短链接缓存 (Check the short link cache)
+        share_url = url
+        webcast_id = await link_cache.get("douyin_webcast_id", share_url)
+        if webcast_id:
+            return webcast_id
+
         try:
             # 重定向到完整链接
             transport = httpx.AsyncHTTPTransport(retries=5)
@@ -552,6 +712,7 @@ class WebCastIdFetcher:
                     raise APIResponseError("未在响应的地址中找到webcast_id，检查链接是否为直播页"
                                            )
 
+                await link_cache.set("douyin_webcast_id", share_url, match.group(1), url)
                 return match.group(1)
 
         except httpx.RequestError as exc:
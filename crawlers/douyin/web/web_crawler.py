@@ -90,7 +90,7 @@ class DouyinWebCrawler:
         # 获取抖音的实时Cookie
         kwargs = await self.get_douyin_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             # 创建一个作品详情的BaseModel参数
             params = PostDetail(aweme_id=aweme_id)
@@ -103,7 +103,7 @@ class DouyinWebCrawler:
             # 生成一个作品详情的带有a_bogus加密参数的Endpoint
             params_dict = params.dict()
             params_dict["msToken"] = ''
-            a_bogus = BogusManager.ab_model_2_endpoint(params_dict, kwargs["headers"]["User-Agent"])
+            a_bogus = await BogusManager.ab_model_2_endpoint_async(params_dict, kwargs["headers"]["User-Agent"])
             endpoint = f"{DouyinAPIEndpoints.POST_DETAIL}?{urlencode(params_dict)}&a_bogus={a_bogus}"
 
             response = await crawler.fetch_get_json(endpoint)
@@ -112,7 +112,7 @@ class DouyinWebCrawler:
     # 获取用户发布作品数据
     async def fetch_user_post_videos(self, sec_user_id: str, max_cursor: int, count: int):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = UserPost(sec_user_id=sec_user_id, max_cursor=max_cursor, count=count)
             # endpoint = BogusManager.xb_model_2_endpoint(
@@ -123,7 +123,7 @@ class DouyinWebCrawler:
             # 生成一个用户发布作品数据的带有a_bogus加密参数的Endpoint
             params_dict = params.dict()
             params_dict["msToken"] = ''
-            a_bogus = BogusManager.ab_model_2_endpoint(params_dict, kwargs["headers"]["User-Agent"])
+            a_bogus = await BogusManager.ab_model_2_endpoint_async(params_dict, kwargs["headers"]["User-Agent"])
             endpoint = f"{DouyinAPIEndpoints.USER_POST}?{urlencode(params_dict)}&a_bogus={a_bogus}"
 
             response = await crawler.fetch_get_json(endpoint)
@@ -132,7 +132,7 @@ class DouyinWebCrawler:
     # 获取用户喜欢作品数据
     async def fetch_user_like_videos(self, sec_user_id: str, max_cursor: int, count: int):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = UserLike(sec_user_id=sec_user_id, max_cursor=max_cursor, count=count)
             # endpoint = BogusManager.xb_model_2_endpoint(
@@ -142,7 +142,7 @@ class DouyinWebCrawler:
 
             params_dict = params.dict()
             params_dict["msToken"] = ''
-            a_bogus = BogusManager.ab_model_2_endpoint(params_dict, kwargs["headers"]["User-Agent"])
+            a_bogus = await BogusManager.ab_model_2_endpoint_async(params_dict, kwargs["headers"]["User-Agent"])
             endpoint = f"{DouyinAPIEndpoints.USER_FAVORITE_A}?{urlencode(params_dict)}&a_bogus={a_bogus}"
 
             response = await crawler.fetch_get_json(endpoint)
@@ -152,7 +152,7 @@ class DouyinWebCrawler:
     async def fetch_user_collection_videos(self, cookie: str, cursor: int = 0, count: int = 20):
         kwargs = await self.get_douyin_headers()
         kwargs["headers"]["Cookie"] = cookie
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = UserCollection(cursor=cursor, count=count)
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -164,7 +164,7 @@ class DouyinWebCrawler:
     # 获取用户合辑作品数据
     async def fetch_user_mix_videos(self, mix_id: str, cursor: int = 0, count: int = 20):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = UserMix(mix_id=mix_id, cursor=cursor, count=count)
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -176,7 +176,7 @@ class DouyinWebCrawler:
     # 获取用户直播流数据
     async def fetch_user_live_videos(self, webcast_id: str, room_id_str=""):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = UserLive(web_rid=webcast_id, room_id_str=room_id_str)
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -188,7 +188,7 @@ class DouyinWebCrawler:
     # 获取指定用户的直播流数据
     async def fetch_user_live_videos_by_room_id(self, room_id: str):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = UserLive2(room_id=room_id)
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -200,7 +200,7 @@ class DouyinWebCrawler:
     # 获取直播间送礼用户排行榜
     async def fetch_live_gift_ranking(self, room_id: str, rank_type: int = 30):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = LiveRoomRanking(room_id=room_id, rank_type=rank_type)
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -212,7 +212,7 @@ class DouyinWebCrawler:
     # 获取指定用户的信息
     async def handler_user_profile(self, sec_user_id: str):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = UserProfile(sec_user_id=sec_user_id)
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -224,7 +224,7 @@ class DouyinWebCrawler:
     # 获取指定视频的评论数据
     async def fetch_video_comments(self, aweme_id: str, cursor: int = 0, count: int = 20):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = PostComments(aweme_id=aweme_id, cursor=cursor, count=count)
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -236,7 +236,7 @@ class DouyinWebCrawler:
     # 获取指定视频的评论回复数据
     async def fetch_video_comments_reply(self, item_id: str, comment_id: str, cursor: int = 0, count: int = 20):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = PostCommentsReply(item_id=item_id, comment_id=comment_id, cursor=cursor, count=count)
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -248,7 +248,7 @@ class DouyinWebCrawler:
     # 获取抖音热榜数据
     async def fetch_hot_search_result(self):
         kwargs = await self.get_douyin_headers()
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="douyin_web")
         async with base_crawler as crawler:
             params = BaseRequestModel()
             endpoint = BogusManager.xb_model_2_endpoint(
@@ -262,14 +262,14 @@ class DouyinWebCrawler:
     # 生成真实msToken
     async def gen_real_msToken(self, ):
         result = {
-            "msToken": TokenManager().gen_real_msToken()
+            "msToken": await TokenManager.fetch_msToken()
         }
         return result
 
     # 生成ttwid
     async def gen_ttwid(self, ):
         result = {
-            "ttwid": TokenManager().gen_ttwid()
+            "ttwid": await TokenManager.fetch_ttwid()
         }
         return result
 
@@ -304,7 +304,7 @@ class DouyinWebCrawler:
         params = dict([i.split("=") for i in url.split("?")[1].split("&")])
         # 去除URL中的msToken参数
         params["msToken"] = ""
-        a_bogus = BogusManager.ab_model_2_endpoint(params, user_agent)
+        a_bogus = await BogusManager.ab_model_2_endpoint_async(params, user_agent)
         result = {
             "url": f"{endpoint}?{urlencode(params)}&a_bogus={a_bogus}",
             "a_bogus": a_bogus,
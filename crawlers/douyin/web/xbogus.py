@@ -36,9 +36,65 @@
 import time
 import base64
 import hashlib
+from functools import lru_cache
+from typing import List, Tuple
+
+_CHARACTER = "Dkdpgh4ZKsQB80/Mfvw36XI1R25-WUAlEi7NLboqYTOPuzmFjJnryx9HVGcaStCe="
+_UA_KEY = b"\x00\x01\x0c"
+_CT = 536919696
+
+
+def _str_to_bytes(md5_str: str) -> bytes:
+    """
+    与 md5_str_to_array 相同的规则：超过32个字符按字符编码，否则按十六进制解码。
+    Same rule as md5_str_to_array: longer than 32 characters is taken as text, otherwise hex-decoded.
+    """
+    if len(md5_str) > 32:
+        return md5_str.encode("ISO-8859-1")
+    return bytes.fromhex(md5_str)
+
+
+def _double_md5(data: bytes) -> bytes:
+    return hashlib.md5(hashlib.md5(data).digest()).digest()
+
+
+def _rc4_state(key: bytes) -> List[int]:
+    # RC4 密钥调度，结果可复用 (RC4 key schedule, reusable across messages)
+    S = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + S[i] + key[i % len(key)]) % 256
+        S[i], S[j] = S[j], S[i]
+    return S
+
+
+def _rc4_apply(state: List[int], data: bytes) -> bytes:
+    S = state[:]
+    i = j = 0
+    out = bytearray(len(data))
+    for k, byte in enumerate(data):
+        i = (i + 1) & 255
+        j = (j + S[i]) & 255
+        S[i], S[j] = S[j], S[i]
+        out[k] = byte ^ S[(S[i] + S[j]) & 255]
+    return bytes(out)
+
+
+# 与 User-Agent 无关的常量部分 (Parts independent of the User-Agent)
+_EMPTY_MD5_DIGEST = hashlib.md5(bytes.fromhex("d41d8cd98f00b204e9800998ecf8427e")).digest()
+_FF_RC4_STATE = _rc4_state(b"\xff")
 
 
 class XBogus:
+    @classmethod
+    @lru_cache(maxsize=64)
+    def for_user_agent(cls, user_agent: str = None) -> "XBogus":
+        """
+        获取按 User-Agent 缓存的实例，User-Agent 派生的数据只计算一次。
+        Get an instance cached per User-Agent so the UA-derived state is computed once.
+        """
+        return cls(user_agent)
+
     def __init__(self, user_agent: str = None) -> None:
         # fmt: off
         self.Array = [
@@ -57,6 +113,11 @@ class XBogus:
             if user_agent is not None and user_agent != ""
             else "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0"
         )
+        # User-Agent 派生的摘要 (Digest derived from the User-Agent)
+        ua_base64 = base64.b64encode(
+            self.rc4_encrypt(self.ua_key, self.user_agent.encode("ISO-8859-1"))
+        ).decode("ISO-8859-1")
+        self.ua_digest = hashlib.md5(_str_to_bytes(ua_base64)).digest()
 
     def md5_str_to_array(self, md5_str):
         """
@@ -166,76 +227,56 @@ class XBogus:
 
     def getXBogus(self, url_path):
         """
-        获取 X-Bogus 值。
-        Get the X-Bogus value.
+        获取 X-Bogus 值，不修改实例状态，按 User-Agent 缓存的实例可以并发使用。
+        Get the X-Bogus value without mutating the instance, so cached per-User-Agent instances can be shared.
         """
+        params, xb_ = self._sign(url_path, int(time.time()))
+        return (params, xb_, self.user_agent)
 
-        array1 = self.md5_str_to_array(
-            self.md5(
-                base64.b64encode(
-                    self.rc4_encrypt(self.ua_key, self.user_agent.encode("ISO-8859-1"))
-                ).decode("ISO-8859-1")
-            )
-        )
+    def getXBogus_many(self, url_paths: List[str]) -> List[Tuple[str, str, str]]:
+        """
+        批量获取 X-Bogus 值，同一批次共用时间戳。
+        Get X-Bogus values for many URL paths sharing one timestamp.
+        """
+        timer = int(time.time())
+        results = []
+        for url_path in url_paths:
+            params, xb_ = self._sign(url_path, timer)
+            results.append((params, xb_, self.user_agent))
+        return results
 
-        array2 = self.md5_str_to_array(
-            self.md5(self.md5_str_to_array("d41d8cd98f00b204e9800998ecf8427e"))
-        )
-        url_path_array = self.md5_encrypt(url_path)
+    def _sign(self, url_path: str, timer: int) -> Tuple[str, str]:
+        url_path_digest = _double_md5(_str_to_bytes(url_path))
 
-        timer = int(time.time())
-        ct = 536919696
-        array3 = []
-        array4 = []
-        xb_ = ""
         # fmt: off
+        # 原实现中的 0.00390625 取整后为 0 (The original 0.00390625 truncates to 0)
         new_array = [
-            64, 0.00390625, 1, 12,
-            url_path_array[14], url_path_array[15], array2[14], array2[15], array1[14], array1[15],
+            64, 0, 1, 12,
+            url_path_digest[14], url_path_digest[15], _EMPTY_MD5_DIGEST[14], _EMPTY_MD5_DIGEST[15],
+            self.ua_digest[14], self.ua_digest[15],
             timer >> 24 & 255, timer >> 16 & 255, timer >> 8 & 255, timer & 255,
-            ct >> 24 & 255, ct >> 16 & 255, ct >> 8 & 255, ct & 255
+            _CT >> 24 & 255, _CT >> 16 & 255, _CT >> 8 & 255, _CT & 255
         ]
         # fmt: on
-        xor_result = new_array[0]
-        for i in range(1, len(new_array)):
-            b = new_array[i]
-            if isinstance(b, float):
-                b = int(b)
+        xor_result = 0
+        for b in new_array:
             xor_result ^= b
-
         new_array.append(xor_result)
 
-        idx = 0
-        while idx < len(new_array):
-            array3.append(new_array[idx])
-            try:
-                array4.append(new_array[idx + 1])
-            except IndexError:
-                pass
-            idx += 2
-
-        merge_array = array3 + array4
-
-        garbled_code = self.encoding_conversion2(
-            2,
-            255,
-            self.rc4_encrypt(
-                "ÿ".encode("ISO-8859-1"),
-                self.encoding_conversion(*merge_array).encode("ISO-8859-1"),
-            ).decode("ISO-8859-1"),
-        )
+        # 与 encoding_conversion 相同的字节顺序 (Same byte order as encoding_conversion)
+        a, b, c, e, d, t, f, r, n, o, i, _, x, u, s, l, v, h, p = new_array[0::2] + new_array[1::2]
+        plain = bytes((a, i, b, _, c, x, e, u, d, s, t, l, f, v, r, h, n, p, o))
+        garbled = b"\x02\xff" + _rc4_apply(_FF_RC4_STATE, plain)
 
-        idx = 0
-        while idx < len(garbled_code):
-            xb_ += self.calculation(
-                ord(garbled_code[idx]),
-                ord(garbled_code[idx + 1]),
-                ord(garbled_code[idx + 2]),
-            )
-            idx += 3
-        self.params = "%s&X-Bogus=%s" % (url_path, xb_)
-        self.xb = xb_
-        return (self.params, self.xb, self.user_agent)
+        chars = []
+        for idx in range(0, len(garbled), 3):
+            x3 = (garbled[idx] << 16) | (garbled[idx + 1] << 8) | garbled[idx + 2]
+            chars.append(_CHARACTER[(x3 & 16515072) >> 18])
+            chars.append(_CHARACTER[(x3 & 258048) >> 12])
+            chars.append(_CHARACTER[(x3 & 4032) >> 6])
+            chars.append(_CHARACTER[x3 & 63])
+        xb_ = "".join(chars)
+        return "%s&X-Bogus=%s" % (url_path, xb_), xb_
 
 
 if __name__ == "__main__":
@@ -32,46 +32,144 @@
 # ==============================================================================
 
 import asyncio
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
 
 from crawlers.douyin.web.web_crawler import DouyinWebCrawler  # 导入抖音Web爬虫
 from crawlers.tiktok.web.web_crawler import TikTokWebCrawler  # 导入TikTok Web爬虫
 from crawlers.tiktok.app.app_crawler import TikTokAPPCrawler  # 导入TikTok App爬虫
+from crawlers.utils.cache import MISS, TieredCache  # 导入缓存
+from crawlers.utils.tracing import span  # 导入追踪
+
+
+# CDN链接中表示过期时间的参数/Query parameters carrying the CDN link expiry
+CDN_EXPIRY_PARAMS = ("x-expires", "expire", "x-expire")
+
+
+def cdn_expires_at(data) -> Optional[float]:
+    """
+    遍历数据中的全部链接，返回最早的CDN过期时间戳
+    (Walk every URL in the data and return the earliest CDN expiry timestamp)
+    """
+    earliest = None
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, str) and item.startswith("http") and "expire" in item:
+            for key, value in parse_qsl(urlsplit(item).query):
+                if key.lower() in CDN_EXPIRY_PARAMS and value.isdigit():
+                    expires = int(value)
+                    # 毫秒时间戳/Millisecond timestamps
+                    if expires > 10 ** 11:
+                        expires //= 1000
+                    if earliest is None or expires < earliest:
+                        earliest = expires
+    return earliest
 
 
 class HybridCrawler:
+    # 进程内共享的作品元数据缓存/Process-wide post metadata cache
+    metadata_cache = TieredCache(max_entries=2048)
+    # 未找到过期参数时的默认缓存时间/Default TTL when no expiry parameter is found
+    cache_default_ttl = 300
+    # 最长缓存时间/Maximum TTL
+    cache_max_ttl = 3600
+    # 在CDN链接过期前提前失效的秒数/Seconds an entry expires before its CDN links do
+    cache_expiry_margin = 60
+
     def __init__(self):
         self.DouyinWebCrawler = DouyinWebCrawler()
         self.TikTokWebCrawler = TikTokWebCrawler()
         self.TikTokAPPCrawler = TikTokAPPCrawler()
 
+    @classmethod
+    def configure_cache(cls, max_entries: int = 2048, default_ttl: int = 300, max_ttl: int = 3600,
+                        expiry_margin: int = 60, disk_enable: bool = False,
+                        disk_path: str = "./data/metadata_cache", disk_max_entries: int = 10000):
+        """
+        配置元数据缓存/Configure the metadata cache
+        """
+        cls.metadata_cache.memory.max_entries = max_entries
+        cls.cache_default_ttl = default_ttl
+        cls.cache_max_ttl = max_ttl
+        cls.cache_expiry_margin = expiry_margin
+        if disk_enable:
+            cls.metadata_cache.enable_disk(disk_path, max_entries=disk_max_entries)
+
+    @classmethod
+    def cache_ttl(cls, data) -> float:
+        """
+        根据CDN链接的过期时间计算缓存时间，保证不会返回已过期的链接
+        (Derive the TTL from the CDN link expiry so expired links are never served)
+        """
+        expires_at = cdn_expires_at(data)
+        if expires_at is None:
+            return cls.cache_default_ttl
+        return min(cls.cache_max_ttl, expires_at - time.time() - cls.cache_expiry_margin)
+
     async def hybrid_parsing_single_video(self, url: str, minimal: bool = False):
-        # 解析抖音视频/Parse Douyin video
+        # 解析抖音视频ID/Parse Douyin video ID
         if "douyin" in url:
             platform = "douyin"
-            aweme_id = await self.DouyinWebCrawler.get_aweme_id(url)
-            data = await self.DouyinWebCrawler.fetch_one_video(aweme_id)
-            data = data.get("aweme_detail")
-            # $.aweme_detail.aweme_type
-            aweme_type = data.get("aweme_type")
-        # 解析TikTok视频/Parse TikTok video
+            with span("hybrid.get_aweme_id", platform=platform):
+                aweme_id = await self.DouyinWebCrawler.get_aweme_id(url)
+        # 解析TikTok视频ID/Parse TikTok video ID
         elif "tiktok" in url:
             platform = "tiktok"
-            aweme_id = await self.TikTokWebCrawler.get_aweme_id(url)
+            with span("hybrid.get_aweme_id", platform=platform):
+                aweme_id = await self.TikTokWebCrawler.get_aweme_id(url)
+        else:
+            raise ValueError("hybrid_parsing_single_video: Cannot judge the video source from the URL.")
+
+        # 优先读取缓存，返回的是副本/Read the cache first; it returns a copy
+        cache_key = f"{platform}:{aweme_id}:{int(minimal)}"
+        with span("hybrid.cache_lookup"):
+            data = await self.metadata_cache.aget(cache_key)
+        if data is not MISS:
+            return data
+
+        data = await self.parse_single_video(platform, aweme_id, minimal)
 
+        ttl = self.cache_ttl(data)
+        if ttl > 0:
+            await self.metadata_cache.aset(cache_key, data, ttl)
+        return data
+
+    async def parse_single_video(self, platform: str, aweme_id: str, minimal: bool = False):
+        # 获取抖音视频数据/Fetch Douyin video data
+        if platform == "douyin":
+            with span("hybrid.fetch_one_video", platform=platform):
+                data = await self.DouyinWebCrawler.fetch_one_video(aweme_id)
+            data = data.get("aweme_detail")
+        # 获取TikTok视频数据/Fetch TikTok video data
+        else:
             # 2024-09-14: Switch to TikTokAPPCrawler instead of TikTokWebCrawler
             # data = await self.TikTokWebCrawler.fetch_one_video(aweme_id)
             # data = data.get("itemInfo").get("itemStruct")
 
-            data = await self.TikTokAPPCrawler.fetch_one_video(aweme_id)
-            # $.imagePost exists if aweme_type is photo
-            aweme_type = data.get("aweme_type")
-        else:
-            raise ValueError("hybrid_parsing_single_video: Cannot judge the video source from the URL.")
+            with span("hybrid.fetch_one_video", platform=platform):
+                data = await self.TikTokAPPCrawler.fetch_one_video(aweme_id)
 
         # 检查是否需要返回最小数据/Check if minimal data is required
         if not minimal:
             return data
 
+        with span("hybrid.minimal_data", platform=platform):
+            return self.minimal_data(platform, aweme_id, data)
+
+    @staticmethod
+    def minimal_data(platform: str, aweme_id: str, data: dict) -> dict:
+        """
+        把作品详情整理为最小数据/Reshape the post detail into minimal data
+        """
+        # $.aweme_detail.aweme_type, $.imagePost exists if aweme_type is photo
+        aweme_type = data.get("aweme_type")
+
         # 如果是最小数据，处理数据/If it is minimal data, process the data
         url_type_code_dict = {
             # common
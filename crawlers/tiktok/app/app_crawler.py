@@ -91,7 +91,7 @@ class TikTokAPPCrawler:
         param_str = model_to_query_string(params)
         url = f"{TikTokAPIEndpoints.HOME_FEED}?{param_str}"
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_app")
         async with base_crawler as crawler:
             response = await crawler.fetch_get_json(url)
             response = response.get("aweme_list")[0]
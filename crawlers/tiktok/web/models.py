@@ -1,5 +1,5 @@
 from typing import Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from urllib.parse import quote, unquote
 
 from crawlers.tiktok.web.utils import TokenManager
@@ -41,7 +41,7 @@ class BaseRequestModel(BaseModel):
     webcast_language: str = "en"
     tz_name: str = quote("America/Tijuana", safe="")
     # verifyFp: str = VerifyFpManager.gen_verify_fp()
-    msToken: str = TokenManager.gen_real_msToken()
+    msToken: str = Field(default_factory=TokenManager.get_msToken)
 
 
 # router model
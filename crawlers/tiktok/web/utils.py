@@ -1,6 +1,7 @@
 import os
 import re
 import json
+import time
 import yaml
 import httpx
 import asyncio
@@ -9,6 +10,9 @@ from typing import Union
 from pathlib import Path
 
 from crawlers.utils.logger import logger
+from crawlers.utils.link_cache import link_cache
+from crawlers.utils.tracing import span
+from crawlers.utils.token_pool import TokenService
 from crawlers.douyin.web.xbogus import XBogus as XB
 from crawlers.utils.utils import (
     gen_random_str,
@@ -37,20 +41,17 @@ class TokenManager:
     tiktok_manager = config.get("TokenManager").get("tiktok")
     token_conf = tiktok_manager.get("msToken", None)
     ttwid_conf = tiktok_manager.get("ttwid", None)
-    odin_tt_conf = tiktok_manager.get("odin_tt", None)
     proxies_conf = tiktok_manager.get("proxies", None)
     proxies = {
         "http://": proxies_conf.get("http", None),
         "https://": proxies_conf.get("https", None),
     }
+    # 令牌池未运行时（如脚本调用）缓存的msToken及其过期时间 (msToken cached with its expiry when the token pool is not running, e.g. scripts)
+    _fallback_msToken = None
+    _fallback_expires_at = 0.0
 
     @classmethod
-    def gen_real_msToken(cls) -> str:
-        """
-        生成真实的msToken,当出现错误时返回虚假的值
-        (Generate a real msToken and return a false value when an error occurs)
-        """
-
+    def _msToken_request(cls) -> tuple:
         payload = json.dumps(
             {
                 "magic": cls.token_conf["magic"],
@@ -65,6 +66,16 @@ class TokenManager:
             "User-Agent": cls.token_conf["User-Agent"],
             "Content-Type": "application/json",
         }
+        return payload, headers
+
+    @classmethod
+    def gen_real_msToken(cls) -> str:
+        """
+        生成真实的msToken,当出现错误时返回虚假的值
+        (Generate a real msToken and return a false value when an error occurs)
+        """
+
+        payload, headers = cls._msToken_request()
 
         transport = httpx.HTTPTransport(retries=5)
         with httpx.Client(transport=transport, proxies=cls.proxies) as client:
@@ -107,6 +118,61 @@ class TokenManager:
                 logger.info("如果你不需要使用TikTok相关API，请忽略此消息。")
                 return cls.gen_false_msToken()
 
+    @classmethod
+    async def gen_real_msToken_async(cls) -> str:
+        """
+        异步生成真实的msToken，失败时抛出异常，供令牌池使用
+        (Generate a real msToken asynchronously, raising on failure; used by the token pool)
+        """
+        payload, headers = cls._msToken_request()
+
+        transport = httpx.AsyncHTTPTransport(retries=5)
+        async with httpx.AsyncClient(transport=transport, proxies=cls.proxies, timeout=10) as client:
+            response = await client.post(cls.token_conf["url"], headers=headers, content=payload)
+            response.raise_for_status()
+
+        msToken = httpx.Cookies(response.cookies).get("msToken")
+        if msToken is None:
+            raise APIResponseError("{0} 内容不符合要求".format("msToken"))
+        return msToken
+
+    @classmethod
+    def get_msToken(cls) -> str:
+        """
+        从令牌池取msToken，不在请求路径上生成
+        (Take a msToken from the token pool without generating one on the request path)
+        """
+        msToken = TokenService.get("tiktok_msToken")
+        if msToken is not None:
+            return msToken
+        # 令牌池正在补充，先使用虚假的msToken (The pool is refilling, use a fake msToken meanwhile)
+        if TokenService.is_running():
+            return cls.gen_false_msToken()
+        # 脚本调用时同步生成，与令牌池相同的最长使用时间后重新生成
+        # (Scripts generate synchronously and regenerate after the same max age as the pool)
+        if cls._fallback_msToken is None or time.time() >= cls._fallback_expires_at:
+            cls._fallback_msToken = cls.gen_real_msToken()
+            cls._fallback_expires_at = time.time() + TokenService.max_age
+        return cls._fallback_msToken
+
+    @classmethod
+    async def fetch_msToken(cls) -> str:
+        """
+        从令牌池轮转取msToken，池正在补充时返回虚假的值，仅在令牌池未运行时异步生成
+        (Take a pooled msToken round-robin; while the pool refills return a fake value, and only
+        generate asynchronously when the pool is not running)
+        """
+        msToken = TokenService.get("tiktok_msToken")
+        if msToken is not None:
+            return msToken
+        if TokenService.is_running():
+            return cls.gen_false_msToken()
+        try:
+            return await cls.gen_real_msToken_async()
+        except Exception as e:
+            logger.error("生成TikTok msToken API错误：{0}".format(e))
+            return cls.gen_false_msToken()
+
     @classmethod
     def gen_false_msToken(cls) -> str:
         """生成随机msToken (Generate random msToken)"""
@@ -161,43 +227,32 @@ class TokenManager:
                     )
 
     @classmethod
-    def gen_odin_tt(cls):
+    async def gen_ttwid_async(cls, cookie: str) -> str:
         """
-        生成请求必带的odin_tt (Generate the essential odin_tt for requests)
+        异步生成ttwid，依赖调用方的Cookie，因此不进入令牌池
+        (Generate a ttwid asynchronously; it depends on the caller's cookie so it is not pooled)
         """
-        transport = httpx.HTTPTransport(retries=5)
-        with httpx.Client(transport=transport, proxies=cls.proxies) as client:
-            try:
-                response = client.get(cls.odin_tt_conf["url"])
-                response.raise_for_status()
-
-                odin_tt = httpx.Cookies(response.cookies).get("odin_tt")
-
-                if odin_tt is None:
-                    raise APIResponseError("{0} 内容不符合要求".format("odin_tt"))
-
-                return odin_tt
+        transport = httpx.AsyncHTTPTransport(retries=5)
+        async with httpx.AsyncClient(transport=transport, proxies=cls.proxies, timeout=10) as client:
+            response = await client.post(
+                cls.ttwid_conf["url"],
+                content=cls.ttwid_conf["data"],
+                headers={
+                    "Cookie": cookie,
+                    "Content-Type": "text/plain",
+                },
+            )
+            response.raise_for_status()
 
-            except httpx.RequestError as exc:
-                # 捕获所有与 httpx 请求相关的异常情况 (Captures all httpx request-related exceptions)
-                raise APIConnectionError("请求端点失败，请检查当前网络环境。 链接：{0}，代理：{1}，异常类名：{2}，异常详细信息：{3}"
-                                         .format(cls.odin_tt_conf["url"], cls.proxies, cls.__name__, exc)
-                                         )
+        ttwid = httpx.Cookies(response.cookies).get("ttwid")
+        if ttwid is None:
+            raise APIResponseError("ttwid: 检查没有通过, 请更新配置文件中的ttwid")
+        return ttwid
 
-            except httpx.HTTPStatusError as e:
-                # 捕获 httpx 的状态代码错误 (captures specific status code errors from httpx)
-                if response.status_code == 401:
-                    raise APIUnauthorizedError("参数验证失败，请更新 Douyin_TikTok_Download_API 配置文件中的 {0}，以匹配 {1} 新规则"
-                                               .format("odin_tt", "tiktok")
-                                               )
 
-                elif response.status_code == 404:
-                    raise APINotFoundError("{0} 无法找到API端点".format("odin_tt"))
-                else:
-                    raise APIResponseError("链接：{0}，状态码 {1}：{2} ".format(
-                        e.response.url, e.response.status_code, e.response.text
-                    )
-                    )
+# 注册令牌池，由应用生命周期中的后台任务补充；上游拒绝带有 msToken 的请求时淘汰该令牌
+# (Register token pools, refilled by the lifespan background task; a msToken is retired when upstream rejects a request carrying it)
+TokenService.register("tiktok_msToken", TokenManager.gen_real_msToken_async, param="msToken", host="tiktok.com")
 
 
 class BogusManager:
@@ -208,7 +263,7 @@ class BogusManager:
             endpoint: str,
     ) -> str:
         try:
-            final_endpoint = XB(user_agent).getXBogus(endpoint)
+            final_endpoint = XB.for_user_agent(user_agent).getXBogus(endpoint)
         except Exception as e:
             raise RuntimeError("生成X-Bogus失败: {0})".format(e))
 
@@ -228,7 +283,7 @@ class BogusManager:
         param_str = "&".join([f"{k}={v}" for k, v in params.items()])
 
         try:
-            xb_value = XB(user_agent).getXBogus(param_str)
+            xb_value = XB.for_user_agent(user_agent).getXBogus(param_str)
         except Exception as e:
             raise RuntimeError("生成X-Bogus失败: {0})".format(e))
 
@@ -270,6 +325,11 @@ class SecUserIdFetcher:
                 APINotFoundError("输入的URL不合法。类名：{0}".format(cls.__name__))
             )
 
+        # 查询链接缓存 (Check the link cache)
+        sec_uid = await link_cache.get("tiktok_sec_uid", url)
+        if sec_uid:
+            return sec_uid
+
         transport = httpx.AsyncHTTPTransport(retries=5)
         async with httpx.AsyncClient(
                 transport=transport, proxies=TokenManager.proxies, timeout=10
@@ -301,6 +361,7 @@ class SecUserIdFetcher:
                             "获取 {0} 失败，{1}".format(sec_uid, user_info)
                         )
 
+                    await link_cache.set("tiktok_sec_uid", url, sec_uid, str(response.url))
                     return sec_uid
                 else:
                     raise ConnectionError("接口状态码异常, 请检查重试")
@@ -361,6 +422,17 @@ class SecUserIdFetcher:
                 APINotFoundError("输入的URL不合法。类名：{0}".format(cls.__name__))
             )
 
+        # 完整的用户主页链接无需请求 (Full profile URLs need no request)
+        if "tiktok.com/@" in url:
+            match = cls._TIKTOK_UNIQUEID_PARREN.search(url)
+            if match and match.group(1):
+                return match.group(1)
+
+        # 查询短链接缓存 (Check the short link cache)
+        unique_id = await link_cache.get("tiktok_unique_id", url)
+        if unique_id:
+            return unique_id
+
         transport = httpx.AsyncHTTPTransport(retries=5)
         async with httpx.AsyncClient(
                 transport=transport, proxies=TokenManager.proxies, timeout=10
@@ -387,6 +459,7 @@ class SecUserIdFetcher:
                             "获取 {0} 失败，{1}".format("unique_id", response.url)
                         )
 
+                    await link_cache.set("tiktok_unique_id", url, unique_id, str(response.url))
                     return unique_id
                 else:
                     raise ConnectionError(
@@ -473,6 +546,11 @@ class AwemeIdFetcher:
 
             return aweme_id
 
+        # 查询短链接缓存 (Check the short link cache)
+        aweme_id = await link_cache.get("tiktok_aweme_id", url)
+        if aweme_id:
+            return aweme_id
+
         # 处理短连接的情况，根据重定向后的链接获取aweme_id
         print(f"输入的URL需要重定向: {url}")
         transport = httpx.AsyncHTTPTransport(retries=10)
@@ -480,7 +558,8 @@ class AwemeIdFetcher:
                 transport=transport, proxies=TokenManager.proxies, timeout=10
         ) as client:
             try:
-                response = await client.get(url, follow_redirects=True)
+                with span("short_link.redirect", platform="tiktok"):
+                    response = await client.get(url, follow_redirects=True)
 
                 if response.status_code in {200, 444}:
                     if cls._TIKTOK_NOTFOUND_PATTERN.search(str(response.url)):
@@ -499,6 +578,7 @@ class AwemeIdFetcher:
                     if aweme_id is None:
                         raise RuntimeError("获取 aweme_id 或 photo_id 失败，{0}".format(response.url))
 
+                    await link_cache.set("tiktok_aweme_id", url, aweme_id, str(response.url))
                     return aweme_id
                 else:
                     raise ConnectionError("接口状态码异常 {0}，请检查重试".format(response.status_code))
@@ -101,7 +101,7 @@ class TikTokWebCrawler:
         # 获取TikTok的实时Cookie
         kwargs = await self.get_tiktok_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个作品详情的BaseModel参数
             params = PostDetail(itemId=itemId)
@@ -117,7 +117,7 @@ class TikTokWebCrawler:
         # 获取TikTok的实时Cookie
         kwargs = await self.get_tiktok_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个用户详情的BaseModel参数
             params = UserProfile(secUid=secUid, uniqueId=uniqueId)
@@ -134,7 +134,7 @@ class TikTokWebCrawler:
         kwargs = await self.get_tiktok_headers()
         # proxies = {"http://": 'http://43.159.29.191:24144', "https://": 'http://43.159.29.191:24144'}
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个用户作品的BaseModel参数
             params = UserPost(secUid=secUid, cursor=cursor, count=count, coverFormat=coverFormat)
@@ -150,7 +150,7 @@ class TikTokWebCrawler:
         # 获取TikTok的实时Cookie
         kwargs = await self.get_tiktok_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个用户点赞的BaseModel参数
             params = UserLike(secUid=secUid, cursor=cursor, count=count, coverFormat=coverFormat)
@@ -168,7 +168,7 @@ class TikTokWebCrawler:
         kwargs = await self.get_tiktok_headers()
         kwargs["headers"]["Cookie"] = cookie
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个用户收藏的BaseModel参数
             params = UserCollect(cookie=cookie, secUid=secUid, cursor=cursor, count=count, coverFormat=coverFormat)
@@ -184,7 +184,7 @@ class TikTokWebCrawler:
         # 获取TikTok的实时Cookie
         kwargs = await self.get_tiktok_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个用户播放列表的BaseModel参数
             params = UserPlayList(secUid=secUid, cursor=cursor, count=count)
@@ -200,7 +200,7 @@ class TikTokWebCrawler:
         # 获取TikTok的实时Cookie
         kwargs = await self.get_tiktok_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个用户合辑的BaseModel参数
             params = UserMix(mixId=mixId, cursor=cursor, count=count)
@@ -217,7 +217,7 @@ class TikTokWebCrawler:
         kwargs = await self.get_tiktok_headers()
         # proxies = {"http://": 'http://43.159.18.174:25263', "https://": 'http://43.159.18.174:25263'}
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个作品评论的BaseModel参数
             params = PostComment(aweme_id=aweme_id, cursor=cursor, count=count, current_region=current_region)
@@ -234,7 +234,7 @@ class TikTokWebCrawler:
         # 获取TikTok的实时Cookie
         kwargs = await self.get_tiktok_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个作品评论的BaseModel参数
             params = PostCommentReply(item_id=item_id, comment_id=comment_id, cursor=cursor, count=count,
@@ -251,7 +251,7 @@ class TikTokWebCrawler:
         # 获取TikTok的实时Cookie
         kwargs = await self.get_tiktok_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个用户关注的BaseModel参数
             params = UserFans(secUid=secUid, count=count, maxCursor=maxCursor, minCursor=minCursor)
@@ -267,7 +267,7 @@ class TikTokWebCrawler:
         # 获取TikTok的实时Cookie
         kwargs = await self.get_tiktok_headers()
         # 创建一个基础爬虫
-        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"])
+        base_crawler = BaseCrawler(proxies=kwargs["proxies"], crawler_headers=kwargs["headers"], platform="tiktok_web")
         async with base_crawler as crawler:
             # 创建一个用户关注的BaseModel参数
             params = UserFollow(secUid=secUid, count=count, maxCursor=maxCursor, minCursor=minCursor)
@@ -283,14 +283,14 @@ class TikTokWebCrawler:
     # 生成真实msToken
     async def fetch_real_msToken(self):
         result = {
-            "msToken": TokenManager().gen_real_msToken()
+            "msToken": await TokenManager.fetch_msToken()
         }
         return result
 
     # 生成ttwid
     async def gen_ttwid(self, cookie: str):
         result = {
-            "ttwid": TokenManager().gen_ttwid(cookie)
+            "ttwid": await TokenManager.gen_ttwid_async(cookie)
         }
         return result
 
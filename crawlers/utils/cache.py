@@ -0,0 +1,279 @@
+# ==============================================================================
+# Copyright (C) 2021 Evil0ctal
+#
+# This file is part of the Douyin_TikTok_Download_API project.
+#
+# This project is licensed under the Apache License 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+#
+# Contributor Link:
+# - https://github.com/Evil0ctal
+# - https://github.com/Johnserf-Seed
+#
+# ==============================================================================
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from crawlers.utils.logger import logger
+
+# 缓存未命中时的哨兵值 (Sentinel returned on a cache miss)
+MISS = object()
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，每个条目可以有独立的过期时间
+    (Thread-safe LRU cache where every entry may carry its own expiry)
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = MISS) -> Any:
+        """读取缓存，未命中或已过期时返回 default (Read an entry, returns default on miss or expiry)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存，ttl 为空时使用默认值 (Write an entry, falls back to the default ttl)"""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """命中率统计 (Hit/miss statistics)"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class DiskCache:
+    """
+    基于本地 JSON 文件的二级缓存 (Second-tier cache backed by local JSON files)
+
+    每个 key 对应一个文件，文件内记录过期时间；进程重启后仍可命中。
+    (One file per key with its expiry recorded inside; entries survive restarts.)
+    """
+
+    def __init__(self, directory: str, max_entries: int = 10000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def get(self, key: str, default: Any = MISS) -> Any:
+        value, _ = self.get_with_expiry(key)
+        return default if value is MISS else value
+
+    def get_with_expiry(self, key: str):
+        """读取值和过期时间，未命中时返回 (MISS, None) (Read value and expiry, (MISS, None) on miss)"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                item = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return MISS, None
+        expires_at = item.get("expires_at")
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(path)
+            self.misses += 1
+            return MISS, None
+        self.hits += 1
+        return item["value"], expires_at
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        item = {"key": key, "expires_at": time.time() + ttl if ttl is not None else None, "value": value}
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(item, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("写入磁盘缓存失败: {0}".format(e))
+            self._remove(tmp_path)
+            return
+        # 每写入一定次数检查一次容量，避免每次都遍历目录 / Check capacity periodically instead of listing the directory on every write
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        """超过上限时删除最旧的文件 (Remove the oldest files once over the limit)"""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except OSError:
+            return
+        overflow = len(names) - self.max_entries
+        if overflow <= 0:
+            return
+        paths = sorted((os.path.join(self.directory, n) for n in names), key=os.path.getmtime)
+        for path in paths[:overflow]:
+            self._remove(path)
+            self.evictions += 1
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self._remove(os.path.join(self.directory, name))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "directory": self.directory,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TieredCache:
+    """
+    内存 LRU + 可选磁盘二级缓存 (In-memory LRU with an optional disk tier)
+
+    磁盘命中会按剩余有效期回填到内存。(Disk hits are promoted to memory with their remaining lifetime.)
+    内存中保存的是副本，读取时也返回副本，调用方修改返回值不会影响其它请求。
+    (Memory holds a private copy and reads return a fresh copy, so callers may mutate what they get.)
+    在事件循环中请使用 aget/aset，磁盘读写在线程池中执行。
+    (Use aget/aset on the event loop; they run the disk tier in a worker thread.)
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: Optional[float] = None):
+        self.memory = LRUCache(max_entries=max_entries, default_ttl=default_ttl)
+        self.disk: Optional[DiskCache] = None
+
+    def enable_disk(self, directory: str, max_entries: int = 10000) -> None:
+        """启用磁盘二级缓存 (Enable the disk tier)"""
+        self.disk = DiskCache(directory, max_entries=max_entries)
+        logger.info("磁盘缓存已启用: {0}".format(directory))
+
+    def _promote(self, key: str, value: Any, expires_at: Optional[float]) -> Any:
+        """磁盘命中回填到内存，返回值与内存中的对象相互独立 (Promote a disk hit; the returned value is not the stored one)"""
+        ttl = expires_at - time.time() if expires_at is not None else None
+        self.memory.set(key, copy.deepcopy(value), ttl)
+        return value
+
+    def get(self, key: str, default: Any = MISS) -> Any:
+        value = self.memory.get(key)
+        if value is not MISS:
+            return copy.deepcopy(value)
+        if self.disk is None:
+            return default
+
+        value, expires_at = self.disk.get_with_expiry(key)
+        if value is MISS:
+            return default
+        return self._promote(key, value, expires_at)
+
+    async def aget(self, key: str, default: Any = MISS) -> Any:
+        """异步读取，内存未命中时在线程池中读取磁盘 (Async read; the disk tier is read in a worker thread)"""
+        value = self.memory.get(key)
+        if value is not MISS:
+            return copy.deepcopy(value)
+        if self.disk is None:
+            return default
+
+        value, expires_at = await asyncio.to_thread(self.disk.get_with_expiry, key)
+        if value is MISS:
+            return default
+        return self._promote(key, value, expires_at)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.memory.set(key, copy.deepcopy(value), ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, self.memory.default_ttl if ttl is None else ttl)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """异步写入，磁盘写入在线程池中执行 (Async write; the disk tier is written in a worker thread)"""
+        stored = copy.deepcopy(value)
+        self.memory.set(key, stored, ttl)
+        if self.disk is not None:
+            # 写入内存中的副本，调用方在写盘期间修改原对象也不会影响文件内容
+            # (Serialize the private copy so the caller may keep mutating its own object meanwhile)
+            await asyncio.to_thread(self.disk.set, key, stored, self.memory.default_ttl if ttl is None else ttl)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
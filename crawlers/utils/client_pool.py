@@ -0,0 +1,198 @@
+# ==============================================================================
+# Copyright (C) 2021 Evil0ctal
+#
+# This file is part of the Douyin_TikTok_Download_API project.
+#
+# This project is licensed under the Apache License 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+#
+# Contributor Link:
+# - https://github.com/Evil0ctal
+# - https://github.com/Johnserf-Seed
+#
+# ==============================================================================
+
+import asyncio
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from crawlers.utils.logger import logger
+
+
+class _RejectCookiePolicy(DefaultCookiePolicy):
+    """拒绝保存和发送任何Cookie的策略 (Cookie policy that never stores or sends cookies)"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+class PooledClient:
+    """
+    共享客户端条目 (Shared client entry)
+
+    持有一个长连接的 httpx.AsyncClient，以及同一 key 下所有爬虫共用的并发信号量。
+    (Holds a keep-alive httpx.AsyncClient plus the semaphores shared by every crawler using the same key.)
+    """
+
+    def __init__(self, client: httpx.AsyncClient, max_tasks: int, max_per_host: int):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(max_tasks)
+        self._max_per_host = max_per_host
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def host_semaphore(self, url) -> Optional[asyncio.Semaphore]:
+        """获取单个主机的连接数限制信号量 (Get the per-host connection cap semaphore)"""
+        if not self._max_per_host:
+            return None
+        host = httpx.URL(str(url)).host
+        sem = self._host_semaphores.get(host)
+        if sem is None:
+            sem = self._host_semaphores[host] = asyncio.Semaphore(self._max_per_host)
+        return sem
+
+
+class ClientPool:
+    """
+    进程级共享HTTP客户端池 (Process-wide shared HTTP client pool)
+
+    以 (平台, 代理, 请求头配置) 为 key 复用 httpx.AsyncClient，避免每次请求都重新进行 TCP/TLS 握手。
+    客户端只在 start() 绑定的事件循环中出借，其它事件循环（如 PyWebIO 中的 asyncio.run）仍使用独立客户端。
+    共享客户端不保存响应中的 Set-Cookie，Cookie 只来自每个请求自带的请求头，避免在不同用户的请求间泄漏。
+    (Reuses httpx.AsyncClient keyed by (platform, proxies, header profile) so warm hosts skip the TCP/TLS handshake.
+    Clients are only lent out on the event loop bound by start(); other loops fall back to private clients.
+    Shared clients never store Set-Cookie from responses, so cookies only come from each request's own
+    headers and cannot leak between users' requests.)
+    """
+
+    # 默认配置，可通过 configure() 覆盖 / Defaults, overridable through configure()
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    max_connections_per_host: int = 20
+    max_tasks: int = 50
+    max_retries: int = 3
+    timeout: float = 10.0
+    http2: bool = False
+
+    _clients: Dict[Tuple, PooledClient] = {}
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """
+        从配置文件更新连接池参数 (Update pool options from the config file)
+
+        Args:
+            options: 与类属性同名的配置项，未知项会被忽略 (Options named after the class attributes, unknown keys are ignored)
+        """
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or not hasattr(cls, attr):
+                logger.warning("未知的HTTP客户端池配置项: {0}".format(key))
+                continue
+            setattr(cls, attr, value)
+
+        if cls.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("未安装 h2 依赖，HTTP/2 已禁用，请执行 pip install h2")
+                cls.http2 = False
+
+    @classmethod
+    def start(cls) -> None:
+        """在应用生命周期开始时绑定当前事件循环 (Bind the running event loop at lifespan startup)"""
+        cls._loop = asyncio.get_running_loop()
+        logger.info("HTTP客户端池已启动, http2: {0}, 单主机连接上限: {1}".format(
+            cls.http2, cls.max_connections_per_host))
+
+    @classmethod
+    def is_active(cls) -> bool:
+        """当前事件循环是否可以使用共享客户端 (Whether the running loop may borrow shared clients)"""
+        if cls._loop is None or cls._loop.is_closed():
+            return False
+        try:
+            return asyncio.get_running_loop() is cls._loop
+        except RuntimeError:
+            return False
+
+    @staticmethod
+    def _proxy_key(proxies: Optional[dict]) -> Tuple:
+        if not proxies:
+            return ()
+        return tuple(sorted((k, v) for k, v in proxies.items() if v))
+
+    @classmethod
+    def acquire(cls, platform: str, proxies: Optional[dict] = None, profile: str = "default") -> Optional[PooledClient]:
+        """
+        借出共享客户端 (Borrow a shared client)
+
+        Args:
+            platform (str): 平台名称 (Platform name)
+            proxies (dict): 代理配置 (Proxy configuration)
+            profile (str): 请求头配置名称 (Header profile name)
+
+        Returns:
+            PooledClient: 共享客户端条目，连接池未启动时返回 None (Shared entry, None when the pool is not running)
+        """
+        if not cls.is_active():
+            return None
+
+        proxy_key = cls._proxy_key(proxies)
+        key = (platform, proxy_key, profile)
+        entry = cls._clients.get(key)
+        if entry is None:
+            limits = httpx.Limits(
+                max_connections=cls.max_connections,
+                max_keepalive_connections=cls.max_keepalive_connections,
+                keepalive_expiry=cls.keepalive_expiry,
+            )
+            client = httpx.AsyncClient(
+                proxies=dict(proxy_key) or None,
+                timeout=httpx.Timeout(cls.timeout),
+                limits=limits,
+                http2=cls.http2,
+                cookies=CookieJar(policy=_RejectCookiePolicy()),
+                transport=httpx.AsyncHTTPTransport(
+                    retries=cls.max_retries, limits=limits, http2=cls.http2
+                ),
+            )
+            entry = cls._clients[key] = PooledClient(
+                client, cls.max_tasks, cls.max_connections_per_host
+            )
+            logger.debug("创建共享HTTP客户端: {0}".format(key))
+        return entry
+
+    @classmethod
+    def stats(cls) -> dict:
+        """连接池状态 (Pool status)"""
+        return {
+            "active": cls.is_active(),
+            "http2": cls.http2,
+            "clients": ["{0}:{1}".format(key[0], key[2]) for key in cls._clients],
+        }
+
+    @classmethod
+    async def aclose_all(cls) -> None:
+        """关闭所有共享客户端 (Close every shared client)"""
+        clients, cls._clients = cls._clients, {}
+        cls._loop = None
+        for entry in clients.values():
+            try:
+                await entry.client.aclose()
+            except Exception as e:
+                logger.warning("关闭共享HTTP客户端失败: {0}".format(e))
@@ -0,0 +1,182 @@
+# ==============================================================================
+# Copyright (C) 2021 Evil0ctal
+#
+# This file is part of the Douyin_TikTok_Download_API project.
+#
+# This project is licensed under the Apache License 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+#
+# Contributor Link:
+# - https://github.com/Evil0ctal
+# - https://github.com/Johnserf-Seed
+#
+# ==============================================================================
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from crawlers.utils.cache import MISS, LRUCache
+from crawlers.utils.logger import logger
+
+# 默认数据库路径，与积分数据库放在同一个 data 目录 (Default database path, next to the credits database)
+DEFAULT_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "link_cache.db"
+)
+
+
+def normalize_link(url: str) -> str:
+    """规范化分享链接，用作缓存 key (Normalize a share link for use as the cache key)"""
+    url = url.strip()
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return url.rstrip("/")
+    host, slash, path = rest.partition("/")
+    return "{0}://{1}{2}{3}".format(scheme.lower(), host.lower(), slash, path).rstrip("/")
+
+
+class ShortLinkCache:
+    """
+    分享链接解析缓存 (Share link resolution cache)
+
+    短链接 → 规范链接 → ID 的映射几乎不会变化，内存 LRU 在前，SQLite 持久化在后，重启后仍可命中。
+    (Short link → canonical URL → id mappings practically never change; an in-memory LRU sits in front
+    of an SQLite table so resolutions survive restarts.)
+
+    get/set 为协程，数据库查询和写入在线程池中执行，不阻塞事件循环。
+    (get/set are coroutines; database reads and writes run in a worker thread, off the event loop.)
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_entries: int = 10000, ttl: int = 30 * 86400):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, default_ttl=ttl)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._db_failed = False
+        self.db_hits = 0
+        self.db_misses = 0
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._db_failed:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS short_links (
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                resolved_id TEXT NOT NULL,
+                canonical_url TEXT,
+                created_at INTEGER NOT NULL,
+                PRIMARY KEY (kind, url)
+            ) WITHOUT ROWID
+            """)
+            conn.commit()
+            self._conn = conn
+        except sqlite3.Error as e:
+            # 数据库不可用时只使用内存缓存 (Fall back to the memory tier when the database is unavailable)
+            logger.warning("短链接缓存数据库不可用，仅使用内存缓存: {0}".format(e))
+            self._db_failed = True
+        return self._conn
+
+    async def get(self, kind: str, url: str) -> Optional[str]:
+        """
+        查询已解析的ID (Look up a resolved id)
+
+        Args:
+            kind (str): 解析类型，如 douyin_aweme (Resolution kind, e.g. douyin_aweme)
+            url (str): 分享链接 (Share link)
+
+        Returns:
+            str: 已缓存的ID，未命中返回 None (Cached id, None on miss)
+        """
+        key = (kind, normalize_link(url))
+        value = self.memory.get(key)
+        if value is not MISS:
+            return value
+        if self._db_failed:
+            return None
+
+        row = await asyncio.to_thread(self._select, key)
+        if row is None or row[1] + self.ttl <= time.time():
+            self.db_misses += 1
+            return None
+
+        self.db_hits += 1
+        self.memory.set(key, row[0], row[1] + self.ttl - time.time())
+        return row[0]
+
+    def _select(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                return conn.execute(
+                    "SELECT resolved_id, created_at FROM short_links WHERE kind = ? AND url = ?", key
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("读取短链接缓存失败: {0}".format(e))
+                return None
+
+    async def set(self, kind: str, url: str, resolved_id: str, canonical_url: Optional[str] = None) -> None:
+        """
+        保存解析结果 (Store a resolution)
+
+        Args:
+            kind (str): 解析类型 (Resolution kind)
+            url (str): 分享链接 (Share link)
+            resolved_id (str): 解析得到的ID (Resolved id)
+            canonical_url (str): 重定向后的规范链接 (Canonical URL after redirects)
+        """
+        if not resolved_id:
+            return
+        key = (kind, normalize_link(url))
+        self.memory.set(key, resolved_id)
+        if not self._db_failed:
+            await asyncio.to_thread(self._insert, key, resolved_id, canonical_url)
+
+    def _insert(self, key: tuple, resolved_id: str, canonical_url: Optional[str]) -> None:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO short_links (kind, url, resolved_id, canonical_url, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key[0], key[1], resolved_id, canonical_url, int(time.time()))
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("写入短链接缓存失败: {0}".format(e))
+
+    def stats(self) -> dict:
+        lookups = self.db_hits + self.db_misses
+        return {
+            "memory": self.memory.stats(),
+            "db_path": self.db_path,
+            "db_available": not self._db_failed,
+            "db_hits": self.db_hits,
+            "db_misses": self.db_misses,
+            "db_hit_ratio": round(self.db_hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# 进程内共享实例 (Process-wide shared instance)
+link_cache = ShortLinkCache()
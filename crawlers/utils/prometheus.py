@@ -0,0 +1,258 @@
+# ==============================================================================
+# Copyright (C) 2021 Evil0ctal
+#
+# This file is part of the Douyin_TikTok_Download_API project.
+#
+# This project is licensed under the Apache License 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+#
+# Contributor Link:
+# - https://github.com/Evil0ctal
+# - https://github.com/Johnserf-Seed
+#
+# ==============================================================================
+
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认的延迟分桶（秒） / Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 采集函数返回的指标族: (名称, 类型, 说明, [(标签, 值)])
+# Metric family returned by a collector: (name, type, help, [(labels, value)])
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(k, _escape(v)) for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """带标签的指标基类 (Base class of labelled metrics)"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        获取一组标签值对应的子指标，未指定标签名的指标传空参数
+        (Child for one set of label values; call without arguments for unlabelled metrics)
+        """
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError("{0} 需要标签 {1}".format(self.name, self.labelnames))
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _label_dict(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """只增计数器 (Monotonic counter)"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield self.name + "_total", self._label_dict(key), child.value
+
+
+class Gauge(_Metric):
+    """可增可减的数值 (Value that can go up and down)"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield self.name, self._label_dict(key), child.value
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """固定分桶的直方图 (Histogram with fixed buckets)"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            labels = self._label_dict(key)
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield self.name + "_bucket", dict(labels, le=_format_value(float(bound))), cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, cumulative
+
+
+class Registry:
+    """
+    进程内指标注册表 (In-process metric registry)
+
+    指标在请求路径上只做内存计数；采集函数在抓取时读取各组件已有的 stats()，不访问数据库。
+    (Metrics only do in-memory counting on the request path; collectors read the components'
+    existing stats() at scrape time and never touch the database.)
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError("指标已注册: {0}".format(metric.name))
+            self._metrics[metric.name] = metric
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        """注册抓取时调用的采集函数 (Register a function called at scrape time)"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """生成 Prometheus 文本格式 (Render the Prometheus text exposition format)"""
+        lines = []
+
+        def header(name: str, type_name: str, documentation: str) -> None:
+            # 文本格式 0.0.4 中计数器的说明行使用带 _total 的名称 / Counter headers carry the _total name in format 0.0.4
+            if type_name == "counter":
+                name += "_total"
+            lines.append("# HELP {0} {1}".format(name, documentation))
+            lines.append("# TYPE {0} {1}".format(name, type_name))
+
+        for metric in list(self._metrics.values()):
+            header(metric.name, metric.type_name, metric.documentation)
+            for name, labels, value in metric.samples():
+                lines.append("{0}{1} {2}".format(name, _format_labels(labels), _format_value(value)))
+        for collector in list(self._collectors):
+            for name, type_name, documentation, samples in collector():
+                header(name, type_name, documentation)
+                suffix = "_total" if type_name == "counter" else ""
+                for labels, value in samples:
+                    lines.append("{0}{1}{2} {3}".format(name, suffix, _format_labels(labels), _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共享的注册表 (Process-wide registry)
+REGISTRY = Registry()
+
+# 上游请求 (Upstream requests made by the crawlers)
+UPSTREAM_REQUESTS = Counter(
+    "crawler_upstream_requests", "Upstream HTTP requests by platform and status",
+    ("platform", "status"), registry=REGISTRY
+)
+UPSTREAM_LATENCY = Histogram(
+    "crawler_upstream_request_duration_seconds", "Upstream HTTP request latency by platform",
+    ("platform",), registry=REGISTRY
+)
@@ -0,0 +1,131 @@
+# ==============================================================================
+# Copyright (C) 2021 Evil0ctal
+#
+# This file is part of the Douyin_TikTok_Download_API project.
+#
+# This project is licensed under the Apache License 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+#
+# Contributor Link:
+# - https://github.com/Evil0ctal
+# - https://github.com/Johnserf-Seed
+#
+# ==============================================================================
+
+import asyncio
+import copy
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# 每次请求都会变化的签名/令牌参数，合并请求时忽略
+# Signature/token parameters that change on every request, ignored when coalescing
+VOLATILE_PARAMS = frozenset({"a_bogus", "X-Bogus", "msToken", "w_rid", "wts", "verifyFp", "fp"})
+
+
+def normalize_endpoint(endpoint: str) -> str:
+    """
+    规范化端点地址：去掉签名参数并按 key 排序查询参数
+    (Normalize an endpoint: drop signature parameters and sort the query string)
+
+    Args:
+        endpoint (str): 接口地址 (Endpoint URL)
+
+    Returns:
+        str: 规范化后的地址 (Normalized URL)
+    """
+    parts = urlsplit(endpoint)
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in VOLATILE_PARAMS
+    )
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def flight_key(method: str, endpoint: str, headers: Optional[dict] = None, body: Any = None) -> str:
+    """
+    生成合并请求的 key，请求头（含Cookie）不同的请求不会被合并
+    (Build the coalescing key; requests with different headers, including cookies, are never merged)
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps(sorted((headers or {}).items()), ensure_ascii=False).encode())
+    if body is not None:
+        digest.update(json.dumps(body, sort_keys=True, ensure_ascii=False, default=str).encode())
+    return "{0} {1} {2}".format(method, normalize_endpoint(endpoint), digest.hexdigest())
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 1
+
+
+class SingleFlight:
+    """
+    请求合并 (Single-flight request coalescing)
+
+    同一事件循环中 key 相同的并发调用只执行一次，其余调用等待同一个任务，并各自获得结果的独立副本。
+    (Concurrent calls with the same key on one event loop run once; the others await the same task
+    and each receive their own copy of the result.)
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入一次进行中的调用 (Run, or join an in-flight call)
+
+        Args:
+            key (Hashable): 合并 key (Coalescing key)
+            func (Callable): 返回协程的函数 (Function returning the coroutine)
+
+        Returns:
+            Any: 调用结果，多个调用方时为深拷贝 (Result, deep-copied when shared by several callers)
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        call = self._calls.get(call_key)
+
+        if call is None:
+            call = self._calls[call_key] = _Call(loop.create_task(func()))
+            call.task.add_done_callback(lambda task: self._finish(call_key, task))
+            self.executed += 1
+        else:
+            call.waiters += 1
+            self.coalesced += 1
+
+        # shield: 单个调用方被取消不会取消上游请求 / one cancelled caller does not cancel the upstream request
+        result = await asyncio.shield(call.task)
+        return copy.deepcopy(result) if call.waiters > 1 else result
+
+    def _finish(self, call_key: Hashable, task: asyncio.Task) -> None:
+        self._calls.pop(call_key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        """合并计数 (Coalescing counters)"""
+        total = self.executed + self.coalesced
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,116 @@
+# ==============================================================================
+# Copyright (C) 2021 Evil0ctal
+#
+# This file is part of the Douyin_TikTok_Download_API project.
+#
+# This project is licensed under the Apache License 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+#
+# Contributor Link:
+# - https://github.com/Evil0ctal
+# - https://github.com/Johnserf-Seed
+#
+# ==============================================================================
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Optional
+
+from crawlers.utils.tracing import span
+
+
+class RequestTimer:
+    """
+    单个请求的分阶段耗时 (Per-request stage timings)
+
+    各阶段耗时按名称累加；并发执行的阶段会分别计入，总和可能大于请求耗时。
+    (Stage durations are summed by name; stages that run concurrently are each counted, so the
+    sum may exceed the request latency.)
+    """
+
+    __slots__ = ("started", "stages", "lc_uid", "error")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.lc_uid: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头 (Build the Server-Timing header value)"""
+        parts = ["{0};dur={1:.1f}".format(name, seconds * 1000) for name, seconds in self.stages.items()]
+        parts.append("total;dur={0:.1f}".format(self.elapsed() * 1000))
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+
+def begin() -> Token:
+    """开始记录当前请求 (Start timing the current request)"""
+    return _current.set(RequestTimer())
+
+
+def end(token: Token) -> None:
+    _current.reset(token)
+
+
+def current() -> Optional[RequestTimer]:
+    """当前请求的计时器，不在请求中时为 None (Timer of the current request, None outside a request)"""
+    return _current.get()
+
+
+def add_stage(name: str, seconds: float) -> None:
+    """把一段耗时计入当前请求 (Add a duration to the current request)"""
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+
+def annotate(lc_uid: Optional[str] = None, error: Optional[str] = None) -> None:
+    """为当前请求补充用户ID或错误信息 (Attach a user id or error message to the current request)"""
+    timer = _current.get()
+    if timer is None:
+        return
+    if lc_uid is not None:
+        timer.lc_uid = lc_uid
+    if error is not None:
+        timer.error = error
+
+
+@contextmanager
+def stage(name: str):
+    """
+    计时一个阶段，同时记为追踪中的阶段，不在请求中时不做任何事
+    (Time a stage and record it as a trace span; a no-op outside a request)
+
+    用法 (Usage):
+        with stage("auth"):
+            ...
+    """
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        timer.add(name, time.perf_counter() - started)
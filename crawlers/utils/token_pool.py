@@ -0,0 +1,326 @@
+# ==============================================================================
+# Copyright (C) 2021 Evil0ctal
+#
+# This file is part of the Douyin_TikTok_Download_API project.
+#
+# This project is licensed under the Apache License 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+#
+# Contributor Link:
+# - https://github.com/Evil0ctal
+# - https://github.com/Johnserf-Seed
+#
+# ==============================================================================
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from crawlers.utils.logger import logger
+
+
+class TokenPool:
+    """
+    单种令牌的池 (Pool of one kind of token)
+
+    令牌可以重复使用，get() 以轮转方式 O(1) 取出，超过 max_age 或被 retire() 的令牌会被淘汰。
+    (Tokens are reusable; get() hands them out round-robin in O(1), and tokens older than max_age
+    or passed to retire() are dropped.)
+    """
+
+    def __init__(self, name: str, generator: Callable[[], Awaitable[str]], size: int = 4, max_age: float = 3600,
+                 param: Optional[str] = None, host: Optional[str] = None):
+        self.name = name
+        self.generator = generator
+        self.size = size
+        self.max_age = max_age
+        # 令牌所在的查询参数和上游域名，用于在上游拒绝请求时找出令牌
+        # (Query parameter and upstream host carrying the token, used to find it when upstream rejects a request)
+        self.param = param
+        self.host = host
+        self._tokens: Deque[Tuple[str, float]] = deque()
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.failures = 0
+        self.retired = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _expire(self, now: float) -> None:
+        # 调用方持有锁 / The caller holds the lock
+        while self._tokens and self._tokens[0][1] + self.max_age <= now:
+            self._tokens.popleft()
+            self.retired += 1
+
+    def get(self) -> Optional[str]:
+        """取出一个令牌供重复使用，池为空时返回 None (Borrow a shared token, None when the pool is empty)"""
+        with self._lock:
+            self._expire(time.time())
+            if not self._tokens:
+                self.misses += 1
+                return None
+            token = self._tokens[0]
+            self._tokens.rotate(-1)
+            self.hits += 1
+            return token[0]
+
+    def retire(self, token: str) -> int:
+        """淘汰请求失败的令牌，返回淘汰的数量 (Drop a token that caused an error, returns how many were dropped)"""
+        with self._lock:
+            kept = [item for item in self._tokens if item[0] != token]
+            dropped = len(self._tokens) - len(kept)
+            self.retired += dropped
+            self._tokens = deque(kept)
+        return dropped
+
+    def needs_refill(self) -> bool:
+        # 令牌在过期前 10% 的时间内会被提前替换 / Tokens are replaced during the last 10% of their lifetime
+        deadline = time.time() - self.max_age * 0.9
+        with self._lock:
+            fresh = sum(1 for _, created_at in self._tokens if created_at > deadline)
+        return fresh < self.size
+
+    async def refill(self) -> None:
+        """生成新令牌直到池满，失败时抛出异常 (Generate tokens until the pool is full, raises on failure)"""
+        while self.needs_refill():
+            try:
+                token = await self.generator()
+            except Exception:
+                self.failures += 1
+                raise
+            with self._lock:
+                self._tokens.append((token, time.time()))
+                # 新令牌加入后淘汰最旧的多余令牌 / Drop the oldest surplus tokens once new ones arrive
+                while len(self._tokens) > self.size:
+                    self._tokens.popleft()
+                    self.retired += 1
+            self.generated += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            available = len(self._tokens)
+        lookups = self.hits + self.misses
+        return {
+            "available": available,
+            "size": self.size,
+            "generated": self.generated,
+            "failures": self.failures,
+            "retired": self.retired,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TokenService:
+    """
+    进程级令牌服务 (Process-wide token service)
+
+    由应用生命周期启动的后台任务补充各平台的令牌池，请求路径只从池中取令牌，不再同步生成。
+    (A background task started from the app lifespan refills every platform's pool; the request path
+    only takes tokens from the pools and never generates them synchronously.)
+    """
+
+    # 默认配置，可通过 configure() 覆盖 / Defaults, overridable through configure()
+    enable: bool = True
+    size: int = 4
+    max_age: float = 3600
+    refill_interval: float = 30
+    retry_interval: float = 60
+    wait_timeout: float = 5
+
+    pools: Dict[str, TokenPool] = {}
+    _task: Optional[asyncio.Task] = None
+    _wakeup: Optional[asyncio.Event] = None
+    # 每轮补充完成时完成并替换，供 wait() 等待 / Resolved and replaced after every refill round, awaited by wait()
+    _refilled: Optional[asyncio.Future] = None
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _stopping: bool = False
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """
+        从配置文件更新令牌服务参数 (Update token service options from the config file)
+
+        Args:
+            options: 与类属性同名的配置项，未知项会被忽略 (Options named after the class attributes, unknown keys are ignored)
+        """
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr == "pools" or not hasattr(cls, attr):
+                logger.warning("未知的令牌池配置项: {0}".format(key))
+                continue
+            setattr(cls, attr, value)
+        for pool in cls.pools.values():
+            pool.size = cls.size
+            pool.max_age = cls.max_age
+
+    @classmethod
+    def register(cls, name: str, generator: Callable[[], Awaitable[str]], param: Optional[str] = None,
+                 host: Optional[str] = None) -> TokenPool:
+        """
+        注册令牌池 (Register a token pool)
+
+        Args:
+            name (str): 令牌池名称，如 douyin_msToken (Pool name, e.g. douyin_msToken)
+            generator (Callable): 异步生成单个令牌的函数，失败时应抛出异常 (Async generator of one token, raising on failure)
+            param (str): 请求中携带令牌的查询参数，如 msToken (Query parameter carrying the token, e.g. msToken)
+            host (str): 上游域名后缀，如 douyin.com (Upstream host suffix, e.g. douyin.com)
+        """
+        pool = cls.pools.get(name)
+        if pool is None:
+            pool = cls.pools[name] = TokenPool(name, generator, cls.size, cls.max_age, param, host)
+        return pool
+
+    @classmethod
+    def is_running(cls) -> bool:
+        return cls._task is not None and not cls._task.done()
+
+    @classmethod
+    def get(cls, name: str) -> Optional[str]:
+        """
+        O(1) 取出令牌，池为空时返回 None 并唤醒补充任务
+        (Take a token in O(1); returns None and wakes the refill task when the pool is empty)
+        """
+        pool = cls.pools.get(name)
+        if pool is None:
+            return None
+        token = pool.get()
+        if token is None:
+            cls._wake()
+        return token
+
+    @classmethod
+    async def wait(cls, name: str) -> Optional[str]:
+        """
+        取出令牌，池为空时最多等待 wait_timeout 秒让后台任务补充，不在调用方生成令牌
+        (Take a token; when the pool is empty wait up to wait_timeout seconds for the background refill
+        instead of generating one for the caller)
+        """
+        token = cls.get(name)
+        if token is not None or cls._refilled is None or not cls.is_running():
+            return token
+        try:
+            await asyncio.wait_for(asyncio.shield(cls._refilled), cls.wait_timeout)
+        except asyncio.TimeoutError:
+            return None
+        return cls.get(name)
+
+    @classmethod
+    def retire(cls, name: str, token: str) -> None:
+        """淘汰出错的令牌并唤醒补充任务 (Drop a failing token and wake the refill task)"""
+        pool = cls.pools.get(name)
+        if pool is not None and pool.retire(token):
+            cls._wake()
+
+    @classmethod
+    def retire_rejected(cls, url: str) -> int:
+        """
+        上游拒绝请求时，淘汰该请求链接中携带的池内令牌
+        (When upstream rejects a request, retire the pooled tokens carried in its URL)
+
+        Returns:
+            int: 淘汰的令牌数 (Number of tokens retired)
+        """
+        parts = urlsplit(str(url))
+        host = (parts.hostname or "").lower()
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        dropped = 0
+        for name, pool in cls.pools.items():
+            if pool.param is None or pool.param not in params:
+                continue
+            if pool.host is not None and not (host == pool.host or host.endswith("." + pool.host)):
+                continue
+            if pool.retire(params[pool.param]):
+                dropped += 1
+                logger.warning("上游拒绝请求，淘汰令牌 {0}".format(name))
+        if dropped:
+            cls._wake()
+        return dropped
+
+    @classmethod
+    def _wake(cls) -> None:
+        if cls._wakeup is None or cls._loop is None or cls._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is cls._loop:
+            cls._wakeup.set()
+        else:
+            cls._loop.call_soon_threadsafe(cls._wakeup.set)
+
+    @classmethod
+    def start(cls) -> None:
+        """在应用生命周期中启动后台补充任务 (Start the background refill task from the app lifespan)"""
+        if not cls.enable or cls.is_running():
+            return
+        cls._loop = asyncio.get_running_loop()
+        cls._wakeup = asyncio.Event()
+        cls._refilled = cls._loop.create_future()
+        cls._stopping = False
+        cls._task = asyncio.create_task(cls._run())
+        logger.info("令牌池已启动: {0}".format(", ".join(cls.pools)))
+
+    @classmethod
+    async def _run(cls) -> None:
+        wakeup = cls._wakeup
+        next_try: Dict[str, float] = {}
+        while not cls._stopping:
+            for name, pool in cls.pools.items():
+                if time.time() < next_try.get(name, 0) or not pool.needs_refill():
+                    continue
+                try:
+                    await pool.refill()
+                except Exception as e:
+                    next_try[name] = time.time() + cls.retry_interval
+                    logger.warning("补充令牌失败 {0}: {1}".format(name, e))
+
+            refilled, cls._refilled = cls._refilled, cls._loop.create_future()
+            if refilled is not None and not refilled.done():
+                refilled.set_result(None)
+
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=cls.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    async def stop(cls) -> None:
+        """停止后台补充任务 (Stop the background refill task)"""
+        task, cls._task = cls._task, None
+        if task is not None:
+            # wait_for 可能吞掉与唤醒同时到达的取消，因此同时设置停止标记
+            # wait_for may swallow a cancellation that races with a wakeup, so also set the stop flag
+            cls._stopping = True
+            cls._wakeup.set()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if cls._refilled is not None and not cls._refilled.done():
+            cls._refilled.set_result(None)
+        cls._loop = None
+        cls._wakeup = None
+        cls._refilled = None
+
+    @classmethod
+    def stats(cls) -> dict:
+        """令牌池状态 (Pool status)"""
+        return {
+            "running": cls.is_running(),
+            "pools": {name: pool.stats() for name, pool in cls.pools.items()},
+        }
@@ -0,0 +1,266 @@
+# ==============================================================================
+# Copyright (C) 2021 Evil0ctal
+#
+# This file is part of the Douyin_TikTok_Download_API project.
+#
+# This project is licensed under the Apache License 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+#
+# Contributor Link:
+# - https://github.com/Evil0ctal
+# - https://github.com/Johnserf-Seed
+#
+# ==============================================================================
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from crawlers.utils.logger import logger
+
+
+class Span:
+    """追踪中的一个阶段 (One stage of a trace)"""
+
+    __slots__ = ("name", "start", "end", "parent", "attrs")
+
+    def __init__(self, name: str, start: float, parent: int, attrs: Dict[str, Any]):
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.parent = parent
+        self.attrs = attrs
+
+
+class Trace:
+    """
+    单个请求的追踪 (Trace of one request)
+
+    阶段按开始顺序保存，parent 为父阶段的下标，-1 表示根。
+    (Spans are kept in start order; parent is the index of the parent span, -1 for the root.)
+    """
+
+    __slots__ = ("trace_id", "name", "method", "started_at", "t0", "spans", "dropped", "status", "duration")
+
+    def __init__(self, name: str, method: str = ""):
+        self.trace_id = os.urandom(8).hex()
+        self.name = name
+        self.method = method
+        self.started_at = datetime.utcnow().isoformat()
+        self.t0 = time.perf_counter()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.status: Optional[int] = None
+        self.duration: Optional[float] = None
+
+    def open(self, name: str, parent: int, attrs: Dict[str, Any], start: Optional[float] = None) -> int:
+        """添加阶段并返回下标，超过上限时返回 -1 (Add a span and return its index, -1 past the limit)"""
+        if len(self.spans) >= Tracer.max_spans:
+            self.dropped += 1
+            return -1
+        self.spans.append(Span(name, time.perf_counter() if start is None else start, parent, attrs))
+        return len(self.spans) - 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "method": self.method,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "spans": len(self.spans),
+        }
+
+    def waterfall(self) -> Dict[str, Any]:
+        """按开始时间排列的阶段及其相对偏移 (Spans with their offsets, in start order)"""
+        depths: List[int] = []
+        spans = []
+        for span in self.spans:
+            depth = depths[span.parent] + 1 if span.parent >= 0 else 0
+            depths.append(depth)
+            end = span.end if span.end is not None else self.t0 + (self.duration or 0)
+            spans.append({
+                "name": span.name,
+                "depth": depth,
+                "offset_ms": round((span.start - self.t0) * 1000, 2),
+                "duration_ms": round((end - span.start) * 1000, 2),
+                "attrs": span.attrs,
+            })
+        return dict(self.summary(), dropped_spans=self.dropped, waterfall=spans)
+
+    def render(self, width: int = 60) -> str:
+        """文本形式的瀑布图 (Text rendering of the waterfall)"""
+        data = self.waterfall()
+        total = max(data["duration_ms"], 0.001)
+        lines = ["{0} {1} {2} {3}ms".format(data["method"], data["name"], data["status"], data["duration_ms"])]
+        for span in data["waterfall"]:
+            left = int(span["offset_ms"] / total * width)
+            bar = max(1, int(span["duration_ms"] / total * width))
+            label = "  " * span["depth"] + span["name"]
+            lines.append("{0:<40} {1:>9.2f}ms |{2}{3}".format(
+                label[:40], span["duration_ms"], " " * left, "#" * min(bar, width - left or 1)))
+        return "\n".join(lines) + "\n"
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_parent: ContextVar[int] = ContextVar("trace_parent", default=-1)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    记录一个阶段，不在追踪中时不做任何事 (Record a span; a no-op outside a trace)
+
+    用法 (Usage):
+        with span("hybrid.fetch", platform="douyin"):
+            ...
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    index = trace.open(name, _parent.get(), attrs)
+    if index < 0:
+        yield
+        return
+    token = _parent.set(index)
+    try:
+        yield
+    finally:
+        _parent.reset(token)
+        trace.spans[index].end = time.perf_counter()
+
+
+def record_span(name: str, start: float, end: float, **attrs) -> None:
+    """记录一段已经测得的耗时 (Record an interval that has already been measured)"""
+    trace = _trace.get()
+    if trace is None:
+        return
+    index = trace.open(name, _parent.get(), attrs, start)
+    if index >= 0:
+        trace.spans[index].end = end
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+class Tracer:
+    """
+    进程级追踪服务 (Process-wide tracer)
+
+    每个请求都会记录追踪，请求结束时慢请求全部保留，其余按 sample_rate 抽样，保存在固定大小的环形缓冲区中。
+    (Every request is traced; at the end slow requests are always kept and the rest are sampled
+    by sample_rate into a fixed-size ring buffer.)
+    """
+
+    # 默认配置，可通过 configure() 覆盖 / Defaults, overridable through configure()
+    enable: bool = True
+    sample_rate: float = 0.01
+    slow_ms: float = 1000
+    buffer_size: int = 500
+    max_spans: int = 256
+
+    _buffer: Deque[Trace] = deque(maxlen=500)
+    _lock = threading.Lock()
+    traced: int = 0
+    kept: int = 0
+
+    @classmethod
+    def configure(cls, **options) -> None:
+        """
+        从配置文件更新追踪参数 (Update tracing options from the config file)
+
+        Args:
+            options: 与类属性同名的配置项，未知项会被忽略 (Options named after the class attributes, unknown keys are ignored)
+        """
+        for key, value in options.items():
+            attr = key.lower()
+            if attr.startswith("_") or attr in ("traced", "kept") or not hasattr(cls, attr) \
+                    or callable(getattr(cls, attr)):
+                logger.warning("未知的追踪配置项: {0}".format(key))
+                continue
+            setattr(cls, attr, value)
+        with cls._lock:
+            cls._buffer = deque(cls._buffer, maxlen=cls.buffer_size)
+
+    @classmethod
+    def begin(cls, name: str, method: str = "") -> Optional[Tuple[Token, Token]]:
+        """开始追踪当前请求，未启用时返回 None (Start tracing the current request, None when disabled)"""
+        if not cls.enable:
+            return None
+        return _trace.set(Trace(name, method)), _parent.set(-1)
+
+    @classmethod
+    def finish(cls, tokens: Optional[Tuple[Token, Token]], name: Optional[str] = None,
+               status: Optional[int] = None) -> Optional[Trace]:
+        """
+        结束追踪并决定是否保留 (Finish the trace and decide whether to keep it)
+
+        Returns:
+            Trace: 被保留的追踪，未保留时为 None (The kept trace, None when it was dropped)
+        """
+        if tokens is None:
+            return None
+        trace = _trace.get()
+        _trace.reset(tokens[0])
+        _parent.reset(tokens[1])
+        if trace is None:
+            return None
+        trace.duration = time.perf_counter() - trace.t0
+        trace.status = status
+        if name:
+            trace.name = name
+        cls.traced += 1
+        if trace.duration * 1000 < cls.slow_ms and random.random() >= cls.sample_rate:
+            return None
+        with cls._lock:
+            cls._buffer.append(trace)
+        cls.kept += 1
+        return trace
+
+    @classmethod
+    def recent(cls, min_ms: float = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """按耗时从高到低列出保留的追踪 (Kept traces, slowest first)"""
+        with cls._lock:
+            traces = list(cls._buffer)
+        traces = [t for t in traces if t.duration * 1000 >= min_ms]
+        traces.sort(key=lambda t: t.duration, reverse=True)
+        return [t.summary() for t in traces[:limit]]
+
+    @classmethod
+    def get(cls, trace_id: str) -> Optional[Trace]:
+        with cls._lock:
+            for trace in cls._buffer:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    @classmethod
+    def stats(cls) -> dict:
+        """追踪状态 (Tracer status)"""
+        return {
+            "enable": cls.enable,
+            "sample_rate": cls.sample_rate,
+            "slow_ms": cls.slow_ms,
+            "buffered": len(cls._buffer),
+            "buffer_size": cls.buffer_size,
+            "traced": cls.traced,
+            "kept": cls.kept,
+        }
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+积分预占吞吐量基准测试 (Credit reservation throughput benchmark)
+
+多个连接池模拟多个 worker 进程，同时为少量用户预占积分，对比原来的“查余额 → 冻结(先读后写) → 插入任务”
+与单事务预占 (DownloadService.reserve_job) 的吞吐量和超额冻结。正确性由 tests/test_download_service.py 保证。
+(Several connection pools stand in for worker processes reserving credits for a few users at once. Compares the old
+check-then-freeze-then-insert flow with the single-transaction reserve_job on throughput and over-freezing.)
+
+用法 (Usage): python -m scripts.bench_credit_reserve [worker数/workers, 默认/default 8] [每个worker的线程数/threads per worker, 默认/default 4]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from app.db.database import ConnectionPool, _create_tables, run_migrations, utc_now
+from app.services.download_service import DownloadService
+
+COST = 10
+ATTEMPTS = 200
+USERS = [f"user{i}" for i in range(4)]
+
+
+def legacy_reserve(pool, job_id, lc_uid):
+    with pool.writer() as conn:
+        row = conn.execute("SELECT credits_balance, credits_frozen FROM users WHERE lc_uid = ?", (lc_uid,)).fetchone()
+        if row["credits_balance"] - row["credits_frozen"] < COST:
+            return False
+    with pool.writer() as conn:
+        row = conn.execute("SELECT credits_balance, credits_frozen FROM users WHERE lc_uid = ?", (lc_uid,)).fetchone()
+        if row["credits_balance"] - row["credits_frozen"] < COST:
+            return False
+        now, _ = utc_now()
+        conn.execute(
+            "UPDATE users SET credits_frozen = ?, updated_at = ? WHERE lc_uid = ?",
+            (row["credits_frozen"] + COST, now, lc_uid)
+        )
+        conn.commit()
+    with pool.writer() as conn:
+        now, now_ms = utc_now()
+        conn.execute(
+            "INSERT INTO download_jobs (job_id, lc_uid, url, platform, cost_credits, status, confirmed, "
+            "created_at, updated_at, created_at_ms, updated_at_ms) VALUES (?, ?, '', 'douyin', ?, 'running', 0, ?, ?, ?, ?)",
+            (job_id, lc_uid, COST, now, now, now_ms, now_ms)
+        )
+        conn.commit()
+    return True
+
+
+def atomic_reserve(pool, job_id, lc_uid):
+    with pool.writer() as conn:
+        return DownloadService.reserve_job(conn, job_id, lc_uid, "", "douyin", COST) is not None
+
+
+def run(label: str, reserve, workers: int, threads_per_worker: int, balance: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        setup = ConnectionPool(path)
+        with setup.writer() as conn:
+            _create_tables(conn)
+            run_migrations(conn)
+            now, _ = utc_now()
+            conn.executemany(
+                "INSERT INTO users (lc_uid, credits_balance, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                ((lc_uid, balance, now, now) for lc_uid in USERS)
+            )
+            conn.commit()
+        pools = [ConnectionPool(path) for _ in range(workers)]
+        errors = []
+
+        def worker(pool, index):
+            for i in range(ATTEMPTS):
+                try:
+                    reserve(pool, str(uuid.uuid4()), USERS[(index + i) % len(USERS)])
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [
+            threading.Thread(target=worker, args=(pool, n * threads_per_worker + t))
+            for n, pool in enumerate(pools) for t in range(threads_per_worker)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with setup.reader() as conn:
+            jobs = dict(conn.execute("SELECT lc_uid, SUM(cost_credits) FROM download_jobs GROUP BY lc_uid").fetchall())
+            frozen = dict(conn.execute("SELECT lc_uid, credits_frozen FROM users").fetchall())
+        over = sum(max(jobs.get(u, 0) - balance, 0) for u in USERS)
+        lost = sum(abs(jobs.get(u, 0) - frozen[u]) for u in USERS)
+        total = len(threads) * ATTEMPTS
+        print(f"  {label:<10} {total / elapsed:>9.0f} 次/秒   任务 {sum(jobs.values()) // COST:>4}/{len(USERS) * balance // COST}"
+              f"   超额冻结 {over:>5}   冻结与任务不一致 {lost:>5}   错误 {len(errors)}")
+        for pool in pools + [setup]:
+            pool.close_all()
+
+
+def main(workers: int, threads_per_worker: int) -> None:
+    # 余额只够 3/4 的尝试，大部分预占会成功，最后一段在余额边界上竞争
+    # (Balance covers 3/4 of the attempts, so the tail races at the balance boundary)
+    balance = workers * threads_per_worker * ATTEMPTS * COST * 3 // 4 // len(USERS)
+    print(f"{workers} 个 worker × {threads_per_worker} 线程，{len(USERS)} 个用户，每个用户余额 {balance}，每次冻结 {COST}:")
+    run("原流程", legacy_reserve, workers, threads_per_worker, balance)
+    run("单事务", atomic_reserve, workers, threads_per_worker, balance)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 8,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+    )
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+数据库迁移基准测试 (Database migration benchmark)
+
+在临时数据库中生成旧结构的数据，对比迁移前后常用查询的耗时，以及结构迁移和后台回填各自的耗时。
+(Builds old-schema data in a temporary database and compares common queries before and after the migrations,
+timing the schema migrations and the background backfill separately.)
+
+用法 (Usage): python -m scripts.bench_db_migration [行数/rows, 默认/default 1000000]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.db import database
+from app.db.database import ConnectionPool, _create_tables, backfill_epoch_ms, run_migrations
+
+
+def timestamps(start_time: datetime, count: int):
+    step = 7 * 86400 / count
+    for i in range(count):
+        yield (start_time + timedelta(seconds=i * step)).isoformat()
+
+
+def timed(conn, label: str, sql: str, params=(), repeat: int = 20) -> None:
+    plan = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params).fetchall()
+    elapsed = (time.perf_counter() - started) / repeat * 1000
+    print(f"  {label:<34} {elapsed:>9.2f} ms   {plan}")
+
+
+def main(rows: int) -> None:
+    users = [f"user{i}" for i in range(max(rows // 1000, 1))]
+    start_time = datetime.utcnow() - timedelta(days=7)
+    # 基准测试不需要为其它写操作让出写锁 (No other writers to yield to while benchmarking)
+    database.MIGRATION_PAUSE_MS = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench = ConnectionPool(os.path.join(directory, "bench.db"))
+        with bench.writer() as conn:
+            _create_tables(conn)
+            # 迁移前的索引
+            for statement in (
+                "CREATE INDEX idx_credit_ledger_lc_uid ON credit_ledger(lc_uid)",
+                "CREATE INDEX idx_credit_ledger_created_at ON credit_ledger(created_at)",
+                "CREATE INDEX idx_api_metrics_created_at ON api_metrics(created_at)",
+                "CREATE INDEX idx_api_metrics_is_external ON api_metrics(is_external)",
+            ):
+                conn.execute(statement)
+
+            print(f"生成 {rows} 行 api_metrics 和 credit_ledger ...")
+            conn.executemany(
+                "INSERT INTO api_metrics (endpoint, method, status_code, latency_ms, is_external, external_api, created_at) "
+                "VALUES ('/api/downloads/start', 'POST', 200, ?, ?, ?, ?)",
+                ((random.randint(1, 2000), 1 if i % 10 == 0 else 0, "TikHub" if i % 10 == 0 else None, ts)
+                 for i, ts in enumerate(timestamps(start_time, rows)))
+            )
+            conn.executemany(
+                "INSERT INTO credit_ledger (lc_uid, delta, reason, created_at) VALUES (?, -1, 'download', ?)",
+                ((random.choice(users), ts) for ts in timestamps(start_time, rows))
+            )
+            conn.commit()
+            conn.execute("ANALYZE")
+
+            cutoff = (datetime.utcnow() - timedelta(days=1)).isoformat()
+            print("迁移前（文本时间）:")
+            timed(conn, "用户流水 ORDER BY created_at", "SELECT * FROM credit_ledger WHERE lc_uid = ? ORDER BY created_at DESC LIMIT 50", (users[0],))
+            timed(conn, "最近外部调用", "SELECT * FROM api_metrics WHERE is_external = 1 ORDER BY created_at DESC LIMIT 100")
+            timed(conn, "24小时外部调用数", "SELECT COUNT(*) FROM api_metrics WHERE is_external = 1 AND created_at > ?", (cutoff,))
+            timed(conn, "过期记录数", "SELECT COUNT(*) FROM api_metrics WHERE created_at < ?", (cutoff,))
+
+            started = time.perf_counter()
+            run_migrations(conn)
+            print(f"结构迁移耗时 {time.perf_counter() - started:.2f} 秒")
+
+        started = time.perf_counter()
+        filled = backfill_epoch_ms(db=bench)
+        print(f"回填 {filled} 行，耗时 {time.perf_counter() - started:.2f} 秒")
+
+        with bench.writer() as conn:
+            cutoff_ms = int((time.time() - 86400) * 1000)
+            print("迁移后（毫秒时间 + 复合索引）:")
+            timed(conn, "用户流水 ORDER BY created_at_ms", "SELECT * FROM credit_ledger WHERE lc_uid = ? ORDER BY created_at_ms DESC LIMIT 50", (users[0],))
+            timed(conn, "最近外部调用", "SELECT * FROM api_metrics WHERE is_external = 1 ORDER BY created_at_ms DESC LIMIT 100")
+            timed(conn, "24小时外部调用数", "SELECT COUNT(*) FROM api_metrics WHERE is_external = 1 AND created_at_ms > ?", (cutoff_ms,))
+            timed(conn, "过期记录数", "SELECT COUNT(*) FROM api_metrics WHERE created_at_ms < ?", (cutoff_ms,))
+        bench.close_all()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
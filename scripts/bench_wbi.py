@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Bilibili WBI 签名基准测试 (Bilibili WBI signing benchmark)
+
+对比原有的 wrid.get_wrid 实现和 hashlib 实现的吞吐量。
+(Compares throughput of the original wrid.get_wrid implementation and the hashlib one.)
+
+用法 (Usage): python -m scripts.bench_wbi [次数/count]
+"""
+import asyncio
+import sys
+import time
+from urllib.parse import urlencode
+
+from crawlers.bilibili.web import wrid
+from crawlers.bilibili.web.models import UserPostVideos, UserProfile, ComPopular, UserDynamic, PlayUrl
+from crawlers.bilibili.web.utils import EndpointGenerator, WridManager
+
+SAMPLES = [
+    ("user_post_videos_endpoint", UserPostVideos(mid="178360345", pn=1)),
+    ("video_playurl_endpoint", PlayUrl(bvid="BV1M1421t7hT", cid="1583327563", qn="64")),
+    ("user_profile_endpoint", UserProfile(mid="178360345")),
+    ("com_popular_endpoint", ComPopular(pn=1)),
+    ("user_dynamic_endpoint", UserDynamic(host_mid="178360345", offset="")),
+]
+
+
+def legacy_wrid_model_endpoint(params: dict, mixin_key: str) -> str:
+    wts = params["wts"]
+    params["wts"] = params["wts"] + mixin_key
+    query = urlencode({
+        k: ''.join(filter(lambda chr: chr not in "!'()*", str(v)))
+        for k, v in sorted(params.items())
+    })
+    params["wts"] = wts
+    params["w_rid"] = wrid.get_wrid(e=query)
+    return "&".join(f"{k}={v}" for k, v in params.items())
+
+
+async def main(total: int = 2000) -> None:
+    WridManager.refresh_enable = False
+    for name, model in SAMPLES:
+        start = time.perf_counter()
+        for _ in range(total):
+            legacy_wrid_model_endpoint(model.dict(), WridManager.mixin_key)
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(total):
+            await getattr(EndpointGenerator(model.dict()), name)()
+        new_time = time.perf_counter() - start
+        print(f"{name:<28} legacy {total / legacy_time:>8.0f}/s   hashlib {total / new_time:>8.0f}/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+X-Bogus 签名基准测试 (X-Bogus signing benchmark)
+
+对比每次新建实例、按 User-Agent 缓存的实例和批量签名的吞吐量。
+(Compares throughput of a new instance per call, the per-User-Agent cached instance and batch signing.)
+
+用法 (Usage): python -m scripts.bench_xbogus [次数/count]
+"""
+import sys
+import time
+
+from crawlers.douyin.web.xbogus import XBogus
+
+URL_PATH = "https://www.douyin.com/aweme/v1/web/aweme/post/?device_platform=webapp&aid=6383&channel=channel_pc_web&sec_user_id=MS4wLjABAAAAW9FWcqS7RdQAWPd2AA5fL_ilmqsIFUCQ_Iym6Yh9_cUa6ZRqVLjVQSUjlHrfXY1Y&max_cursor=0&count=18&pc_client_type=1&version_code=170400&version_name=17.4.0&cookie_enabled=true&msToken=p9Y7fUBuq9DKvAuN27Peml6JbaMqG2ZcXfFiyDv1jcHrCN00uidYqUgSuLsKl1onC"
+UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.0.0 Safari/537.36"
+
+
+def main(total: int = 2000) -> None:
+    start = time.perf_counter()
+    for _ in range(total):
+        XBogus(user_agent=UA).getXBogus(URL_PATH)
+    per_call = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(total):
+        XBogus.for_user_agent(UA).getXBogus(URL_PATH)
+    cached = time.perf_counter() - start
+    start = time.perf_counter()
+    XBogus.for_user_agent(UA).getXBogus_many([URL_PATH] * total)
+    batched = time.perf_counter() - start
+    print(f"new instance: {total / per_call:.0f}/s, cached: {total / cached:.0f}/s, batch: {total / batched:.0f}/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
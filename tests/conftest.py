@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+测试共用的夹具 (Shared test fixtures)
+"""
+import pytest
+
+from app.db import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """使用临时数据库文件的连接池 (Connection pool backed by a temporary database file)"""
+    pool = database.ConnectionPool(str(tmp_path / "credits.db"))
+    monkeypatch.setattr(database, "pool", pool)
+    database.init_database()
+    yield pool
+    pool.close_all()
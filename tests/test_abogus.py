@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+ABogus 签名的回归测试 (Regression tests for ABogus signing)
+
+期望值由基线实现(gmssl)在相同输入下生成，签名必须逐字节一致。
+(Expected values were produced by the baseline gmssl-based implementation with the same inputs;
+signatures must stay byte-for-byte identical.)
+"""
+import hashlib
+import random
+
+import pytest
+
+from crawlers.douyin.web import abogus
+from crawlers.douyin.web.abogus import ABogus
+
+SM3_VECTORS = [
+    (b"abc", "66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0"),
+    (b"abcd" * 16, "debe9ff92275b8a138604889c18e5a4d6fdb70e5387e5765293dcba39c0c5732"),
+]
+
+PARAMS = "device_platform=webapp&aid=6383&channel=channel_pc_web&aweme_id=7345492945006595379&msToken=abc"
+
+# (参数, 方法, 开始时间, 三个随机数, 期望值) (params, method, start time, random numbers, expected)
+GOLDEN = [
+    (PARAMS, "GET", 1700000000000, (1234.5, 5678.25, 9012.75),
+     "E7mhBdugDifihdWk56KLfY3q65yVYmQI0SVkMD2feBDOqL39HMY29exoIBGvXY8jwG/-IeEjy4hbT3ohrQ2y0Hwf9W0L/25ksDSkKl5Q5xSSs1X9"
+     "eghgJ04qmkt5SMx2RvB-rOXmqhZHKRbp09oHmhK4b1dzFgf3qJLz1j=="),
+    ({"aid": "6383", "keyword": "猫 咪"}, "POST", 1712345678901, (1.5, 9999.9, 42.0),
+     "Df8hQDuhmE6PDD6D5VKLfY3q6AaHYmQn0SVkMD2f6WfOWL39HMYa9exo/sTvKPRjLT/AIeEjy4hbT3ohrQ2y0Hwf9W0L/25ksDSkKl5Q5xSSs1X9"
+     "eghgJ04qmkt5SMx2RvB-rOXmqhZHKRbp09oHmhK4b1dzFgf3qJLzQD=="),
+    ("", "GET", 1600000000123, (7777.7, 3333.3, 100.0),
+     "m68MMDghdD6ivD6D5f/LfY3q6fSVYmmU0SVkMD2fvPDOUL39HMOk9exogpXvFFEj5s0LIeEjy4hbT3ohrQ2y0Hwf9W0L/25ksDSkKl5Q5xSSs1X9"
+     "eghgJ04qmkt5SMx2RvB-rOXmqhZHKRbp09oHmhK4b1dzFgf3qJLzKj=="),
+]
+
+# random.seed(7) 后 ABogus(platform="Win32") 的签名 (Signature of ABogus(platform="Win32") after random.seed(7))
+GOLDEN_PLATFORM = (
+    "Y68h/dLXmEdikDyk56KLfY3q65yVYmQI0SVkMD2feBDOqL39HMYh9exoIBGvXY8jwG/-Ieujy4hbTNKdrQ2G8qwf78hi/25hmfSkKl5Q5xSSs1Xa"
+    "eLvgJ0sxmkt1SF92Rv-ArOXBqw-HKR8209oHmhK4bIOwu3GMBf=="
+)
+
+
+def _openssl_sm3() -> bool:
+    try:
+        hashlib.new("sm3")
+    except ValueError:
+        return False
+    return True
+
+
+SM3_IMPLEMENTATIONS = [
+    pytest.param(abogus._sm3_digest_pure, id="pure"),
+    pytest.param(abogus._sm3_digest_openssl, id="hashlib",
+                 marks=pytest.mark.skipif(not _openssl_sm3(), reason="OpenSSL 未提供 SM3 (OpenSSL lacks SM3)")),
+]
+
+
+@pytest.fixture(params=SM3_IMPLEMENTATIONS)
+def sm3(request, monkeypatch):
+    """依次使用两种 SM3 实现 (Run with each SM3 implementation)"""
+    monkeypatch.setattr(abogus, "sm3_digest", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("message, digest", SM3_VECTORS)
+def test_sm3_vectors(sm3, message, digest):
+    assert sm3(message).hex() == digest
+
+
+@pytest.mark.parametrize("params, method, start_time, random_nums, expected", GOLDEN)
+def test_get_value_golden(sm3, params, method, start_time, random_nums, expected):
+    assert ABogus().get_value(params, method, start_time, start_time + 6, *random_nums) == expected
+
+
+def test_get_value_golden_platform(sm3):
+    random.seed(7)
+    signer = ABogus(platform="Win32")
+    assert signer.get_value(PARAMS, "GET", 1700000000000, 1700000000005, 4321.0, 8765.0, 2468.0) == GOLDEN_PLATFORM
+
+
+def test_get_value_reuses_instance(sm3):
+    """同一实例重复签名结果不变 (Signing repeatedly with one instance gives the same result)"""
+    signer = ABogus()
+    params, method, start_time, random_nums, expected = GOLDEN[0]
+    for _ in range(3):
+        assert signer.get_value(params, method, start_time, start_time + 6, *random_nums) == expected
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+共享HTTP客户端池测试 (Shared HTTP client pool tests)
+"""
+import asyncio
+
+import httpx
+
+from crawlers.utils.client_pool import ClientPool
+
+
+def test_shared_client_does_not_carry_cookies(monkeypatch):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("Cookie"))
+        return httpx.Response(200, headers={"Set-Cookie": "session=user-a; Path=/"})
+
+    # 用 MockTransport 代替网络请求 (Replace the network with a MockTransport)
+    monkeypatch.setattr(httpx, "AsyncHTTPTransport", lambda **kwargs: httpx.MockTransport(handler))
+    monkeypatch.setattr(ClientPool, "_clients", {})
+
+    async def main():
+        ClientPool.start()
+        try:
+            client = ClientPool.acquire("douyin").client
+            await client.get("https://www.douyin.com/a")
+            await client.get("https://www.douyin.com/b")
+            await client.get("https://www.douyin.com/c", headers={"Cookie": "session=user-b"})
+            return dict(client.cookies)
+        finally:
+            await ClientPool.aclose_all()
+
+    assert asyncio.run(main()) == {}
+    assert seen == [None, None, "session=user-b"]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+数据库迁移测试 (Database migration tests)
+"""
+import threading
+
+from app.db import database
+from app.db.database import backfill_epoch_ms, get_db_connection, get_meta, get_read_connection
+
+
+def test_epoch_ms_backfill_resumes(db, monkeypatch):
+    with get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO credit_ledger (lc_uid, delta, reason, created_at) VALUES ('u', 1, 'x', ?)",
+            [("2024-01-01T00:00:0{0}.250000".format(i),) for i in range(7)]
+        )
+        conn.commit()
+    monkeypatch.setattr(database, "MIGRATION_BATCH_SIZE", 3)
+    monkeypatch.setattr(database, "MIGRATION_PAUSE_MS", 0)
+
+    # 第一批提交后停止 (Stop after the first committed batch)
+    stop = threading.Event()
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: stop.set())
+    assert backfill_epoch_ms(stop) == 3
+    with get_read_connection() as conn:
+        assert get_meta(conn, "epoch_ms_backfill:credit_ledger.created_at_ms") == "3"
+
+    assert backfill_epoch_ms() == 4
+    with get_read_connection() as conn:
+        values = [row[0] for row in conn.execute("SELECT created_at_ms FROM credit_ledger ORDER BY id")]
+        assert get_meta(conn, "epoch_ms_backfill:credit_ledger.created_at_ms") == "done"
+    assert values == [1704067200250 + i * 1000 for i in range(7)]
+    assert backfill_epoch_ms() == 0
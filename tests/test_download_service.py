@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+下载积分预占与确认的并发测试 (Concurrency tests for download credit reservation and confirmation)
+"""
+import threading
+import uuid
+
+import pytest
+
+from app.db.database import ConnectionPool, get_db_connection, get_read_connection, utc_now
+from app.services.credit_service import InsufficientCredits
+from app.services.download_service import DownloadService
+
+URL = "https://www.douyin.com/video/1"
+COST = DownloadService.PLATFORM_COSTS["douyin"]
+
+
+def add_user(lc_uid: str, balance: int) -> None:
+    now, _ = utc_now()
+    with get_db_connection() as conn:
+        conn.execute(
+            "INSERT INTO users (lc_uid, credits_balance, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (lc_uid, balance, now, now)
+        )
+        conn.commit()
+
+
+def credits(lc_uid: str):
+    with get_read_connection() as conn:
+        row = conn.execute("SELECT credits_balance, credits_frozen FROM users WHERE lc_uid = ?", (lc_uid,)).fetchone()
+        jobs = conn.execute(
+            "SELECT COALESCE(SUM(cost_credits), 0) FROM download_jobs WHERE lc_uid = ? AND confirmed = 0", (lc_uid,)
+        ).fetchone()[0]
+    return row["credits_balance"], row["credits_frozen"], jobs
+
+
+def run_threads(count: int, target) -> None:
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_create_never_over_freezes(db):
+    add_user("u", 7 * COST + COST // 2)
+    created, rejected, errors = [], [], []
+
+    def attempt(index):
+        for _ in range(5):
+            try:
+                job = DownloadService.create_download_job("u", URL)
+                (created if job else errors).append(job)
+            except InsufficientCredits:
+                rejected.append(index)
+            except Exception as e:
+                errors.append(e)
+
+    run_threads(16, attempt)
+
+    balance, frozen, jobs = credits("u")
+    assert errors == []
+    assert len(created) == 7
+    assert len(rejected) == 16 * 5 - 7
+    assert frozen == jobs == 7 * COST
+    assert frozen <= balance
+
+
+def test_reserve_across_processes_never_over_freezes(db, tmp_path):
+    # 每个连接池各自持有写连接，相当于多个 worker 进程 (One pool per simulated worker process)
+    users = ["a", "b"]
+    for lc_uid in users:
+        add_user(lc_uid, 25 * COST)
+    pools = [ConnectionPool(str(tmp_path / "credits.db")) for _ in range(4)]
+    reserved, errors = [], []
+
+    def attempt(index):
+        pool = pools[index % len(pools)]
+        for i in range(20):
+            try:
+                with pool.writer() as conn:
+                    job = DownloadService.reserve_job(conn, str(uuid.uuid4()), users[(index + i) % 2], URL, "douyin", COST)
+                if job:
+                    reserved.append(job)
+            except Exception as e:
+                errors.append(e)
+
+    try:
+        run_threads(8, attempt)
+    finally:
+        for pool in pools:
+            pool.close_all()
+
+    assert errors == []
+    assert len(reserved) == 50
+    for lc_uid in users:
+        balance, frozen, jobs = credits(lc_uid)
+        assert frozen == jobs == balance
+
+
+@pytest.mark.parametrize("first", ["confirm", "cancel"])
+def test_confirm_and_cancel_settle_once(db, first):
+    add_user("u", 100)
+    job = DownloadService.create_download_job("u", URL)
+    DownloadService.update_job_status(job["job_id"], "pending_confirm", {"title": "t"})
+    confirm = lambda: DownloadService.confirm_download(job["job_id"], "u")
+    cancel = lambda: DownloadService.cancel_download(job["job_id"], "u")
+    # 确认和取消交替启动，同一任务只能结算一次 (Interleave confirms and cancels; only one may settle the job)
+    actions = [confirm, cancel] if first == "confirm" else [cancel, confirm]
+    results = []
+    run_threads(8, lambda index: results.append(actions[index % 2]()))
+
+    assert sum(result["success"] for result in results) == 1
+    balance, frozen, _ = credits("u")
+    assert frozen == 0
+    assert balance in (100, 100 - COST)
+    with get_read_connection() as conn:
+        ledger = conn.execute("SELECT COUNT(*) FROM credit_ledger WHERE reason = 'download_confirmed'").fetchone()[0]
+    assert ledger == (1 if balance == 100 - COST else 0)
+
+
+def test_confirm_reports_why_it_did_nothing(db):
+    add_user("u", 100)
+    job = DownloadService.create_download_job("u", URL)
+
+    assert DownloadService.confirm_download("missing", "u")["message"] == "任务不存在"
+    assert DownloadService.confirm_download(job["job_id"], "other")["message"] == "无权操作此任务"
+    assert not DownloadService.confirm_download(job["job_id"], "u")["success"]
+    assert credits("u")[1] == COST
+
+
+def job_row(job_id: str):
+    with get_read_connection() as conn:
+        return conn.execute("SELECT status, confirmed FROM download_jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+
+def test_late_worker_result_does_not_overwrite_cancelled_job(db):
+    add_user("u", 100)
+    job = DownloadService.create_download_job("u", URL)
+    assert DownloadService.cancel_download(job["job_id"], "u")["success"]
+
+    DownloadService.update_job_status(job["job_id"], "pending_confirm", {"title": "t"})
+    DownloadService.update_job_status(job["job_id"], "failed", error_message="late")
+
+    assert tuple(job_row(job["job_id"])) == ("running", -1)
+    assert credits("u")[:2] == (100, 0)
+
+
+def test_failed_job_cannot_be_cancelled_again(db):
+    add_user("u", 100)
+    first = DownloadService.create_download_job("u", URL)
+    second = DownloadService.create_download_job("u", URL)
+
+    DownloadService.update_job_status(first["job_id"], "failed", error_message="boom")
+    assert tuple(job_row(first["job_id"])) == ("failed", -1)
+    assert not DownloadService.cancel_download(first["job_id"], "u")["success"]
+
+    # 第二个任务的冻结积分不会被重复解冻 (The second job's frozen credits stay frozen)
+    assert credits("u")[1] == COST
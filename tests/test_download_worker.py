@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+下载任务工作池测试 (Download worker pool tests)
+"""
+import asyncio
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import downloads
+from app.db.database import get_db_connection, get_read_connection, utc_now
+from app.services.auth_service import AuthService
+from app.services.download_service import DownloadService
+from app.services.download_worker import DownloadWorker
+
+
+def test_cancel_during_claim_requeues_job(db, monkeypatch):
+    now, now_ms = utc_now()
+    with get_db_connection() as conn:
+        conn.execute(
+            "INSERT INTO download_jobs (job_id, lc_uid, url, platform, cost_credits, status, confirmed, "
+            "created_at, updated_at, created_at_ms, updated_at_ms) VALUES ('j', 'u', '', 'douyin', 10, 'queued', 0, ?, ?, ?, ?)",
+            (now, now, now_ms, now_ms)
+        )
+        conn.commit()
+
+    claim = DownloadWorker._claim
+    claiming = []
+
+    def slow_claim(job_id):
+        # 关闭发生在领取的线程提交之前 (Shutdown arrives before the claiming thread commits)
+        claiming.append(job_id)
+        time.sleep(0.2)
+        return claim(job_id)
+
+    async def handler(platform, url):
+        raise AssertionError("cancelled job must not run")
+
+    monkeypatch.setattr(DownloadWorker, "_claim", staticmethod(slow_claim))
+    monkeypatch.setattr(DownloadWorker, "concurrency", {"douyin": 1, "other": 0})
+    DownloadWorker.set_handler(handler)
+
+    async def main():
+        DownloadWorker.start()
+        while not claiming:
+            await asyncio.sleep(0.01)
+        await DownloadWorker.stop()
+
+    asyncio.run(main())
+
+    with get_read_connection() as conn:
+        assert conn.execute("SELECT status FROM download_jobs WHERE job_id = 'j'").fetchone()[0] == "queued"
+
+
+def test_long_poll_waits_past_running_until_parsed(db, monkeypatch):
+    async def verify_session(lc_uid, session):
+        return True, None
+
+    monkeypatch.setattr(AuthService, "verify_session", verify_session)
+    job = DownloadService.create_download_job("u", "https://www.douyin.com/video/1", status="queued")
+
+    def worker():
+        # queued -> running 和 running -> pending_confirm 各发布一次通知 (Both transitions publish)
+        time.sleep(0.2)
+        DownloadWorker._claim(job["job_id"])
+        time.sleep(0.2)
+        DownloadService.update_job_status(job["job_id"], "pending_confirm", {"title": "t"})
+
+    app = FastAPI()
+    app.include_router(downloads.router, prefix="/api/downloads")
+    with TestClient(app) as client:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        started = time.monotonic()
+        response = client.get(
+            "/api/downloads/status", params={"job_id": job["job_id"], "wait": 10}, headers={"X-LC-UID": "u"}
+        )
+        thread.join()
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending_confirm"
+    assert time.monotonic() - started < 5
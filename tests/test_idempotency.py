@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+幂等键重放测试 (Idempotency-Key replay tests)
+"""
+import asyncio
+from collections import OrderedDict
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.api.middleware import IdempotencyMiddleware
+from app.services.idempotency import IdempotencyStore
+
+HEADERS = {"X-LC-UID": "u", "Idempotency-Key": "k1"}
+
+
+@pytest.fixture
+def charges(db, monkeypatch):
+    """只有 /charge 支持幂等键的应用，记录每次真正执行的请求体 (App whose /charge endpoint records every execution)"""
+    monkeypatch.setattr(IdempotencyStore, "paths", ("/charge",))
+    monkeypatch.setattr(IdempotencyStore, "_memory", OrderedDict())
+    monkeypatch.setattr(IdempotencyStore, "_inflight", {})
+    executed = []
+
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware)
+
+    @app.post("/charge")
+    async def charge(request: Request):
+        body = await request.json()
+        executed.append(body)
+        if body.get("slow"):
+            await asyncio.sleep(0.2)
+        if body.get("fail"):
+            return JSONResponse({"detail": "upstream"}, status_code=502)
+        return {"charge": len(executed), "amount": body["amount"]}
+
+    def client():
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    return executed, client
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_same_key_and_body_replays_first_response(charges):
+    executed, client = charges
+
+    async def main():
+        async with client() as c:
+            first = await c.post("/charge", json={"amount": 5}, headers=HEADERS)
+            second = await c.post("/charge", json={"amount": 5}, headers=HEADERS)
+        return first, second
+
+    first, second = run(main())
+    assert len(executed) == 1
+    assert second.status_code == first.status_code == 200
+    assert second.content == first.content
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+
+def test_replay_survives_losing_the_memory_cache(charges, monkeypatch):
+    executed, client = charges
+
+    async def main():
+        async with client() as c:
+            first = await c.post("/charge", json={"amount": 5}, headers=HEADERS)
+            # 模拟其它进程或重启：只能从数据库读取 (Another process or a restart only has the database)
+            IdempotencyStore._memory.clear()
+            second = await c.post("/charge", json={"amount": 5}, headers=HEADERS)
+        return first, second
+
+    first, second = run(main())
+    assert len(executed) == 1
+    assert second.content == first.content
+
+
+def test_same_key_with_different_body_conflicts(charges):
+    executed, client = charges
+
+    async def main():
+        async with client() as c:
+            first = await c.post("/charge", json={"amount": 5}, headers=HEADERS)
+            second = await c.post("/charge", json={"amount": 50}, headers=HEADERS)
+            other_key = await c.post("/charge", json={"amount": 50}, headers={**HEADERS, "Idempotency-Key": "k2"})
+        return first, second, other_key
+
+    first, second, other_key = run(main())
+    assert first.status_code == 200
+    assert second.status_code == 422
+    assert other_key.status_code == 200
+    assert executed == [{"amount": 5}, {"amount": 50}]
+
+
+def test_concurrent_duplicates_execute_once(charges):
+    executed, client = charges
+
+    async def main():
+        async with client() as c:
+            return await asyncio.gather(*(
+                c.post("/charge", json={"amount": 5, "slow": True}, headers=HEADERS) for _ in range(5)
+            ))
+
+    responses = run(main())
+    assert len(executed) == 1
+    assert len({response.content for response in responses}) == 1
+    assert sum(response.headers.get("idempotent-replayed") == "true" for response in responses) == 4
+
+
+def test_server_errors_release_the_key(charges):
+    executed, client = charges
+
+    async def main():
+        async with client() as c:
+            first = await c.post("/charge", json={"amount": 5, "fail": True}, headers=HEADERS)
+            second = await c.post("/charge", json={"amount": 5, "fail": True}, headers=HEADERS)
+        return first, second
+
+    first, second = run(main())
+    assert first.status_code == second.status_code == 502
+    assert len(executed) == 2
+    assert "idempotent-replayed" not in second.headers
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+延迟直方图测试 (Latency histogram tests)
+"""
+import random
+import statistics
+
+import pytest
+
+from app.services.latency_histogram import (
+    MAX_TRACKABLE_MS, PERCENTILES, SUB_BUCKETS, LatencyHistogram, bucket_index, bucket_upper_bound
+)
+
+
+def test_bucket_bounds_round_trip():
+    last = bucket_index(MAX_TRACKABLE_MS)
+    previous = -1
+    for index in range(last + 1):
+        upper = bucket_upper_bound(index)
+        # 上界落在自己的桶内，桶之间连续不重叠 (Upper bounds map back and buckets tile the range)
+        assert bucket_index(upper) == index
+        assert bucket_index(previous + 1) == index
+        assert upper > previous
+        # 桶宽不超过下界的 1/SUB_BUCKETS (Bucket width stays within 1/SUB_BUCKETS of its lower bound)
+        assert upper - previous <= max(1, (previous + 1) / SUB_BUCKETS)
+        previous = upper
+    assert previous == MAX_TRACKABLE_MS
+    assert bucket_index(MAX_TRACKABLE_MS * 2) == last
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_percentiles_match_statistics_quantiles(seed):
+    rng = random.Random(seed)
+    values = [int(rng.lognormvariate(5, 1.2)) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    expected = statistics.quantiles(values, n=100, method="inclusive")
+    summary = histogram.summary()
+    for q in PERCENTILES:
+        exact = expected[q - 1]
+        assert abs(histogram.percentile(q) - exact) <= exact / SUB_BUCKETS + 1
+        assert summary["p{0}_latency_ms".format(q)] == histogram.percentile(q)
+    assert summary["max_latency_ms"] == max(values)
+
+
+def test_merge_and_serialization_keep_counts():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for value in range(0, 5000, 7):
+        first.record(value)
+    for value in range(3, 90000, 11):
+        second.record(value)
+
+    restored = LatencyHistogram.loads(first.dumps(), first.count, first.total, first.max)
+    merged = LatencyHistogram.merged([restored, second])
+    assert merged.count == first.count + second.count
+    assert merged.total == first.total + second.total
+    assert merged.max == second.max
+    assert merged.summary() == LatencyHistogram.merged([first, second]).summary()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+监控汇总测试 (Metrics rollup tests)
+"""
+from app.db.database import get_db_connection, get_meta, get_read_connection
+from app.services import metrics_service
+from app.services.metrics_service import INSERT_METRIC_SQL, MetricsService, MetricsWriter
+
+MINUTE = 60000
+HOUR = 60 * MINUTE
+
+
+def insert_calls(count: int, start_ms: int) -> None:
+    rows = [
+        ("/api/x", "GET", 200, 10 + i, 0, None, None, None, "t", start_ms + i * 1000)
+        for i in range(count)
+    ]
+    with get_db_connection() as conn:
+        conn.executemany(INSERT_METRIC_SQL, rows)
+        conn.commit()
+
+
+def minute_total() -> int:
+    with get_read_connection() as conn:
+        return conn.execute("SELECT COALESCE(SUM(count), 0) FROM api_metrics_minute").fetchone()[0]
+
+
+def test_backfill_resumes_from_saved_cursor(db, monkeypatch):
+    insert_calls(10, 100 * MINUTE)
+    persist = MetricsWriter._persist_minutes
+    monkeypatch.setattr(MetricsWriter, "backfilled", 0)
+
+    def interrupt(conn, items):
+        persist(conn, items)
+        MetricsWriter._stopping = True
+
+    # 第一批写入后中断 (Stop after the first batch)
+    monkeypatch.setattr(MetricsWriter, "_persist_minutes", interrupt)
+    monkeypatch.setattr(MetricsWriter, "_stopping", False)
+    assert MetricsWriter.backfill(batch_size=4) == 4
+    assert minute_total() == 4
+    with get_read_connection() as conn:
+        assert get_meta(conn, "rollup_backfill_last_id") == "4"
+
+    # 重启后从 last_id 继续，不重复统计 (A restart resumes from last_id without counting twice)
+    monkeypatch.setattr(MetricsWriter, "_persist_minutes", persist)
+    MetricsWriter._stopping = False
+    MetricsWriter.backfill(batch_size=4)
+    assert minute_total() == 10
+
+    # 之后写入的记录由内存汇总统计，不再重建 (Later rows are counted in memory and never rebuilt)
+    insert_calls(5, 200 * MINUTE)
+    MetricsWriter.backfill(batch_size=4)
+    assert minute_total() == 10
+
+
+def test_load_rollups_across_hour_boundary(db, monkeypatch):
+    hour = 1000 * HOUR
+    now_ms = hour + 30 * MINUTE
+    monkeypatch.setattr(metrics_service.time, "time", lambda: now_ms / 1000)
+    monkeypatch.setattr(MetricsWriter, "_minutes", {})
+
+    def call(minute_ms: int, latency_ms: int) -> None:
+        MetricsWriter.observe((minute_ms, "/api/x", "GET", "", 0), latency_ms, 200)
+
+    call(hour - 2 * HOUR + 10 * MINUTE, 1)    # 早于起始时间 (Before the window)
+    call(hour - 2 * HOUR + 40 * MINUTE, 2)    # 起始的不完整小时 (Partial first hour)
+    call(hour - HOUR + 10 * MINUTE, 4)        # 完整的小时 (Complete hour)
+    call(hour - HOUR + 59 * MINUTE, 8)
+    call(hour + 5 * MINUTE, 16)               # 当前小时 (Current hour)
+    assert MetricsWriter.flush_minutes() == 5
+    call(hour + 30 * MINUTE, 32)              # 当前分钟，尚未写入 (Current minute, still in memory)
+    call(hour + 5 * MINUTE, 64)               # 已写入分钟的新调用 (New call in a flushed minute)
+
+    since_ms = hour - 2 * HOUR + 30 * MINUTE
+    with get_read_connection() as conn:
+        rollups = MetricsService.load_rollups(conn, since_ms)
+
+    assert all(key[0] >= since_ms for key, _ in rollups)
+    # 每次调用只统计一次 (Every call is counted exactly once)
+    assert sum(rollup.histogram.count for _, rollup in rollups) == 6
+    assert sum(rollup.histogram.total for _, rollup in rollups) == 2 + 4 + 8 + 16 + 32 + 64
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+性能分析接口鉴权测试 (Profiler endpoint authorization tests)
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import admin
+from app.services.profiler import Profiler
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/api/admin")
+    return TestClient(app)
+
+
+def test_profile_endpoints_require_admin_token(monkeypatch):
+    monkeypatch.setattr(Profiler, "enable", True)
+    monkeypatch.setattr(Profiler, "admin_token", "secret")
+    client = make_client()
+
+    assert client.get("/api/admin/profile").status_code == 403
+    assert client.get("/api/admin/profile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.post("/api/admin/profile/cprofile?seconds=0.1").status_code == 403
+
+    response = client.get("/api/admin/profile", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["profiler"]["enable"] is True
+
+
+def test_profile_endpoints_reject_all_without_configured_token(monkeypatch):
+    monkeypatch.setattr(Profiler, "enable", True)
+    monkeypatch.setattr(Profiler, "admin_token", "")
+    client = make_client()
+
+    # 未配置令牌时，空的请求头也不能通过 (An empty header must not match an unset token)
+    assert client.get("/api/admin/profile", headers={"X-Admin-Token": ""}).status_code == 403
+    assert client.post("/api/admin/profile/sample?seconds=0.1").status_code == 403
+
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+监控数据保留测试 (Metrics retention tests)
+"""
+import sqlite3
+
+import pytest
+
+from app.db import database
+from app.services.retention_service import RetentionService
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """以默认 auto_vacuum=NONE 创建的旧数据库 (An older database created with the default auto_vacuum=NONE)"""
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE filler (value TEXT)")
+    conn.commit()
+    conn.close()
+    pool = database.ConnectionPool(path)
+    monkeypatch.setattr(database, "pool", pool)
+    monkeypatch.setattr(RetentionService, "incremental_vacuum", None)
+    database.init_database()
+    yield pool
+    pool.close_all()
+
+
+def test_vacuum_reports_unavailable_then_enables(legacy_db):
+    assert RetentionService._vacuum(100) is None
+    assert RetentionService.stats()["incremental_vacuum"] is False
+
+    with database.get_db_connection() as conn:
+        conn.executemany("INSERT INTO filler VALUES (?)", [("x" * 1000,) for _ in range(500)])
+        conn.execute("DELETE FROM filler")
+        conn.commit()
+
+    result = RetentionService.enable_incremental_vacuum()
+    assert result["enabled"] and result["pages_after"] < result["pages_before"]
+    assert RetentionService.enable_incremental_vacuum()["already_enabled"]
+    assert RetentionService._vacuum(100) == 0
+    assert RetentionService.stats()["incremental_vacuum"] is True
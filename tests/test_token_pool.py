@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+令牌池测试 (Token pool tests)
+"""
+import asyncio
+import itertools
+
+import pytest
+
+from crawlers.douyin.web.utils import TokenManager
+from crawlers.utils.api_exceptions import APIResponseError
+from crawlers.utils.token_pool import TokenPool, TokenService
+
+
+def make_pool(**kwargs) -> TokenPool:
+    counter = itertools.count()
+
+    async def generator():
+        return "token-{0}".format(next(counter))
+
+    pool = TokenPool("test", generator, size=3, **kwargs)
+    asyncio.run(pool.refill())
+    return pool
+
+
+def test_get_reuses_tokens_round_robin():
+    pool = make_pool()
+    assert [pool.get() for _ in range(4)] == ["token-0", "token-1", "token-2", "token-0"]
+    assert pool.stats()["available"] == 3
+    assert not pool.needs_refill()
+
+
+def test_expired_tokens_are_not_handed_out():
+    pool = make_pool()
+    pool.max_age = 0
+    assert pool.get() is None
+    assert pool.needs_refill()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(TokenService, "pools", {})
+    douyin = make_pool(param="msToken", host="douyin.com")
+    other = make_pool(param="msToken", host="tiktok.com")
+    TokenService.pools.update({"douyin_msToken": douyin, "tiktok_msToken": other})
+    return douyin, other
+
+
+def test_retire_rejected_matches_param_and_host(service):
+    douyin, other = service
+    url = "https://www.douyin.com/aweme/v1/web/aweme/detail/?aweme_id=1&msToken=token-1&a_bogus=x"
+    assert TokenService.retire_rejected(url) == 1
+    assert douyin.stats()["available"] == 2
+    assert "token-1" not in [douyin.get() for _ in range(3)]
+    # 其它域名的同名令牌不受影响 (Pools for other hosts are untouched)
+    assert other.stats()["available"] == 3
+
+
+def test_retire_rejected_ignores_unknown_tokens(service):
+    douyin, _ = service
+    assert TokenService.retire_rejected("https://www.douyin.com/api/?msToken=fake") == 0
+    assert TokenService.retire_rejected("https://evil-douyin.com/api/?msToken=token-0") == 0
+    assert douyin.stats()["available"] == 3
+
+
+def test_fetch_does_not_generate_per_request(monkeypatch):
+    calls = []
+
+    async def generator():
+        calls.append(None)
+        return "token-{0}".format(len(calls))
+
+    async def inline():
+        raise AssertionError("请求路径上不应生成令牌 (No token may be generated on the request path)")
+
+    monkeypatch.setattr(TokenService, "pools", {})
+    monkeypatch.setattr(TokenService, "enable", True)
+    monkeypatch.setattr(TokenManager, "gen_real_msToken_async", inline)
+    monkeypatch.setattr(TokenManager, "gen_ttwid_async", inline)
+    TokenService.register("douyin_msToken", generator)
+    TokenService.register("douyin_ttwid", generator)
+    TokenService.pools["douyin_msToken"].size = 3
+    TokenService.pools["douyin_ttwid"].size = 3
+
+    async def main():
+        TokenService.start()
+        try:
+            ttwids = [await TokenManager.fetch_ttwid() for _ in range(10)]
+            msTokens = [await TokenManager.fetch_msToken() for _ in range(10)]
+        finally:
+            await TokenService.stop()
+        return ttwids, msTokens
+
+    ttwids, msTokens = asyncio.run(main())
+    # 两个池各补充一次，之后的请求都复用池内令牌 (Each pool is filled once and later requests reuse it)
+    assert len(calls) == 6
+    assert len(set(ttwids)) == 3
+    assert len(set(msTokens)) == 3
+
+
+def test_fetch_msToken_falls_back_while_refilling(monkeypatch):
+    async def generator():
+        raise RuntimeError("upstream down")
+
+    async def inline():
+        raise AssertionError("请求路径上不应生成令牌 (No token may be generated on the request path)")
+
+    monkeypatch.setattr(TokenService, "pools", {})
+    monkeypatch.setattr(TokenService, "enable", True)
+    monkeypatch.setattr(TokenService, "wait_timeout", 0.1)
+    monkeypatch.setattr(TokenManager, "gen_real_msToken_async", inline)
+    monkeypatch.setattr(TokenManager, "gen_ttwid_async", inline)
+    TokenService.register("douyin_msToken", generator)
+    TokenService.register("douyin_ttwid", generator)
+
+    async def main():
+        TokenService.start()
+        try:
+            msToken = await TokenManager.fetch_msToken()
+            with pytest.raises(APIResponseError):
+                await TokenManager.fetch_ttwid()
+        finally:
+            await TokenService.stop()
+        return msToken
+
+    assert len(asyncio.run(main())) == 128
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+X-Bogus 签名的回归测试 (Regression tests for X-Bogus signing)
+
+期望值由基线实现在固定时间戳下生成，签名必须逐字节一致。
+(Expected values were produced by the baseline implementation at a fixed timestamp;
+signatures must stay byte-for-byte identical.)
+"""
+import base64
+
+import pytest
+
+from crawlers.douyin.web import xbogus
+from crawlers.douyin.web.xbogus import XBogus
+
+UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.0.0 Safari/537.36"
+URL_DETAIL = "https://www.douyin.com/aweme/v1/web/aweme/detail/?device_platform=webapp&aid=6383&aweme_id=7345492945006595379"
+URL_QUERY = "device_platform=webapp&aid=1988&msToken=abc"
+TIMESTAMP = 1700000000.5
+
+# (User-Agent, 链接, 期望值) (User-Agent, URL, expected)
+GOLDEN = [
+    (None, URL_DETAIL, "DFSzswVYLabANxTQtmWx-e9WX7Jb"),
+    (None, URL_QUERY, "DFSzswVYuTxANxTQtmWx-e9WX7JE"),
+    (UA, URL_DETAIL, "DFSzswVYLabANjultmWx-e9WX7Ji"),
+    (UA, URL_QUERY, "DFSzswVYuTxANjultmWx-e9WX7JL"),
+]
+
+
+@pytest.fixture
+def fixed_time(monkeypatch):
+    monkeypatch.setattr(xbogus.time, "time", lambda: TIMESTAMP)
+
+
+@pytest.mark.parametrize("user_agent, url_path, expected", GOLDEN)
+def test_get_xbogus_golden(fixed_time, user_agent, url_path, expected):
+    params, xb, ua = XBogus(user_agent).getXBogus(url_path)
+    assert xb == expected
+    assert params == "%s&X-Bogus=%s" % (url_path, expected)
+    assert ua == XBogus(user_agent).user_agent
+
+
+@pytest.mark.parametrize("user_agent, url_path, expected", GOLDEN)
+def test_cached_and_batch_match(fixed_time, user_agent, url_path, expected):
+    signer = XBogus.for_user_agent(user_agent)
+    assert signer.getXBogus(url_path)[1] == expected
+    assert [xb for _, xb, _ in signer.getXBogus_many([url_path, url_path])] == [expected, expected]
+
+
+def test_get_xbogus_does_not_mutate_shared_instance(fixed_time):
+    signer = XBogus.for_user_agent(UA)
+    before = dict(vars(signer))
+    signer.getXBogus(URL_DETAIL)
+    assert vars(signer) == before
+
+
+@pytest.mark.parametrize("url_path", [URL_DETAIL, URL_QUERY])
+def test_bytes_digest_matches_legacy_helpers(url_path):
+    """按字节计算的摘要与原有的列表实现一致 (Byte-based digests match the legacy list helpers)"""
+    signer = XBogus(UA)
+    assert list(xbogus._double_md5(xbogus._str_to_bytes(url_path))) == signer.md5_encrypt(url_path)
+    ua_base64 = base64.b64encode(signer.rc4_encrypt(signer.ua_key, UA.encode("ISO-8859-1"))).decode("ISO-8859-1")
+    assert list(signer.ua_digest) == signer.md5_str_to_array(signer.md5(ua_base64))